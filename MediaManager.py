@@ -64,10 +64,6 @@ class MediaManager(wx.Frame):
         self.favorite_last_selected = None
         self.sort_method = settings.DEF_SORT_METHOD
         self.sort_ascend = settings.DEF_SORT_ASCEND
-        if self.sort_ascend:
-            self.sort_positive = 1
-        else:
-            self.sort_positive = -1
         self.thread_catalog = None
         self.file_to_open = None
         self.add_icon_lock = threading.Lock()
@@ -266,6 +262,11 @@ class MediaManager(wx.Frame):
         self.Bind(wx.EVT_TIMER, self.OnOpenTimer, self.open_timer)
         self.thumb_timer = wx.Timer(self, 2)
         self.Bind(wx.EVT_TIMER, self.OnThumbTimer, self.thumb_timer)
+        self.page_timer = wx.Timer(self, 3)
+        self.Bind(wx.EVT_TIMER, self.OnPageTimer, self.page_timer)
+        self.reader_timer = wx.Timer(self, 4)
+        self.Bind(wx.EVT_TIMER, self.OnReaderTimer, self.reader_timer)
+        self.reader_timer.Start(DEF_FILELOG_READER_PERIOD * 1000)
 
         self.thumbRightMenu = wx.Menu()
         menuFavorite = self.thumbRightMenu.Append(wx.ID_ANY, 'Add to Favorites')
@@ -327,34 +328,36 @@ class MediaManager(wx.Frame):
         image.Rescale(24, 24)
         return wx.Bitmap(image)
 
+    def remove_list_items(self, removed):
+        # one pass over the list, item data is the index into self.files and self.favorites
+        new_index = {}
+        for index in range(len(self.files)):
+            if index not in removed:
+                new_index[index] = len(new_index)
+        for list_idx in reversed(range(self.filesList.GetItemCount())):
+            data = self.filesList.GetItemData(list_idx)
+            if data in new_index:
+                self.filesList.SetItemData(list_idx, new_index[data])
+            else:
+                self.filesList.DeleteItem(list_idx)
+        self.files = [mf for index, mf in enumerate(self.files) if index in new_index]
+        if self.view_contents == VIEW_FAVORITES:
+            self.favorites = [fav for index, fav in enumerate(self.favorites) if index in new_index]
+
     def delete_files(self):
         self.filesList.Freeze()
         selected = copy.copy(self.files_selected)
         for list_idx in range(self.filesList.GetItemCount()):
             self.filesList.Select(list_idx, on=0)
 
-        for mf in selected:
-            logging.debug('deleting file : %s' % mf)
-            try:
-                self.catalog.del_file(mf)
-            except Exception as e:
-                logging.error(e)
-                continue
-            index = self.files.index(mf)
-            target_idx = None
-            for list_idx in range(self.filesList.GetItemCount()):
-                data = self.filesList.GetItemData(list_idx)
-                if data == index:
-                    target_idx = list_idx
-                    break
-            for list_idx in range(self.filesList.GetItemCount()):
-                data = self.filesList.GetItemData(list_idx)
-                if data <= index:
-                    continue
-                self.filesList.SetItemData(list_idx, data - 1)
-            if target_idx is not None:
-                self.filesList.DeleteItem(target_idx)
-            del(self.files[index])
+        logging.debug('deleting %d files' % len(selected))
+        try:
+            deleted = self.catalog.del_files(selected)
+        except Exception as e:
+            logging.error(e)
+            deleted = []
+        deleted_ids = {id(mf) for mf in deleted}
+        self.remove_list_items({index for index, mf in enumerate(self.files) if id(mf) in deleted_ids})
 
         self.files_selected = []
         self.favorites_selected = []
@@ -366,25 +369,12 @@ class MediaManager(wx.Frame):
         for list_idx in range(self.filesList.GetItemCount()):
             self.filesList.Select(list_idx, on=0)
 
-        for fav in selected:
-            logging.debug('delete favorite : %s' % fav)
-            fav.mediafile.del_favorite(fav)
-            index = self.favorites.index(fav)
-            target_idx = None
-            for list_idx in range(self.filesList.GetItemCount()):
-                data = self.filesList.GetItemData(list_idx)
-                if data == index:
-                    target_idx = list_idx
-                    break
-            for list_idx in range(self.filesList.GetItemCount()):
-                data = self.filesList.GetItemData(list_idx)
-                if data <= index:
-                    continue
-                self.filesList.SetItemData(list_idx, data - 1)
-            if target_idx is not None:
-                self.filesList.DeleteItem(target_idx)
-            del(self.files[index])
-            del(self.favorites[index])
+        with self.catalog.transaction():
+            for fav in selected:
+                logging.debug('delete favorite : %s' % fav)
+                fav.mediafile.del_favorite(fav)
+        deleted_ids = {id(fav) for fav in selected}
+        self.remove_list_items({index for index, fav in enumerate(self.favorites) if id(fav) in deleted_ids})
 
         self.files_selected = []
         self.favorites_selected = []
@@ -425,32 +415,42 @@ class MediaManager(wx.Frame):
     def OnSortChange(self, e):
         self.sort_method = self.sortChoice.GetSelection()
         logging.debug('sorting method changed to %d' % self.sort_method)
-        if self.sort_method == FILTER_SORT_FILENAME:
-            self.filesList.SortItems(self.sort_filename)
-        elif self.sort_method == FILTER_SORT_TIME:
-            self.filesList.SortItems(self.sort_time)
-        elif self.sort_method == FILTER_SORT_LASTPLAY:
-            self.filesList.SortItems(self.sort_lastplay)
-        elif self.sort_method == FILTER_SORT_DURATION:
-            self.filesList.SortItems(self.sort_duration)
-        elif self.sort_method == FILTER_SORT_PATH:
-            self.filesList.SortItems(self.sort_path)
-        elif self.sort_method == FILTER_SORT_SIZE:
-            self.filesList.SortItems(self.sort_size)
-        elif self.sort_method == FILTER_SORT_RESOLUTION:
-            self.filesList.SortItems(self.sort_resolution)
-        else:
+        if self.sort_method not in FILE_SORT_COLUMNS:
             logging.error('not a defined sorting method')
             self.sort_method = FILTER_SORT_PATH
-            self.filesList.SortItems(self.sort_path)
+        if self.catalog is None:
+            return
+        self.sort_view()
+        # queued after the pending item inserts of add_mediafiles
+        wx.CallAfter(self.arrange_items)
+
+    def sort_view(self):
+        if self.view_contents == VIEW_FILES:
+            self.catalog.sort_files(self.files, self.sort_method, self.sort_ascend)
+        else:
+            self.catalog.sort_files(self.favorites, self.sort_method, self.sort_ascend,
+                                    get_file=lambda fav: fav.mediafile)
+
+    def arrange_items(self):
+        # items are inserted from several threads, so their order is set here from the view list
+        if self.view_contents == VIEW_FILES:
+            items = [(mf, mf.filename, mf.imagelist_index) for mf in self.files]
+        else:
+            items = [(fav, fav.mediafile.filename, fav.imagelist_index) for fav in self.favorites]
+        count = min(len(items), self.filesList.GetItemCount())
+        self.filesList.Freeze()
+        for idx in range(count):
+            obj, text, image = items[idx]
+            obj.view_index = idx
+            self.filesList.SetItem(idx, 0, text, image)
+            self.filesList.SetItemData(idx, idx)
+        self.filesList.Thaw()
 
     def OnAscendChange(self, e):
         if self.ascendChoice.GetSelection() == 0:
             self.sort_ascend = False
-            self.sort_positive = -1
         else:
             self.sort_ascend = True
-            self.sort_positive = 1
         self.OnSortChange(None)
 
         if self.sort_ascend:
@@ -458,11 +458,13 @@ class MediaManager(wx.Frame):
         else:
             logging.debug('sorting ascend changed to descend')
 
-    def add_mediafile(self, mf):
+    def add_mediafile(self, mf, view_index=None):
         if self.view_contents == VIEW_FILES:
-            mf.view_index = self.files.index(mf)
+            if view_index is None:
+                view_index = self.files.index(mf)
+            mf.view_index = view_index
         elif self.view_contents == VIEW_FAVORITES:
-            for fav in mf.favorites:
+            for fav in mf.get_favorites():
                 self.favorites.append(fav)
                 fav.view_index = self.favorites.index(fav)
 
@@ -484,7 +486,7 @@ class MediaManager(wx.Frame):
             item.SetData(mf.view_index)
             wx.CallAfter(self.filesList.InsertItem, item)
         else:
-            for fav in mf.favorites:
+            for fav in mf.get_favorites():
                 if fav.imagelist_index is None:
                     jpg_bytes = fav.jpg
                     if jpg_bytes:
@@ -502,9 +504,36 @@ class MediaManager(wx.Frame):
                 item.SetData(fav.view_index)
                 wx.CallAfter(self.filesList.InsertItem, item)
 
-    def mediaicon_thread_func(self, mf_list):
+    def mediaicon_thread_func(self, mf_list, view_index):
         for mf in mf_list:
-            self.add_mediafile(mf)
+            self.add_mediafile(mf, view_index)
+            view_index += 1
+
+    def add_mediafiles(self, mf_list, update_period, view_index=0, loaded=0, total=None):
+        if total is None:
+            total = len(mf_list)
+        cpu_count = multiprocessing.cpu_count()
+        step = update_period // cpu_count
+        if not step:
+            step = 1
+        update_period = step * cpu_count
+        thread_list = []
+        for sstart in range(0, len(mf_list), step):
+            args = mf_list[sstart:sstart+step]
+            if self.view_contents == VIEW_FILES:
+                self.catalog.cover_cache.prefetch(args)
+            t = threading.Thread(target=self.mediaicon_thread_func, args=(args, view_index + sstart))
+            t.start()
+            thread_list.append(t)
+
+            if sstart % update_period == 0 or sstart + step >= len(mf_list):
+                self.filesList.Freeze()
+                wx.CallAfter(self.statusbar.SetStatusText, 'files loaded (%d/%d)' % (loaded + sstart, total))
+                self.filesList.Thaw()
+                wx.Yield()
+                for t in thread_list:
+                    t.join()
+                thread_list = []
 
     def OnViewChange(self, vtype=None, update_period=None):
         if self.view_type != vtype and vtype is not None:
@@ -518,7 +547,7 @@ class MediaManager(wx.Frame):
             self.filesList.SetImageList(self.image_list, wx.IMAGE_LIST_NORMAL)
             for mf in self.catalog:
                 mf.imagelist_index = None
-                for fav in mf.favorites:
+                for fav in mf.get_favorites():
                     fav.imagelist_index = None
             update_period = 50
 
@@ -536,42 +565,65 @@ class MediaManager(wx.Frame):
         self.rightPanel.set_mediafiles([])
         self.filesList.DeleteAllItems()
 
-        if not self.catalog:
+        if self.catalog is None:
             return
 
         self.disable()
         self.files = self.catalog.filter(actors=self.leftPanel.actor_selected,
                                     tags=self.leftPanel.tag_selected,
-                                    filename=self.leftPanel.file_filter)
+                                    filename=self.leftPanel.file_filter,
+                                    collection=self.leftPanel.collection_selected)
+        self.leftPanel.update_counts()
 
         total = len(self.files)
-        cpu_count = multiprocessing.cpu_count()
-        step = update_period // cpu_count
-        if not step:
-            step = 1
-        update_period = step * cpu_count
-        if not step:
-            step = 1
-        thread_list = []
-        for sstart in range(0, total, step):
-            args = self.files[sstart:sstart+step]
-            t = threading.Thread(target=self.mediaicon_thread_func, args=(args,))
-            t.start()
-            thread_list.append(t)
-
-            if sstart % update_period == 0 or sstart + step >= total:
-                self.filesList.Freeze()
-                wx.CallAfter(self.statusbar.SetStatusText, 'files loaded (%d/%d)' % (sstart, total))
-                self.filesList.Thaw()
-                wx.Yield()
-                for t in thread_list:
-                    t.join()
-                thread_list = []
+        # populated in the sorted order, the sort after loading only fixes the thread interleaving
+        self.sort_view()
+        self.add_mediafiles(self.files, update_period)
         wx.CallAfter(self.statusbar.SetStatusText, 'files loaded (%d/%d)' % (total, total))
         self.OnSortChange(None)
-        self.enable()
+        if not self.catalog.loading:
+            self.enable()
         logging.debug('view loading finished')
 
+    def OnPageTimer(self, e):
+        if self.catalog is None or not self.catalog.loading:
+            return
+
+        loaded = len(self.catalog)
+        new_files = self.catalog.load_page(DEF_OPEN_PAGE_SIZE)
+        if self.view_contents == VIEW_FILES:
+            files = self.catalog.filter(actors=self.leftPanel.actor_selected,
+                                        tags=self.leftPanel.tag_selected,
+                                        filename=self.leftPanel.file_filter,
+                                        files=new_files,
+                                        collection=self.leftPanel.collection_selected)
+            view_index = len(self.files)
+            self.files.extend(files)
+            self.add_mediafiles(files, DEF_OPEN_PAGE_SIZE // 10, view_index, loaded, self.catalog.page_total)
+            if self.catalog is None:
+                return
+        loaded = len(self.catalog)
+        wx.CallAfter(self.statusbar.SetStatusText, 'files loaded (%d/%d)' % (loaded, self.catalog.page_total))
+
+        if self.catalog.loading:
+            self.page_timer.Start(DEF_OPEN_PAGE_PERIOD, oneShot=True)
+            return
+
+        # favorites, actors and tags of files are only known after the last page
+        logging.debug('paged loading finished')
+        if self.view_contents == VIEW_FAVORITES:
+            self.update_view()
+        else:
+            self.OnSortChange(None)
+            self.leftPanel.update_counts()
+            self.enable()
+        self.statusbar.SetStatusText('Start Scanning files...')
+        self.OnSyncCatalog(None)
+
+    def OnReaderTimer(self, e):
+        if self.catalog is not None:
+            self.catalog.update_filelog_reader()
+
     def OnDbTimer(self, e):
         logging.debug('OnDbTimer called')
         if self.thread_message:
@@ -579,39 +631,41 @@ class MediaManager(wx.Frame):
             self.thread_message = None
 
         if self.db_updated:
-            self.catalog.reload_files()
-
-            files = self.catalog.filter(actors=self.leftPanel.actor_selected,
-                                        tags=self.leftPanel.tag_selected,
-                                        filename=self.leftPanel.file_filter)
-            for mf in files:
-                if not (mf in self.files):
-                    self.add_mediafile(mf)
-
-            mf_i = 0
-            while mf_i < len(self.files):
-                mf = self.files[mf_i]
-                if not (mf in files):
-                    for idx in range(self.filesList.GetItemCount()):
-                        data = self.filesList.GetItemData(idx)
-                        if data == mf_i:
-                            self.filesList.DeleteItem(idx)
-                            break
-                    for idx in range(self.filesList.GetItemCount()):
-                        data = self.filesList.GetItemData(idx)
-                        if data >= mf_i:
-                            self.filesList.SetItemData(idx, data - 1)
-                    if mf in self.files_selected:
-                        self.deselect_file(mf)
-                    del self.files[mf_i]
-                    mf_i -= 1
-                mf_i += 1
-
+            self.apply_db_changes()
             self.db_updated = False
         if not self.cat_thread or not self.cat_thread.is_alive():
             self.db_updated = False
             self.db_timer.Stop()
 
+    def apply_db_changes(self):
+        added, removed = self.catalog.reload_files()
+
+        new_files = self.catalog.filter(actors=self.leftPanel.actor_selected,
+                                        tags=self.leftPanel.tag_selected,
+                                        filename=self.leftPanel.file_filter,
+                                        files=added,
+                                        collection=self.leftPanel.collection_selected)
+        for mf in new_files:
+            self.files.append(mf)
+            self.add_mediafile(mf, len(self.files) - 1)
+
+        for mf in removed:
+            if not (mf in self.files):
+                continue
+            mf_i = self.files.index(mf)
+            for idx in range(self.filesList.GetItemCount()):
+                data = self.filesList.GetItemData(idx)
+                if data == mf_i:
+                    self.filesList.DeleteItem(idx)
+                    break
+            for idx in range(self.filesList.GetItemCount()):
+                data = self.filesList.GetItemData(idx)
+                if data >= mf_i:
+                    self.filesList.SetItemData(idx, data - 1)
+            if mf in self.files_selected:
+                self.deselect_file(mf)
+            del self.files[mf_i]
+
     def get_scaled_image(self, il, image):
         il_size = il.GetSize()
         im_size = image.GetSize()
@@ -712,115 +766,6 @@ class MediaManager(wx.Frame):
         if not update_thumbs:
             self.thumb_timer.Start(5, oneShot=True)
 
-    def sort_get_mf(self, item1, item2):
-        if self.view_contents == VIEW_FILES:
-            mf1 = self.files[item1]
-            mf2 = self.files[item2]
-        else:
-            mf1 = self.favorites[item1].mediafile
-            mf2 = self.favorites[item2].mediafile
-        return mf1, mf2
-
-
-    def sort_filename(self, item1, item2):
-        mf1, mf2 = self.sort_get_mf(item1, item2)
-        if mf1.filename == mf2.filename:
-            return 0
-        elif mf1.filename < mf2.filename:
-            return -self.sort_positive
-        else:
-            return self.sort_positive
-
-    def sort_time(self, item1, item2):
-        mf1, mf2 = self.sort_get_mf(item1, item2)
-        if mf1.time == mf2.time:
-            return 0
-        elif mf1.time < mf2.time:
-            return -self.sort_positive
-        else:
-            return self.sort_positive
-
-    def sort_lastplay(self, item1, item2):
-        mf1, mf2 = self.sort_get_mf(item1, item2)
-        if (not mf1.lastplay) and mf2.lastplay:
-            return -self.sort_positive
-        if mf1.lastplay and (not mf2.lastplay):
-            return self.sort_positive
-        if not mf1.lastplay and not mf2.lastplay:
-            return 0
-        if mf1.lastplay == mf2.lastplay:
-            return 0
-        elif mf1.lastplay < mf2.lastplay:
-            return -self.sort_positive
-        else:
-            return self.sort_positive
-
-    def sort_duration(self, item1, item2):
-        mf1, mf2 = self.sort_get_mf(item1, item2)
-        if (not mf1.duration) and mf2.duration:
-            return -self.sort_positive
-        if mf1.duration and not (mf2.duration):
-            return self.sort_positive
-        if not mf1.duration and not mf2.duration:
-            return 0
-        if mf1.duration == mf2.duration:
-            return 0
-        elif mf1.duration < mf2.duration:
-            return -self.sort_positive
-        else:
-            return self.sort_positive
-
-    def sort_path(self, item1, item2):
-        mf1, mf2 = self.sort_get_mf(item1, item2)
-        if mf1.abspath == mf2.abspath:
-            return 0
-        elif mf1.abspath < mf2.abspath:
-            return -self.sort_positive
-        else:
-            return self.sort_positive
-
-    def sort_size(self, item1, item2):
-        mf1, mf2 = self.sort_get_mf(item1, item2)
-        if (not mf1.size) and mf2.size:
-            return -self.sort_positive
-        if mf1.size and (not mf2.size):
-            return self.sort_positive
-        if not mf1.size and not mf2.size:
-            return 0
-        if mf1.size == mf2.size:
-            return 0
-        elif mf1.size < mf2.size:
-            return -self.sort_positive
-        else:
-            return self.sort_positive
-
-    def sort_resolution(self, item1, item2):
-        mf1, mf2 = self.sort_get_mf(item1, item2)
-        if not (mf1.width and mf1.height):
-            mf1_size = None
-        elif mf1.width > mf1.height:
-            mf1_size = mf1.width
-        else:
-            mf1_size = mf1.height
-        if not (mf2.width and mf2.height):
-            mf1_size = None
-        elif mf2.width > mf2.height:
-            mf2_size = mf2.width
-        else:
-            mf2_size = mf2.height
-        if (not mf1_size) and mf2_size:
-            return -self.sort_positive
-        if mf1_size and (not mf2_size):
-            return self.sort_positive
-        if not mf1_size and not mf2_size:
-            return 0
-        if mf1_size == mf2_size:
-            return 0
-        elif mf1_size < mf2_size:
-            return -self.sort_positive
-        else:
-            return self.sort_positive
-
     def update_view(self, update_period=None):
         self.OnViewChange(vtype=None, update_period=update_period)
 
@@ -974,7 +919,7 @@ class MediaManager(wx.Frame):
             self.OnSyncCatalog(e)
 
     def OnEditCatalog(self, e):
-        if not self.catalog:
+        if self.catalog is None:
             self.statusbar.SetStatusText('Open or Create Catalog first')
             return
 
@@ -1019,15 +964,23 @@ class MediaManager(wx.Frame):
         self.catalog = Catalog(db_abspath=yamm_file)
         self.statusbar.SetStatusText('Openning catalog file (This will take time to load files)')
         try:
-            self.catalog.open_database()
+            self.catalog.open_database(use_snapshot=settings.DEF_USE_SNAPSHOT, paged=True)
         except DbVersionException as e:
-            wx.MessageBox('Sorry. Catalog Version was updated. You need to create new .yamm file.',
+            wx.MessageBox('Sorry. This catalog was written by a newer version and cannot be opened.',
                           'Version Mismatch',
                           wx.OK)
             return
 
+        # without a valid snapshot only the first page is read here, OnPageTimer reads the rest
+        if self.catalog.loading:
+            self.catalog.start_paging(self.sort_method, self.sort_ascend)
+            self.catalog.load_page(DEF_OPEN_FIRST_PAGE)
         self.update_view(update_period=80)
         self.leftPanel.set_mm_window(self)
+        if self.catalog.loading:
+            self.disable()
+            self.page_timer.Start(DEF_OPEN_PAGE_PERIOD, oneShot=True)
+            return
         self.statusbar.SetStatusText('Start Scanning files...')
         self.OnSyncCatalog(None)
 
@@ -1049,6 +1002,7 @@ class MediaManager(wx.Frame):
     def OnCloseCatalog(self, e):
         if self.catalog is None:
             return
+        self.page_timer.Stop()
         self.stop_sync()
         self.catalog.close_database()
         self.catalog = None
@@ -1074,6 +1028,8 @@ class MediaManager(wx.Frame):
     def OnSyncCatalog(self, e):
         if self.catalog is None:
             return
+        # changes made through this window (e.g. files of a removed topdir) are applied on the first tick
+        self.db_updated = True
         self.cat_thread = threading.Thread(target=self.cat_thread_func)
         self.cat_thread.start()
         self.db_timer.Start(500)
@@ -1095,6 +1051,9 @@ class MediaManager(wx.Frame):
             wx.Yield()
         self.cat_thread = None
         self.db_timer.Stop()
+        if self.catalog is not None:
+            self.apply_db_changes()
+        self.db_updated = False
         self.statusbar.SetStatusText('Sync Stopped')
 
     def OnFileRight(self, e):
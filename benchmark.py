@@ -0,0 +1,594 @@
+#!/usr/bin/env python3
+
+# Copyright 2020 pinebud77@hotmail.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import os.path
+import re
+import sys
+import time
+import logging
+import glob
+import getopt
+import shutil
+import tempfile
+import contextlib
+import functools
+import tracemalloc
+
+from settings import *
+from catalog import Catalog, count_file_labels
+import catalog_snapshot
+import media_file
+import database_utils as db_utils
+import dir_walker
+
+
+DEF_BENCH_COUNTS = (10000, 100000, 1000000)
+DEF_BENCH_TAGS = ('hd', 'sd', 'favorite', 'series', 'short', 'long', 'music', 'sports')
+DEF_BENCH_ACTORS = 500
+DEF_BENCH_DIRS = 1000
+DEF_BENCH_FAVORITE_PERIOD = 20
+DEF_BENCH_JPG = b'\xff\xd8' + b'\x00' * 60 + b'\xff\xd9'
+DEF_BENCH_COVER_SIZE = 15 * 1024
+DEF_BENCH_SCREEN = 200
+DEF_BENCH_THUMBNAILS = 10
+DEF_BENCH_SYNC_BATCH = 4
+DEF_BENCH_FILTERS = (('actor', {'actors': ['actor001']}),
+                     ('tag', {'tags': ['music']}),
+                     ('filename', {'filename': 'clip00012'}),
+                     ('short name', {'filename': 'p0'}),
+                     ('subdir', {'filename': os.path.join('dir0001', 'clip')}),
+                     ('combined', {'actors': ['actor001', 'actor002'], 'tags': ['hd', 'sd'], 'filename': 'clip'}),
+                     )
+DEF_BENCH_TYPED = 'clip0001234'
+DEF_BENCH_FACETS = (('all', {}),
+                    ('tag', {'tags': ['music']}),
+                    ('filename', {'filename': 'clip00012'}),
+                    ('combined', {'actors': ['actor001', 'actor002'], 'tags': ['hd', 'sd']}),
+                    )
+DEF_BENCH_WALK_FILES = 100
+DEF_BENCH_WALK_FANOUT = 100
+DEF_BENCH_WALK_BRACKET_PERIOD = 10
+DEF_BENCH_WALK_TOPDIRS = 2
+DEF_BENCH_WALK_LATENCY = 0.002
+DEF_BENCH_WALK_THREADS = (1, 4, 16)
+DEF_BENCH_SORTS = (('filename', FILTER_SORT_FILENAME, lambda mf: mf.filename),
+                   ('time', FILTER_SORT_TIME, lambda mf: mf.time),
+                   ('size', FILTER_SORT_SIZE, lambda mf: mf.size),
+                   ('resolution', FILTER_SORT_RESOLUTION, lambda mf: max(mf.width, mf.height)),
+                   ('path', FILTER_SORT_PATH, lambda mf: mf.abspath),
+                   )
+
+sql_bench_topdir = """INSERT INTO topdir (id, path, comment, exclude)
+                      VALUES(?, ?, NULL, 0);"""
+sql_bench_file = """INSERT INTO file (id, topdir_id, reldir, filename, size, time, lastplay, duration, comment, width, height)
+                    VALUES(?, ?, ?, ?, ?, ?, NULL, ?, NULL, ?, ?);"""
+sql_bench_actor = """INSERT INTO actor (id, name)
+                     VALUES(?, ?);"""
+sql_bench_actorfile = """INSERT INTO actorfile (actor_id, file_id)
+                         VALUES(?, ?);"""
+sql_bench_tagname = """INSERT INTO tagname (id, name)
+                       VALUES(?, ?);"""
+sql_bench_tagfile = """INSERT INTO tagfile (tag_id, file_id)
+                       VALUES(?, ?);"""
+sql_bench_cover = """INSERT INTO cover (file_id, cover)
+                     VALUES(?, ?);"""
+sql_bench_thumbnail = """INSERT INTO thumbnail (id, file_id, time, jpg)
+                         VALUES(?, ?, ?, ?);"""
+sql_bench_favorite = """INSERT INTO favorite (file_id, thumb_id)
+                        VALUES(?, ?);"""
+
+
+def create_catalog(path, count, tags_per_file=3, topdir_count=2, cover_jpg=DEF_BENCH_JPG):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+    catalog = Catalog(path)
+    catalog.open_database()
+    conn = catalog.db_conn
+
+    topdir_rows = []
+    for n in range(topdir_count):
+        topdir_rows.append((n + 1, os.path.abspath('/bench/topdir%d' % n)))
+    conn.executemany(sql_bench_topdir, topdir_rows)
+
+    actor_rows = []
+    for n in range(DEF_BENCH_ACTORS):
+        actor_rows.append((n + 1, 'actor%03d' % n))
+    conn.executemany(sql_bench_actor, actor_rows)
+
+    def file_rows():
+        for n in range(count):
+            yield (n + 1, n % topdir_count + 1, 'dir%04d' % (n % DEF_BENCH_DIRS), 'clip%07d.mp4' % n,
+                   (n * 7919) % (4 << 30), 1600000000.0 + n, float(n % 7200), 1920, 1080)
+    conn.executemany(sql_bench_file, file_rows())
+
+    def actorfile_rows():
+        for n in range(count):
+            yield (n % DEF_BENCH_ACTORS + 1, n + 1)
+    conn.executemany(sql_bench_actorfile, actorfile_rows())
+
+    tagname_rows = []
+    for n, tag in enumerate(DEF_BENCH_TAGS):
+        tagname_rows.append((n + 1, tag))
+    conn.executemany(sql_bench_tagname, tagname_rows)
+
+    def tag_rows():
+        for n in range(count):
+            for t in range(tags_per_file):
+                yield ((n + t) % len(DEF_BENCH_TAGS) + 1, n + 1)
+    conn.executemany(sql_bench_tagfile, tag_rows())
+
+    def cover_rows():
+        for n in range(count):
+            yield (n + 1, cover_jpg)
+    if cover_jpg:
+        conn.executemany(sql_bench_cover, cover_rows())
+
+    def thumbnail_rows():
+        for n in range(0, count, DEF_BENCH_FAVORITE_PERIOD):
+            yield (n + 1, n + 1, 90, DEF_BENCH_JPG)
+    conn.executemany(sql_bench_thumbnail, thumbnail_rows())
+
+    def favorite_rows():
+        for n in range(0, count, DEF_BENCH_FAVORITE_PERIOD):
+            yield (n + 1, n + 1)
+    conn.executemany(sql_bench_favorite, favorite_rows())
+
+    conn.commit()
+    catalog.close_database()
+
+
+def bench_open(counts, workdir):
+    for count in counts:
+        path = os.path.join(workdir, 'bench_open_%d.yamm' % count)
+        create_catalog(path, count)
+
+        catalog = Catalog(path)
+        start = time.perf_counter()
+        catalog.open_database()
+        elapsed = time.perf_counter() - start
+        catalog.close_database()
+
+        print('%d files : open %.3fs (%.2fus/file)' % (count, elapsed, elapsed * 1000000 / count))
+        for phase, phase_time in catalog.open_timings.items():
+            print('    %-12s %8.3fs' % (phase, phase_time))
+        del catalog
+        os.remove(path)
+
+
+def bench_cover(counts, workdir):
+    cover_jpg = b'\xff\xd8' + os.urandom(DEF_BENCH_COVER_SIZE) + b'\xff\xd9'
+    for count in counts:
+        path = os.path.join(workdir, 'bench_cover_%d.yamm' % count)
+        create_catalog(path, count, cover_jpg=cover_jpg)
+
+        catalog = Catalog(path)
+        tracemalloc.start()
+        start = time.perf_counter()
+        catalog.open_database()
+        open_time = time.perf_counter() - start
+        open_mem = tracemalloc.get_traced_memory()[0]
+
+        start = time.perf_counter()
+        screen = catalog[:DEF_BENCH_SCREEN]
+        catalog.cover_cache.prefetch(screen)
+        for mf in screen:
+            mf.get_coverjpg(read_db=False)
+        screen_time = time.perf_counter() - start
+        screen_mem = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        catalog.close_database()
+
+        print('%d files : open %.3fs %.1fMB (%.0fB/file), first screen %.3fs %.1fMB' %
+              (count, open_time, open_mem / (1 << 20), open_mem / count, screen_time, screen_mem / (1 << 20)))
+        del catalog
+        os.remove(path)
+
+
+def bench_memory(counts, workdir):
+    for count in counts:
+        path = os.path.join(workdir, 'bench_memory_%d.yamm' % count)
+        create_catalog(path, count, cover_jpg=None)
+
+        catalog = Catalog(path)
+        catalog.open_database()
+        catalog.close_database()
+        del catalog
+
+        tracemalloc.start()
+        catalog = Catalog(path)
+        catalog.open_database()
+        catalog.close_database()
+        mem = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        print('%d files : %.1fMB (%.0fB/file)' % (count, mem / (1 << 20), mem / count))
+        del catalog
+        os.remove(path)
+
+
+def bench_snapshot(counts, workdir):
+    for count in counts:
+        path = os.path.join(workdir, 'bench_snapshot_%d.yamm' % count)
+        create_catalog(path, count, cover_jpg=None)
+        catalog_snapshot.remove(path)
+
+        catalog = Catalog(path)
+        start = time.perf_counter()
+        catalog.open_database(use_snapshot=True)
+        db_time = time.perf_counter() - start
+        start = time.perf_counter()
+        catalog.close_database()
+        store_time = time.perf_counter() - start
+        del catalog
+
+        catalog = Catalog(path)
+        start = time.perf_counter()
+        catalog.open_database(use_snapshot=True)
+        snap_time = time.perf_counter() - start
+        loaded = catalog.snapshot_count is not None
+        catalog.close_database()
+
+        print('%d files : database %.3fs, store %.3fs, snapshot %.3fs (%s, %.1fMB)' %
+              (count, db_time, store_time, snap_time, 'hit' if loaded else 'miss',
+               os.path.getsize(catalog_snapshot.get_snapshot_path(path)) / (1 << 20)))
+        del catalog
+        catalog_snapshot.remove(path)
+        os.remove(path)
+
+
+def no_transaction(conn):
+    return contextlib.nullcontext(conn)
+
+
+def run_transaction(count, workdir, use_transaction):
+    path = os.path.join(workdir, 'bench_transaction_%d.yamm' % count)
+    create_catalog(path, 0)
+    catalog = Catalog(path)
+    catalog.open_database()
+    topdir = catalog.topdir_list[0]
+
+    transaction = db_utils.transaction
+    if not use_transaction:
+        db_utils.transaction = no_transaction
+    try:
+        new_files = []
+        for n in range(count):
+            mf = media_file.MediaFile(catalog, topdir, 'sync', 'new%07d.mp4' % n)
+            mf.size = n
+            mf.thumbnails = [(t * 10, DEF_BENCH_JPG) for t in range(DEF_BENCH_THUMBNAILS)]
+            new_files.append(mf)
+        start = time.perf_counter()
+        for n in range(0, count, DEF_BENCH_SYNC_BATCH):
+            catalog.store_new_files(new_files[n:n + DEF_BENCH_SYNC_BATCH])
+        sync_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with catalog.transaction():
+            for mf in catalog:
+                mf.add_tag('bulk')
+        tag_time = time.perf_counter() - start
+    finally:
+        db_utils.transaction = transaction
+
+    catalog.close_database()
+    os.remove(path)
+    return sync_time, tag_time
+
+
+def bench_transaction(counts, workdir):
+    for count in counts:
+        sync_per_call, tag_per_call = run_transaction(count, workdir, False)
+        sync_tx, tag_tx = run_transaction(count, workdir, True)
+        print('%d files : sync %.3fs -> %.3fs (%.0f -> %.0f files/s), bulk tag %.3fs -> %.3fs' %
+              (count, sync_per_call, sync_tx, count / sync_per_call, count / sync_tx, tag_per_call, tag_tx))
+
+
+def bench_filter(counts, workdir):
+    for count in counts:
+        path = os.path.join(workdir, 'bench_filter_%d.yamm' % count)
+        create_catalog(path, count, cover_jpg=None)
+
+        catalog = Catalog(path)
+        catalog.open_database()
+        start = time.perf_counter()
+        if not catalog.enable_sql_filter():
+            print('filename index is not available')
+            return
+        index_time = time.perf_counter() - start
+
+        print('%d files : index %.3fs' % (count, index_time))
+        catalog.sql_filter = False
+        start = time.perf_counter()
+        catalog.filter(actors=['actor000'], filename='clip')
+        print('    in-memory indexes built in %.3fs' % (time.perf_counter() - start))
+        for name, kwargs in DEF_BENCH_FILTERS:
+            # passing the files forces the scan over every file
+            start = time.perf_counter()
+            python_files = catalog.filter(files=catalog, **kwargs)
+            python_time = time.perf_counter() - start
+            start = time.perf_counter()
+            memory_files = catalog.filter(**kwargs)
+            memory_time = time.perf_counter() - start
+            catalog.sql_filter = True
+            start = time.perf_counter()
+            sql_files = catalog.filter(**kwargs)
+            sql_time = time.perf_counter() - start
+            catalog.sql_filter = False
+            print('    %-12s %8d files  python %.3fs  memory %.3fs  sql %.3fs%s' %
+                  (name, len(sql_files), python_time, memory_time, sql_time,
+                   '' if set(python_files) == set(sql_files) == set(memory_files) else '  MISMATCH'))
+
+        # one filter per keystroke, the way the filter box runs it
+        python_time = 0.0
+        memory_time = 0.0
+        for n in range(1, len(DEF_BENCH_TYPED) + 1):
+            start = time.perf_counter()
+            catalog.filter(filename=DEF_BENCH_TYPED[:n], files=catalog)
+            python_time += time.perf_counter() - start
+            start = time.perf_counter()
+            catalog.filter(filename=DEF_BENCH_TYPED[:n])
+            memory_time += time.perf_counter() - start
+        print('    %-12s %8d keys   python %.3fs  memory %.3fs' % ('typing', len(DEF_BENCH_TYPED), python_time, memory_time))
+        catalog.close_database()
+        del catalog
+        os.remove(path)
+
+
+def bench_facets(counts, workdir):
+    for count in counts:
+        path = os.path.join(workdir, 'bench_facets_%d.yamm' % count)
+        create_catalog(path, count, cover_jpg=None)
+
+        catalog = Catalog(path)
+        catalog.open_database()
+        start = time.perf_counter()
+        catalog.build_label_index()
+        print('%d files : posting sets %.3fs' % (count, time.perf_counter() - start))
+        for name, kwargs in DEF_BENCH_FACETS:
+            files = catalog.filter(**kwargs)
+            start = time.perf_counter()
+            python_counts = count_file_labels(files)
+            python_time = time.perf_counter() - start
+            # count_facets skips the filter cache, every run is a recomputation
+            start = time.perf_counter()
+            facet_counts = catalog.count_facets(**kwargs)
+            facet_time = time.perf_counter() - start
+            # the posting sets also count the names no filtered file has
+            matched = [{name: n for name, n in counts.items() if n} for counts in facet_counts] == [dict(counts) for counts in python_counts]
+            print('    %-12s %8d files  python %.3fs  facets %.3fs%s' %
+                  (name, len(files), python_time, facet_time, '' if matched else '  MISMATCH'))
+        catalog.close_database()
+        del catalog
+        os.remove(path)
+
+
+def create_tree(root, count):
+    # topdir/groupNN/dirNNNN/ with a file listing per directory, some names hold glob brackets
+    media = 0
+    n = 0
+    while n < count:
+        dir_n = n // DEF_BENCH_WALK_FILES
+        if dir_n % DEF_BENCH_WALK_BRACKET_PERIOD == DEF_BENCH_WALK_BRACKET_PERIOD - 1:
+            dir_name = 'dir%05d [%d]' % (dir_n, dir_n)
+        else:
+            dir_name = 'dir%05d' % dir_n
+        path = os.path.join(root, 'group%03d' % (dir_n // DEF_BENCH_WALK_FANOUT), dir_name)
+        os.makedirs(path)
+        for m in range(min(DEF_BENCH_WALK_FILES, count - n)):
+            ext = 'txt' if m % 10 == 9 else 'mp4'
+            with open(os.path.join(path, 'clip%07d.%s' % (n + m, ext)), 'wb'):
+                pass
+            if ext == 'mp4':
+                media += 1
+        n += DEF_BENCH_WALK_FILES
+    return media
+
+
+def glob_filelist(topdir, ext_list):
+    # the walker before os.scandir, kept for comparison
+    filelist = []
+    try:
+        names = glob.glob(os.path.join(topdir, '*'))
+    except re.error:
+        return []
+    for name in names:
+        abspath = os.path.abspath(os.path.join(topdir, name))
+        if os.path.isfile(abspath):
+            for ext in ext_list:
+                if name.lower().endswith(ext):
+                    filelist.append(abspath)
+                    break
+        if os.path.isdir(abspath):
+            filelist.extend(glob_filelist(abspath, ext_list))
+    return filelist
+
+
+def bench_walk(counts, workdir):
+    for count in counts:
+        root = os.path.join(workdir, 'bench_walk_%d' % count)
+        shutil.rmtree(root, ignore_errors=True)
+        start = time.perf_counter()
+        media = create_tree(root, count)
+        print('%d entries : tree created in %.3fs (%d media files)' % (count, time.perf_counter() - start, media))
+
+        start = time.perf_counter()
+        glob_files = glob_filelist(root, DEF_FILE_EXTENSION)
+        glob_time = time.perf_counter() - start
+        start = time.perf_counter()
+        scandir_files = dir_walker.walk_topdirs([root], DEF_FILE_EXTENSION, 1, 1)[root]
+        scandir_time = time.perf_counter() - start
+        print('    glob %.3fs (%d files)  scandir %.3fs (%d files)%s' %
+              (glob_time, len(glob_files), scandir_time, len(scandir_files),
+               '' if len(scandir_files) == media else '  MISMATCH'))
+        shutil.rmtree(root)
+
+
+@contextlib.contextmanager
+def listing_latency(seconds):
+    # every directory listing waits like one round trip to a network mount
+    list_directory = dir_walker.list_directory
+
+    def slow_list_directory(path, suffixes):
+        time.sleep(seconds)
+        return list_directory(path, suffixes)
+    dir_walker.list_directory = slow_list_directory
+    try:
+        yield
+    finally:
+        dir_walker.list_directory = list_directory
+
+
+def bench_parallel_walk(counts, workdir):
+    for count in counts:
+        root = os.path.join(workdir, 'bench_parallel_walk_%d' % count)
+        shutil.rmtree(root, ignore_errors=True)
+        topdirs = [os.path.join(root, 'topdir%d' % n) for n in range(DEF_BENCH_WALK_TOPDIRS)]
+        for topdir in topdirs:
+            create_tree(topdir, count // DEF_BENCH_WALK_TOPDIRS)
+        print('%d entries in %d topdirs, %.1fms per listing' % (count, len(topdirs), DEF_BENCH_WALK_LATENCY * 1000))
+
+        expected = dir_walker.walk_topdirs(topdirs, DEF_FILE_EXTENSION, 1, 1)
+        with listing_latency(DEF_BENCH_WALK_LATENCY):
+            # every topdir of the benchmark is on the same mount, so the mount limit is the thread count
+            for threads in DEF_BENCH_WALK_THREADS:
+                start = time.perf_counter()
+                results = dir_walker.walk_topdirs(topdirs, DEF_FILE_EXTENSION, threads, threads)
+                print('    %-12s %.3fs%s' % ('%d threads' % threads, time.perf_counter() - start,
+                                            '' if results == expected else '  MISMATCH'))
+        shutil.rmtree(root)
+
+
+def item_comparator(files, get_value):
+    # what the list control used to call back for every comparison, item data is the view index
+    def compare(item1, item2):
+        value1 = get_value(files[item1])
+        value2 = get_value(files[item2])
+        if value1 == value2:
+            return 0
+        elif value1 < value2:
+            return -1
+        return 1
+    return compare
+
+
+def bench_sort(counts, workdir):
+    for count in counts:
+        path = os.path.join(workdir, 'bench_sort_%d.yamm' % count)
+        create_catalog(path, count, cover_jpg=None)
+
+        catalog = Catalog(path)
+        catalog.open_database()
+        print('%d files' % count)
+        for name, sort_method, get_value in DEF_BENCH_SORTS:
+            files = list(catalog)
+            start = time.perf_counter()
+            items = sorted(range(len(files)), key=functools.cmp_to_key(item_comparator(files, get_value)))
+            compare_time = time.perf_counter() - start
+            compare_files = [files[item] for item in items]
+
+            start = time.perf_counter()
+            catalog.sort_files(files, sort_method)
+            key_time = time.perf_counter() - start
+            print('    %-12s comparator %.3fs  key %.3fs%s' %
+                  (name, compare_time, key_time,
+                   '' if [get_value(mf) for mf in files] == [get_value(mf) for mf in compare_files] else '  MISMATCH'))
+        catalog.close_database()
+        del catalog
+        os.remove(path)
+
+
+def bench_columns(counts, workdir):
+    for count in counts:
+        path = os.path.join(workdir, 'bench_columns_%d.yamm' % count)
+        create_catalog(path, count, cover_jpg=None)
+
+        catalog = Catalog(path)
+        catalog.open_database()
+        start = time.perf_counter()
+        store = catalog.get_column_store()
+        print('%d files : column store %.3fs' % (count, time.perf_counter() - start))
+
+        start = time.perf_counter()
+        python_total = sum(mf.size for mf in catalog if mf.size is not None)
+        python_time = time.perf_counter() - start
+        start = time.perf_counter()
+        store_total = store.total('size')
+        store_time = time.perf_counter() - start
+        print('    %-12s python %.3fs  numpy %.3fs%s' % ('total size', python_time, store_time,
+                                                    '' if python_total == store_total else '  MISMATCH'))
+
+        start = time.perf_counter()
+        python_ids = [mf.id for mf in catalog if mf.duration is not None and mf.duration > 3600]
+        python_time = time.perf_counter() - start
+        start = time.perf_counter()
+        store_ids = store.select('duration', 3600)
+        store_time = time.perf_counter() - start
+        print('    %-12s python %.3fs  numpy %.3fs%s' % ('duration>1h', python_time, store_time,
+                                                    '' if set(python_ids) == set(store_ids.tolist()) else '  MISMATCH'))
+        catalog.close_database()
+        del catalog
+        os.remove(path)
+
+
+benchmarks = {'open': (bench_open, DEF_BENCH_COUNTS),
+              'cover': (bench_cover, (1000, 10000, 100000)),
+              'memory': (bench_memory, (10000, 100000, 1000000)),
+              'snapshot': (bench_snapshot, (100000, 500000)),
+              'transaction': (bench_transaction, (100, 1000)),
+              'filter': (bench_filter, (100000, 1000000)),
+              'sort': (bench_sort, (10000, 200000)),
+              'columns': (bench_columns, (100000, 1000000)),
+              'facets': (bench_facets, (100000, 500000)),
+              'walk': (bench_walk, (100000, 1000000)),
+              'parallel_walk': (bench_parallel_walk, (100000,)),
+              }
+
+
+def print_help():
+    print("run benchmark              : benchmark.py [-w workdir] name [count1 count2 ...]")
+    print("available benchmarks       : %s" % ', '.join(sorted(benchmarks)))
+
+
+if __name__ == '__main__':
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'hw:', ['help', 'workdir='])
+    except getopt.GetoptError:
+        print_help()
+        sys.exit(-1)
+
+    workdir = tempfile.gettempdir()
+    for opt, arg in opts:
+        if opt in ('-h', '--help'):
+            print_help()
+            sys.exit(0)
+        elif opt in ('-w', '--workdir'):
+            workdir = arg
+
+    if not args or args[0] not in benchmarks:
+        print_help()
+        sys.exit(-1)
+
+    bench_func, counts = benchmarks[args[0]]
+    if args[1:]:
+        counts = [int(arg) for arg in args[1:]]
+
+    logging.basicConfig(level=logging.CRITICAL)
+    bench_func(counts, workdir)
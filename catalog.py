@@ -18,21 +18,42 @@
 
 import os
 import os.path
-import glob
+import sys
 import logging
 import sqlite3
 import datetime
 import re
+import time
+import operator
 import threading
+import collections
 import multiprocessing
 
 from settings import *
 import media_file
+import catalog_snapshot
+import catalog_query
+import thumbnail_pack
 import database_utils as db_utils
+from cover_cache import CoverCache
+from posting_index import PostingIndex, mask_to_ids
+from path_index import PathIndex
+from smart_collection import SmartCollection
+import column_store
+import dir_walker
 
 
 DB_MAJOR_VERSION = 0
-DB_MINOR_VERSION = 2
+DB_MINOR_VERSION = 5
+# catalogs written before the version table was used
+DB_BASE_VERSION = (0, 2)
+
+# (major, minor) : ((new major, new minor), step)
+# a step may be interrupted and run again, so it has to be idempotent
+DB_MIGRATIONS = {(0, 2): ((0, 3), db_utils.create_indexes),
+                 (0, 3): ((0, 4), db_utils.add_thumbnail_pack_columns),
+                 (0, 4): ((0, 5), db_utils.normalize_tags),
+                 }
 
 
 def get_abspath(topdir):
@@ -47,6 +68,88 @@ def get_rel_path(media_file):
     return os.path.join(media_file.reldir, media_file.filename)
 
 
+FILE_SORT_COLUMNS = {FILTER_SORT_FILENAME: ('file.filename',),
+                     FILTER_SORT_TIME: ('file.time',),
+                     FILTER_SORT_LASTPLAY: ('file.lastplay',),
+                     FILTER_SORT_DURATION: ('file.duration',),
+                     FILTER_SORT_PATH: ('topdir.path', 'file.reldir', 'file.filename'),
+                     FILTER_SORT_SIZE: ('file.size',),
+                     FILTER_SORT_RESOLUTION: ('MAX(file.width, file.height)',),
+                     }
+
+SORT_STORE_FIELDS = {FILTER_SORT_TIME: 'time',
+                     FILTER_SORT_LASTPLAY: 'lastplay',
+                     FILTER_SORT_DURATION: 'duration',
+                     FILTER_SORT_SIZE: 'size',
+                     FILTER_SORT_RESOLUTION: 'resolution',
+                     }
+
+def column_value(columns, name):
+    arr = columns.arrays[name]
+    typecode = columns.typecodes[name]
+
+    def get_value(mf):
+        if mf._row is None:
+            return mf._pending.get(name)
+        # NaN and the integer null marker are both missing, zero is a value
+        return media_file.from_column(arr[mf._row], typecode)
+    return get_value
+
+
+def resolution_value(columns):
+    get_width = column_value(columns, 'width')
+    get_height = column_value(columns, 'height')
+
+    def get_value(mf):
+        width = get_width(mf)
+        height = get_height(mf)
+        if width is None or height is None:
+            return None
+        return max(width, height)
+    return get_value
+
+
+def missing_last(get_value, ascend):
+    # missing values go last both ways, like NaN in ColumnStore.argsort, reverse=True flips the flag too
+    present, missing = (0, 1) if ascend else (1, 0)
+
+    def sort_key(mf):
+        value = get_value(mf)
+        if value is None:
+            return missing, 0
+        return present, value
+    return sort_key
+
+
+def count_file_labels(files):
+    actor_counts = collections.Counter()
+    tag_counts = collections.Counter()
+    for mf in files:
+        actor_counts.update(mf.get_actors())
+        tag_counts.update(mf.get_tags())
+    return actor_counts, tag_counts
+
+
+def fill_counts(names, counts):
+    return {name: counts.get(name, 0) for name in names}
+
+
+def get_sort_key(catalog, sort_method, ascend=True):
+    if sort_method == FILTER_SORT_FILENAME:
+        return operator.attrgetter('filename')
+    elif sort_method == FILTER_SORT_TIME:
+        return missing_last(column_value(catalog.columns, 'time'), ascend)
+    elif sort_method == FILTER_SORT_LASTPLAY:
+        return missing_last(column_store.get_lastplay_time, ascend)
+    elif sort_method == FILTER_SORT_DURATION:
+        return missing_last(column_value(catalog.columns, 'duration'), ascend)
+    elif sort_method == FILTER_SORT_SIZE:
+        return missing_last(column_value(catalog.columns, 'size'), ascend)
+    elif sort_method == FILTER_SORT_RESOLUTION:
+        return missing_last(resolution_value(catalog.columns), ascend)
+    return operator.attrgetter('abspath')
+
+
 class DbVersionException(Exception):
     pass
 
@@ -64,165 +167,628 @@ class Catalog(list):
         self.kill_thread = False
         self.thread_files = []
 
-    def open_database(self):
+        self.file_map = {}
+        self.topdir_id_map = {}
+        self.topdir_path_map = {}
+        self.open_timings = {}
+        self.cover_cache = CoverCache(self)
+        self.actor_index = PostingIndex()
+        self.tag_index = PostingIndex()
+        self.path_index = PathIndex()
+        self.collections = {}
+        self.column_store = None
+        self.column_store_key = None
+        self.filter_cache = collections.OrderedDict()
+        self.change_generation = 0
+        self.columns = media_file.MediaColumns()
+        self.use_snapshot = False
+        self.change_count = None
+        self.foreign_count = None
+        self.snapshot_count = None
+        self.filelog_seq = 0
+        self.filelog_reader = None
+        self.thumbnail_pack = None
+        self.pack_thumbnails = False
+        self.sql_filter = False
+        self.loading = False
+        self.page_cursor = None
+        self.page_total = 0
+
+    def mark_open_phase(self, phase, start):
+        now = time.perf_counter()
+        self.open_timings[phase] = now - start
+        logging.debug('open phase %s : %.3fs' % (phase, now - start))
+        return now
+
+    def open_database(self, use_snapshot=False, paged=False):
+        phase_start = time.perf_counter()
         try:
-            self.db_conn = sqlite3.connect(self.filepath)
+            self.db_conn = sqlite3.connect(self.filepath, timeout=DEF_DB_BUSY_TIMEOUT,
+                                           factory=db_utils.CatalogConnection)
             logging.info('sqlite3 version: ' + sqlite3.version)
+            db_utils.configure_connection(self.db_conn, DEF_DB_JOURNAL_MODE, DEF_DB_SYNCHRONOUS, DEF_DB_CACHE_SIZE)
         except Exception as e:
             logging.error('failed to open database file: %s' % self.filepath)
             logging.error('exception: %s' % e)
             return None
 
-        # get DB version
-        ver_tuple = db_utils.get_app_version(self.db_conn)
+        # bring older catalogs up to the current schema
+        ver_tuple = self.get_db_version()
         if ver_tuple:
             logging.info('database version = %d.%d' % (ver_tuple[0], ver_tuple[1]))
-            if ver_tuple[0] != DB_MAJOR_VERSION or ver_tuple[1] != DB_MINOR_VERSION:
-                raise DbVersionException('Catalog version updated')
+            self.migrate_database(ver_tuple)
 
         # enable foreign key support
         db_utils.enable_foreign_key(self.db_conn)
+        phase_start = self.mark_open_phase('connect', phase_start)
 
-        # create or load topdir table
+        # create tables if they do not exist
         db_utils.create_topdir_list(self.db_conn)
+        db_utils.create_thumbnail_table(self.db_conn)
+        db_utils.create_file_table(self.db_conn)
+        db_utils.create_actor_table(self.db_conn)
+        db_utils.create_actorfile_table(self.db_conn)
+        db_utils.create_tagname_table(self.db_conn)
+        db_utils.create_tagfile_table(self.db_conn)
+        db_utils.create_cover_table(self.db_conn)
+        db_utils.create_favorite_table(self.db_conn)
+        db_utils.create_changes_table(self.db_conn)
+        db_utils.create_own_changes(self.db_conn)
+        db_utils.create_filelog_table(self.db_conn)
+        db_utils.create_filelog_reader_table(self.db_conn)
+        db_utils.create_thumbpack_table(self.db_conn)
+        db_utils.create_collection_table(self.db_conn)
+        db_utils.create_indexes(self.db_conn)
+        if ver_tuple is None:
+            db_utils.set_app_version(self.db_conn, DB_MAJOR_VERSION, DB_MINOR_VERSION)
+        self.open_thumbnail_pack()
+        self.open_sql_filter()
+        phase_start = self.mark_open_phase('create', phase_start)
+
+        # registered before the read below, so at worst it holds back a few rows this catalog already has
+        self.filelog_reader = db_utils.add_filelog_reader(self.db_conn, db_utils.get_filelog_seq(self.db_conn),
+                                                          time.time())
+
+        # everything below is read in one transaction so it matches the change count
+        db_utils.begin(self.db_conn)
+        self.use_snapshot = use_snapshot
+        self.change_count = db_utils.get_change_count(self.db_conn)
+        self.foreign_count = db_utils.get_foreign_change_count(self.db_conn)
+        self.filelog_seq = db_utils.get_filelog_seq(self.db_conn)
+        self.snapshot_count = None
+        self.load_collections()
+        if use_snapshot and catalog_snapshot.load(self, self.change_count):
+            self.snapshot_count = self.change_count
+            phase_start = self.mark_open_phase('snapshot', phase_start)
+        elif paged:
+            # files are read later by load_page(), the read transaction stays open until then
+            self.load_topdirs()
+            self.load_actors()
+            self.load_tagnames()
+            self.mark_open_phase('names', phase_start)
+            self.loading = True
+            return
+        else:
+            phase_start = self.load_tables(phase_start)
+
+        # covers are read on demand through cover_cache
+        self.load_favorites()
+        self.mark_open_phase('favorite', phase_start)
+        self.db_conn.commit()
+
+    def get_db_version(self):
+        if not db_utils.has_table(self.db_conn, 'file'):
+            return None
+        if not db_utils.has_table(self.db_conn, 'version'):
+            return DB_BASE_VERSION
+        ver_tuple = db_utils.get_app_version(self.db_conn)
+        if not ver_tuple:
+            return DB_BASE_VERSION
+        return ver_tuple
+
+    def migrate_database(self, ver_tuple):
+        while ver_tuple != (DB_MAJOR_VERSION, DB_MINOR_VERSION):
+            if ver_tuple not in DB_MIGRATIONS:
+                raise DbVersionException('Cannot migrate catalog version %d.%d' % ver_tuple)
+            new_ver_tuple, step = DB_MIGRATIONS[ver_tuple]
+            logging.info('migrating database %d.%d -> %d.%d' % (ver_tuple + new_ver_tuple))
+            step(self.db_conn)
+            db_utils.set_app_version(self.db_conn, new_ver_tuple[0], new_ver_tuple[1])
+            ver_tuple = new_ver_tuple
+
+    def load_tables(self, phase_start):
+        self.load_topdirs()
+        phase_start = self.mark_open_phase('topdir', phase_start)
+
+        self.load_file_rows(db_utils.get_file_list(self.db_conn))
+        phase_start = self.mark_open_phase('file', phase_start)
+
+        self.load_actors()
+        phase_start = self.mark_open_phase('actor', phase_start)
+
+        self.load_actorfiles()
+        phase_start = self.mark_open_phase('actorfile', phase_start)
+
+        self.load_tagnames()
+        self.load_tags()
+        return self.mark_open_phase('tag', phase_start)
+
+    def load_topdirs(self):
         db_topdir_list = db_utils.get_topdir_list(self.db_conn)
         db_topdir_list.sort(key=get_2nd_element)
         for db_td in db_topdir_list:
             td = media_file.TopDirectory(self, db_td[1], db_td[2])
             td.load_dbtuple(db_td)
             self.topdir_list.append(td)
+        self.reindex_topdirs()
 
-        # create thumbnail table if does not exists
-        db_utils.create_thumbnail_table(self.db_conn)
-
-        # create or load file table
-        db_utils.create_file_table(self.db_conn)
-        db_file_list = db_utils.get_file_list(self.db_conn)
+    def load_file_rows(self, db_file_list):
+        files = []
         for df in db_file_list:
             topdir = self.get_topdir_from_id(df[1])
             mf = media_file.MediaFile(self, topdir, df[2], df[3])
             mf.load_dbtuple(df)
             self.append(mf)
+            files.append(mf)
+        return files
 
-        # create actor table
-        db_utils.create_actor_table(self.db_conn)
+    def load_actors(self):
         db_actor_list = db_utils.get_actor_list(self.db_conn)
         for db_actor in db_actor_list:
-            self.actor_list.append(db_actor[0])
+            self.actor_list.append(sys.intern(db_actor[0]))
 
-        # create actorfile table
-        db_utils.create_actorfile_table(self.db_conn)
-        db_actorfile_list = db_utils.get_actorfile_list(self.db_conn)
+    def load_actorfiles(self):
+        self.actor_index.reset()
+        self.reset_collections()
+        db_actorfile_list = db_utils.get_actorfile_names(self.db_conn)
         for db_actorfile in db_actorfile_list:
-            mf = self.get_file_from_id(db_actorfile[1])
-            actor_name = db_utils.get_actor_from_id(self.db_conn, db_actorfile[0])
-            mf.actor_list.append(actor_name)
+            mf = self.get_file_from_id(db_actorfile[0])
+            if mf:
+                mf.actor_list.append(sys.intern(db_actorfile[1]))
+
+    def load_tagnames(self):
+        for db_tag in db_utils.get_tag_names(self.db_conn):
+            self.tag_list.append(sys.intern(db_tag[0]))
 
-        # create or load tag table
-        db_utils.create_tag_table(self.db_conn)
+    def load_tags(self):
+        self.tag_index.reset()
+        self.reset_collections()
         db_tag_list = db_utils.get_tag_list(self.db_conn)
         for db_tag in db_tag_list:
-            tag = db_tag[0]
             mf = self.get_file_from_id(db_tag[1])
-            mf.tag_list.append(tag)
-            if tag not in self.tag_list:
-                self.tag_list.append(tag)
+            if mf:
+                mf.tag_list.append(sys.intern(db_tag[0]))
 
-        #load cover table
-        db_utils.create_cover_table(self.db_conn)
-        db_cover_list = db_utils.get_cover_list(self.db_conn)
-        for dc in db_cover_list:
-            file_id = dc[1]
-            jpg = dc[2]
-            for mf in self:
-                if mf.id == file_id:
-                    mf.cover = jpg
-                    break
+    def load_collections(self):
+        self.collections = {}
+        for collection_id, name, query in db_utils.get_collection_list(self.db_conn):
+            self.collections[name] = SmartCollection(collection_id, name, query)
 
-        #load favorite table
-        db_utils.create_favorite_table(self.db_conn)
-        db_favorite_list = db_utils.get_favorite_list(self.db_conn)
-        for fav in db_favorite_list:
-            file_id = fav[1]
-            thumb_id = fav[2]
-            for mf in self:
-                if mf.id != file_id:
-                    continue
-                thumb = db_utils.get_thumbnail_from_id(self.db_conn, thumb_id)
-                fav = media_file.Favorite(mf, thumb[2], fav[0], thumb_id)
-                fav.jpg = thumb[3]
-                mf.favorites.append(fav)
+    def start_paging(self, sort_method, ascend=True):
+        order_columns = FILE_SORT_COLUMNS.get(sort_method, FILE_SORT_COLUMNS[FILTER_SORT_PATH])
+        self.page_total = db_utils.get_file_count(self.db_conn)
+        self.page_cursor = db_utils.get_file_cursor(self.db_conn, order_columns, ascend)
+
+    def load_page(self, count):
+        if not self.loading:
+            return []
+        db_file_list = self.page_cursor.fetchmany(count)
+        files = self.load_file_rows(db_file_list)
+        if len(db_file_list) < count:
+            self.finish_paging()
+        return files
+
+    def finish_paging(self):
+        self.page_cursor = None
+        self.load_actorfiles()
+        self.load_tags()
+        self.load_favorites()
+        self.db_conn.commit()
+        self.loading = False
+
+    def open_thumbnail_pack(self):
+        generation = db_utils.get_pack_generation(self.db_conn)
+        if generation is None and DEF_USE_THUMBNAIL_PACK:
+            generation = 0
+            db_utils.set_pack_generation(self.db_conn, generation)
+        if generation is None:
+            return
+        self.thumbnail_pack = thumbnail_pack.ThumbnailPack(thumbnail_pack.get_pack_path(self.filepath, generation))
+        self.pack_thumbnails = True
+
+    def enable_thumbnail_pack(self):
+        if self.thumbnail_pack is not None:
+            return
+        db_utils.set_pack_generation(self.db_conn, 0)
+        self.open_thumbnail_pack()
+
+    def open_sql_filter(self):
+        if DEF_USE_SQL_FILTER or db_utils.has_table(self.db_conn, 'file_fts'):
+            self.enable_sql_filter()
+
+    def enable_sql_filter(self):
+        try:
+            db_utils.create_file_fts(self.db_conn)
+        except sqlite3.OperationalError as e:
+            logging.warning('filename index is not available : %s' % e)
+            return False
+        self.sql_filter = True
+        return True
+
+    def get_thumbnail_pack(self):
+        if self.pack_thumbnails:
+            return self.thumbnail_pack
+        return None
+
+    def load_favorites(self):
+        db_favorite_list = db_utils.get_favorite_thumbnails(self.db_conn, self.thumbnail_pack)
+        for db_fav in db_favorite_list:
+            mf = self.get_file_from_id(db_fav[1])
+            if not mf:
+                continue
+            fav = media_file.Favorite(mf, db_fav[3], db_fav[0], db_fav[2])
+            fav.jpg = db_fav[4]
+            mf.favorites.append(fav)
+
+    def store_snapshot(self):
+        if self.loading:
+            return
+        # files added or removed elsewhere are applied from the filelog, any other change from elsewhere is not
+        db_utils.begin(self.db_conn)
+        try:
+            change_count = db_utils.get_change_count(self.db_conn)
+            if change_count == self.snapshot_count:
+                return
+            if db_utils.get_foreign_change_count(self.db_conn) != self.foreign_count:
+                logging.info('catalog was changed by another connection : snapshot not stored')
+                return
+            if db_utils.get_filelog_seq(self.db_conn) != self.filelog_seq:
+                logging.info('files changed by another connection are not reloaded : snapshot not stored')
+                return
+            if catalog_snapshot.store(self, change_count):
+                self.snapshot_count = change_count
+        finally:
+            self.db_conn.commit()
+
+    def append(self, mf):
+        super(Catalog, self).append(mf)
+        mf.attach()
+        if mf.id is not None:
+            self.file_map[mf.id] = mf
+            self.path_index.add(mf)
+            if self.collections:
+                self.update_collections((mf,))
+
+    def remove(self, mf):
+        super(Catalog, self).remove(mf)
+        mf.detach()
+        if self.file_map.get(mf.id) is mf:
+            del self.file_map[mf.id]
+        self.cover_cache.discard(mf.id)
+        self.actor_index.discard_file(mf.id, mf.get_actors())
+        self.tag_index.discard_file(mf.id, mf.get_tags())
+        self.path_index.remove(mf.id)
+        for collection in self.collections.values():
+            collection.discard(mf.id)
+
+    def rename_file(self, mf, new_name):
+        # the file keeps its id, only the name indexed for it changes
+        self.path_index.remove(mf.id)
+        mf.filename = new_name
+        self.path_index.add(mf)
+        self.update_collections((mf,))
+        self.touch()
+
+    def reindex_topdirs(self):
+        self.topdir_id_map = {}
+        self.topdir_path_map = {}
+        for topdir in self.topdir_list:
+            self.topdir_id_map[topdir.id] = topdir
+            self.topdir_path_map[topdir.abspath] = topdir
 
     def add_actor(self, name):
         if name in self.actor_list:
             return
         db_utils.add_actor(self.db_conn, name)
         self.actor_list.append(name)
+        self.touch()
 
     def add_tag(self, tag):
         if tag in self.tag_list:
             return
+        db_utils.add_tagname(self.db_conn, tag)
         self.tag_list.append(tag)
+        self.touch()
+
+    def add_actor_files(self, name, mf_list):
+        mf_list = [mf for mf in mf_list if not mf.has_actor(name)]
+        if not mf_list:
+            return
+        added = name not in self.actor_list
+        try:
+            with self.transaction():
+                self.add_actor(name)
+                db_utils.add_actorfile_bulk(self.db_conn, name, [mf.id for mf in mf_list])
+        except Exception:
+            # the rolled back name is not kept either
+            if added:
+                self.actor_list.remove(name)
+            raise
+        for mf in mf_list:
+            mf.actor_list.append(name)
+        self.actor_index.add(name, [mf.id for mf in mf_list])
+        self.update_collections(mf_list)
+
+    def del_actor_files(self, name, mf_list):
+        mf_list = [mf for mf in mf_list if mf.has_actor(name)]
+        if not mf_list:
+            return
+        with self.transaction():
+            db_utils.del_actorfile_bulk(self.db_conn, name, [mf.id for mf in mf_list])
+        for mf in mf_list:
+            mf.actor_list.remove(name)
+        self.actor_index.discard(name, [mf.id for mf in mf_list])
+        self.update_collections(mf_list)
+
+    def add_tag_files(self, tag, mf_list):
+        mf_list = [mf for mf in mf_list if not mf.has_tag(tag)]
+        if not mf_list:
+            return
+        added = tag not in self.tag_list
+        try:
+            with self.transaction():
+                self.add_tag(tag)
+                db_utils.add_tag_bulk(self.db_conn, tag, [mf.id for mf in mf_list])
+        except Exception:
+            if added:
+                self.tag_list.remove(tag)
+            raise
+        for mf in mf_list:
+            mf.tag_list.append(tag)
+        self.tag_index.add(tag, [mf.id for mf in mf_list])
+        self.update_collections(mf_list)
+
+    def del_tag_files(self, tag, mf_list):
+        mf_list = [mf for mf in mf_list if mf.has_tag(tag)]
+        if not mf_list:
+            return
+        with self.transaction():
+            db_utils.del_tag_bulk(self.db_conn, tag, [mf.id for mf in mf_list])
+        for mf in mf_list:
+            mf.tag_list.remove(tag)
+        self.tag_index.discard(tag, [mf.id for mf in mf_list])
+        self.update_collections(mf_list)
+
+    def get_files_from_ids(self, file_ids):
+        files = []
+        for file_id in file_ids:
+            mf = self.file_map.get(file_id[0])
+            if mf is not None:
+                files.append(mf)
+        return files
 
     def get_file_from_id(self, file_id):
-        for mf in self:
-            if mf.id == file_id:
-                return mf
-        return None
+        return self.file_map.get(file_id)
 
-    def filter(self, actors=[], tags=[], filename='', stars=None):
-        l = []
-        for mf in self:
-            l.append(mf)
+    def add_collection(self, name, query):
+        if not name or name in self.collections:
+            return False
+        query = catalog_query.get_filter_query(query)
+        try:
+            catalog_query.compile_query(query)
+        except catalog_query.QueryException as e:
+            logging.warning('bad query %s : %s' % (query, e))
+            return False
+        collection_id = db_utils.add_collection(self.db_conn, name, query)
+        self.collections[name] = SmartCollection(collection_id, name, query)
+        self.touch()
+        return True
+
+    def del_collection(self, name):
+        if name not in self.collections:
+            return
+        db_utils.del_collection(self.db_conn, name)
+        del self.collections[name]
+        self.touch()
+
+    def get_collection_ids(self, name):
+        collection = self.collections.get(name)
+        # labels and the indexes are only complete after loading
+        if collection is None or self.loading:
+            return set()
+        return collection.get_file_ids(self)
+
+    def update_collections(self, files):
+        for collection in self.collections.values():
+            collection.update(self, files)
+
+    def reset_collections(self):
+        for collection in self.collections.values():
+            collection.reset()
+
+    def touch(self):
+        self.change_generation += 1
+
+    def get_generation(self):
+        # every counter only grows, so the sum changes with any change to files, labels or columns
+        return (self.change_generation + self.columns.version +
+                self.actor_index.version + self.tag_index.version)
+
+    def get_column_store(self):
+        # labels don't touch the numbers, only columns and play times do
+        key = (self.columns.version, self.change_generation)
+        if self.column_store is None or self.column_store_key != key:
+            self.column_store = column_store.ColumnStore(self)
+            self.column_store_key = key
+        return self.column_store
+
+    def get_cached_filter(self, key, compute):
+        if self.loading:
+            return compute()
+        generation = self.get_generation()
+        cached = self.filter_cache.get(key)
+        if cached is not None and cached[0] == generation:
+            self.filter_cache.move_to_end(key)
+            return cached[1]
+        l = compute()
+        self.filter_cache[key] = (generation, l)
+        while len(self.filter_cache) > DEF_FILTER_CACHE_SIZE:
+            self.filter_cache.popitem(last=False)
+        return l
+
+    def filter(self, actors=[], tags=[], filename='', stars=None, files=None, collection=None):
+        if collection is not None:
+            file_ids = self.get_collection_ids(collection)
+            if files is None and not (actors or tags or filename):
+                return [mf for mf in map(self.file_map.get, file_ids) if mf is not None]
+            return [mf for mf in self.filter(actors, tags, filename, files=files) if mf.id in file_ids]
+
+        if filename and catalog_query.is_query(filename):
+            try:
+                l = self.query(filename, files)
+            except catalog_query.QueryException as e:
+                # not a query after all, match the text as a part of the path
+                logging.warning('bad query %s : %s' % (filename, e))
+            else:
+                return self.filter(actors, tags, files=l)
+
+        if files is None:
+            if actors or tags or filename:
+                key = ('filter', tuple(sorted(actors)), tuple(sorted(tags)), filename.lower())
+                return list(self.get_cached_filter(key, lambda: self.filter_catalog(actors, tags, filename)))
+            files = self
+        l = list(files)
 
         if actors:
-            mf_i = 0
-            while mf_i < len(l):
-                mf = l[mf_i]
-                found = False
-                for actor in actors:
-                    if actor in mf.actor_list:
-                        found = True
-                if not found:
-                    del(l[mf_i])
-                else:
-                    mf_i += 1
+            l = [mf for mf in l if any(mf.has_actor(actor) for actor in actors)]
 
         if tags:
-            mf_i = 0
-            while mf_i < len(l):
-                mf = l[mf_i]
-                found = False
-                for tag in tags:
-                    if tag in mf.tag_list:
-                        found = True
-                if not found:
-                    del(l[mf_i])
-                else:
-                    mf_i += 1
+            l = [mf for mf in l if any(mf.has_tag(tag) for tag in tags)]
 
         if filename:
-            mf_i = 0
-            while mf_i < len(l):
-                mf = l[mf_i]
-                if not (filename.lower() in mf.abspath.lower()):
-                    del(l[mf_i])
-                else:
-                    mf_i += 1
+            filename = filename.lower()
+            l = [mf for mf in l if filename in mf.abspath.lower()]
+
+        return l
+
+    def sort_files(self, files, sort_method, ascend=True, get_file=None):
+        field = SORT_STORE_FIELDS.get(sort_method)
+        if field is not None:
+            mf_list = files if get_file is None else [get_file(item) for item in files]
+            store = self.get_column_store()
+            rows = store.get_rows(mf_list)
+            if rows is not None:
+                files[:] = [files[n] for n in store.argsort(field, rows, ascend).tolist()]
+                return
+
+        # one key per file and a single sort, the keys of the columns are read straight from the arrays
+        sort_key = get_sort_key(self, sort_method, ascend)
+        if get_file is not None:
+            file_key = sort_key
+            sort_key = lambda item: file_key(get_file(item))
+        files.sort(key=sort_key, reverse=not ascend)
+
+    def filter_catalog(self, actors=[], tags=[], filename=''):
+        if self.sql_filter and not self.loading:
+            return self.filter_sql(actors, tags, filename)
+        if not self.loading:
+            return self.filter_index(actors, tags, filename)
+        return self.filter(actors, tags, filename, files=list(self))
+
+    def build_label_index(self):
+        if not self.actor_index.is_built():
+            self.actor_index.build(self, media_file.MediaFile.get_actors)
+        if not self.tag_index.is_built():
+            self.tag_index.build(self, media_file.MediaFile.get_tags)
+
+    def get_facet_counts(self, actors=[], tags=[], filename='', collection=None):
+        # files per actor and tag within the filtered files, from the posting sets
+        if self.loading:
+            return {}, {}
+        key = ('facets', tuple(sorted(actors)), tuple(sorted(tags)), filename.lower(), collection)
+        return self.get_cached_filter(key, lambda: self.count_facets(actors, tags, filename, collection))
+
+    def count_facets(self, actors=[], tags=[], filename='', collection=None):
+        self.build_label_index()
+        mask = None
+        if actors or tags or filename or collection is not None:
+            files = self.filter(actors, tags, filename, collection=collection)
+            # a few files are counted faster one by one than by masking every posting set
+            if len(files) < len(self) // DEF_FACET_SCAN_RATIO:
+                actor_counts, tag_counts = count_file_labels(files)
+                return fill_counts(self.actor_list, actor_counts), fill_counts(self.tag_list, tag_counts)
+            mask = column_store.ids_to_mask(column_store.get_file_ids(files))
+        # both ways count every known name, zero included
+        return (fill_counts(self.actor_list, self.actor_index.get_counts(mask)),
+                fill_counts(self.tag_list, self.tag_index.get_counts(mask)))
+
+    def build_path_index(self):
+        if not self.path_index.is_built():
+            self.path_index.build(self)
+
+    def query(self, text, files=None):
+        key = ('query', ' '.join(catalog_query.tokenize(text)))
+        l = self.get_cached_filter(key, lambda: self.run_query(text))
+        if files is not None:
+            matched = set(l)
+            return [mf for mf in files if mf in matched]
+        return list(l)
+
+    def run_query(self, text):
+        l = []
+        for file_id in catalog_query.run_query(self, text):
+            mf = self.file_map.get(file_id)
+            if mf is not None:
+                l.append(mf)
+        return l
+
+    def filter_index(self, actors=[], tags=[], filename=''):
+        file_ids = None
+        if actors or tags:
+            self.build_label_index()
+            mask = -1
+            if actors:
+                mask &= self.actor_index.get_mask(actors)
+            if tags:
+                mask &= self.tag_index.get_mask(tags)
+            file_ids = mask_to_ids(mask)
+
+        if filename:
+            self.build_path_index()
+            name_ids = self.path_index.search(filename)
+            if file_ids is None:
+                file_ids = name_ids
+            else:
+                name_ids = set(name_ids)
+                file_ids = [file_id for file_id in file_ids if file_id in name_ids]
+
+        l = []
+        for file_id in file_ids:
+            mf = self.file_map.get(file_id)
+            if mf is not None:
+                l.append(mf)
+        return l
+
+    def filter_sql(self, actors=[], tags=[], filename=''):
+        # the index only sees single path components, a name spanning several is checked on the whole path
+        filename = filename.lower()
+        name = max(re.split(r'[\\/]', filename), key=len)
+        l = []
+        for file_id in db_utils.filter_file_ids(self.db_conn, actors, tags, name):
+            mf = self.file_map.get(file_id[0])
+            if mf is not None:
+                l.append(mf)
+
+        if name != filename:
+            l = [mf for mf in l if filename in mf.abspath.lower()]
 
         return l
 
     def get_topdir_from_id(self, topdir_id):
-        for topdir in self.topdir_list:
-            if topdir.id == topdir_id:
-                return topdir
-        return None
+        return self.topdir_id_map.get(topdir_id)
 
     def get_topdir_from_abspath(self, abspath):
-        for topdir in self.topdir_list:
-            if topdir.abspath == abspath:
-                return topdir
-        return None
+        return self.topdir_path_map.get(abspath)
 
     def add_topdir(self, abspath, comment=None, exclude=False):
         topdir = self.get_topdir_from_abspath(abspath)
@@ -246,6 +812,7 @@ class Catalog(list):
         if (topdir):
             self.topdir_list.append(topdir)
         self.sync_topdir()
+        self.reindex_topdirs()
 
     def del_topdir(self, abspath):
         topdir = self.get_topdir_from_abspath(abspath)
@@ -254,6 +821,7 @@ class Catalog(list):
 
         self.topdir_list.remove(topdir)
         self.sync_topdir()
+        self.reindex_topdirs()
 
     def sync_topdir(self):
         db_list = db_utils.get_topdir_list(self.db_conn)
@@ -280,62 +848,37 @@ class Catalog(list):
         if db_i < len(db_list):
             only_db_list.extend(db_list[db_i:])
 
-        for only_ob in only_ob_list:
-            db_utils.add_topdir(self.db_conn, only_ob)
-            only_ob.id = db_utils.get_topdir_id(self.db_conn, only_ob.abspath)
-        for only_db in only_db_list:
-            db_utils.del_topdir(self.db_conn, only_db[1])
-
-    def in_extension_list(self, filename, ext_list):
-        for ext in ext_list:
-            if filename.lower().endswith(ext):
-                return True
-        return False
-
-    def get_dir_filelist(self, topdir, ext_list, msg_cb=None):
-        msg_cb('processing directory : %s' % topdir)
-
-        new_filelist = []
-        try:
-            names = glob.glob(os.path.join(topdir, '*'))
-        except re.error:
-            return []
-
-        for name in names:
-            if self.kill_thread:
-                return []
-            path = os.path.join(topdir, name)
-            abspath = os.path.abspath(path)
-            if os.path.isfile(abspath):
-                if not self.in_extension_list(name, ext_list):
-                    continue
-                new_filelist.append(abspath)
-            if os.path.isdir(abspath):
-                add_files = self.get_dir_filelist(path, ext_list, msg_cb=msg_cb)
-                new_filelist.extend(add_files)
-
-        return new_filelist
+        with self.transaction():
+            for only_ob in only_ob_list:
+                only_ob.id = db_utils.add_topdir(self.db_conn, only_ob)
+            for only_db in only_db_list:
+                db_utils.del_topdir(self.db_conn, only_db[1])
 
     def sync_files(self, msg_cb=None):
         add_db_list = []
         del_db_list = []
 
+        topdirs = []
         for topdir in self.topdir_list:
             if not os.path.exists(topdir.abspath):
                 logging.warning('topdir is not accessible.. ignoring..')
                 msg_cb('topdir is not accessible.. ignoring %s' % topdir.abspath)
                 continue
-            fs_list = self.get_dir_filelist(topdir.abspath, self.extension_list, msg_cb=msg_cb)
-            if self.kill_thread:
-                return
+            topdirs.append(topdir)
+        fs_lists = dir_walker.walk_topdirs([topdir.abspath for topdir in topdirs], self.extension_list,
+                                           DEF_WALK_THREADS, DEF_WALK_MOUNT_THREADS, msg_cb=msg_cb,
+                                           is_killed=lambda: self.kill_thread)
+        if fs_lists is None or self.kill_thread:
+            return
 
+        for topdir in topdirs:
+            fs_list = fs_lists[topdir.abspath]
             db_list = []
             for mf in self:
                 if mf.topdir != topdir:
                     continue
                 db_list.append(mf)
 
-            fs_list.sort()
             db_list.sort(key=get_abspath)
             fs_i = 0
             db_i = 0
@@ -369,12 +912,13 @@ class Catalog(list):
                     return
                 del_db_list.append(onlydb)
 
-        for mf in del_db_list:
-            if self.kill_thread:
-                return
-            db_utils.del_file_nocommit(self.db_conn, mf)
-            self.remove(mf)
-            self.db_conn.commit()
+        with self.transaction():
+            for mf in del_db_list:
+                if self.kill_thread:
+                    return
+                db_utils.del_file_nocommit(self.db_conn, mf)
+                self.remove(mf)
+            self.advance_filelog({mf.id for mf in del_db_list})
 
         cpu_count = multiprocessing.cpu_count()
         if cpu_count > 4:
@@ -400,21 +944,24 @@ class Catalog(list):
             if self.kill_thread:
                 return
 
-            for mf in self.thread_files:
+            self.store_new_files(self.thread_files)
+            self.thread_files = []
+
+        if msg_cb is not None:
+            msg_cb('Sync Finished')
+
+    def store_new_files(self, mf_list):
+        with self.transaction():
+            db_utils.add_files_nocommit(self.db_conn, mf_list)
+            db_utils.add_thumbnails_bulk(self.db_conn, [(mf.id, mf.thumbnails) for mf in mf_list if mf.thumbnails],
+                                         self.get_thumbnail_pack())
+            for mf in mf_list:
                 if mf.thumbnails:
                     cover_jpg = mf.thumbnails[int(len(mf.thumbnails) * 0.7)][1]
-                db_utils.add_file_nocommit(self.db_conn, mf)
-                self.db_conn.commit()
-                db_utils.set_file_id(self.db_conn, mf)
-                if mf.thumbnails:
-                    mf.save_thumbnails()
                     db_utils.del_cover(self.db_conn, mf.id)
                     db_utils.add_cover(self.db_conn, mf.id, cover_jpg)
                 self.append(mf)
-            self.thread_files = []
-
-        if msg_cb is not None:
-            msg_cb('Sync Finished')
+            self.advance_filelog({mf.id for mf in mf_list})
 
     def sync_thread_func(self, mf):
         mf.loadinfo()
@@ -424,50 +971,78 @@ class Catalog(list):
         self.thread_files.append(mf)
 
     def del_file(self, mf):
-        if mf not in self:
-            return
+        return self.del_files([mf])
 
-        os.remove(mf.abspath)
-        self.remove(mf)
-        db_utils.del_file_nocommit(self.db_conn, mf)
-        self.db_conn.commit()
+    def del_files(self, mf_list):
+        mf_list = [mf for mf in mf_list if self.file_map.get(mf.id) is mf]
+        with self.transaction():
+            for mf in mf_list:
+                db_utils.del_file_nocommit(self.db_conn, mf)
+            self.advance_filelog({mf.id for mf in mf_list})
 
-    def reload_files(self):
-        min_fileid = 0
-        for mf in self:
-            if mf.id > min_fileid:
-                max_fileid = mf.id
-        db_file_list = db_utils.get_file_list(self.db_conn, min_fileid)
-
-        mf_i = 0
-        while mf_i < len(self):
-            mf = self[mf_i]
-            df_i = 0
-            found = False
-            while df_i < len(db_file_list):
-                df = db_file_list[df_i]
-                if mf.id == df[0]:
-                    del(db_file_list[df_i])
-                    df_i -= 1
-                    found = True
-                    break
-                df_i += 1
-            if not found:
-                del(self[mf_i])
-                mf_i -= 1
-            mf_i += 1
+        # a file is only taken off the disk once its row is gone for good
+        for mf in mf_list:
+            self.remove(mf)
+            try:
+                os.remove(mf.abspath)
+            except OSError as e:
+                logging.error('cannot remove %s : %s' % (mf.abspath, e))
+        return mf_list
+
+    def advance_filelog(self, file_ids):
+        # skips the rows of this catalog's own writes, runs in their transaction so nothing can come in between
+        filelog = db_utils.get_filelog(self.db_conn, self.filelog_seq)
+        if not filelog:
+            return
+        if any(file_id not in file_ids for seq, file_id, op in filelog):
+            # rows of other connections are still to be reloaded, reload_files skips the own ones
+            return
+        self.filelog_seq = filelog[-1][0]
+        self.update_filelog_reader()
 
-        for df in db_file_list:
-            topdir = self.get_topdir_from_id(df[1])
-            mf = media_file.MediaFile(self, topdir, df[2], df[3])
-            mf.load_dbtuple(df)
-            mf.load_thumbnails()
-            mf.get_coverjpg()
-            del(mf.thumbnails)
-            mf.thumbnails = None
-            self.append(mf)
+    def reload_files(self):
+        filelog = db_utils.get_filelog(self.db_conn, self.filelog_seq)
+        if not filelog:
+            return [], []
+        self.filelog_seq = filelog[-1][0]
+        self.update_filelog_reader()
+
+        # file ids are never reused, so only the net effect per id matters
+        inserted = {}
+        removed = []
+        for seq, file_id, op in filelog:
+            if op == db_utils.FILELOG_INSERT:
+                inserted[file_id] = True
+                continue
+            inserted.pop(file_id, None)
+            mf = self.file_map.get(file_id)
+            if mf:
+                self.remove(mf)
+                removed.append(mf)
+
+        file_ids = [file_id for file_id in inserted if file_id not in self.file_map]
+        if not file_ids:
+            return [], removed
+        added = self.load_file_rows(db_utils.get_files(self.db_conn, file_ids))
+        for file_id, jpg in db_utils.get_covers(self.db_conn, file_ids):
+            self.cover_cache.put(file_id, jpg)
+        logging.debug('reloaded files : %d added, %d removed' % (len(added), len(removed)))
+        return added, removed
+
+    def update_filelog_reader(self):
+        # also the heartbeat of the catalog, a row left alone for DEF_FILELOG_READER_EXPIRE is dropped by a sync
+        if self.filelog_reader is None or self.loading:
+            return
+        if db_utils.set_filelog_reader(self.db_conn, self.filelog_reader, self.filelog_seq, time.time()):
+            return
+        logging.warning('filelog reader expired : files changed elsewhere may be missing until the catalog is reopened')
+        self.filelog_reader = db_utils.add_filelog_reader(self.db_conn, self.filelog_seq, time.time())
 
     def sync_database(self, msg_cb=None):
+        # only rows every open catalog has applied are dropped
+        trim_seq = db_utils.get_filelog_trim_seq(self.db_conn, time.time() - DEF_FILELOG_READER_EXPIRE)
+        if trim_seq is not None:
+            db_utils.trim_filelog(self.db_conn, trim_seq)
         self.sync_topdir()
         self.sync_files(msg_cb=msg_cb)
 
@@ -475,6 +1050,10 @@ class Catalog(list):
         newpath = os.path.abspath(newpath)
         db_utils.update_topdir(self.db_conn, topdir.abspath, newpath)
         topdir.abspath = newpath
+        self.reindex_topdirs()
+        self.path_index.reset()
+        self.reset_collections()
+        self.touch()
 
     def modify_actor(self, orig_name, new_name):
         if orig_name not in self.actor_list:
@@ -482,9 +1061,12 @@ class Catalog(list):
         if new_name in self.actor_list:
             return False
 
-        db_utils.modify_actor(self.db_conn, orig_name, new_name)
-        for mf in self:
+        with self.transaction():
+            file_ids = db_utils.get_actor_file_ids(self.db_conn, orig_name)
+            db_utils.modify_actor(self.db_conn, orig_name, new_name)
+        for mf in self.get_files_from_ids(file_ids):
             mf.modify_actor(orig_name, new_name)
+        self.actor_index.rename(orig_name, new_name)
         self.actor_list.remove(orig_name)
         self.actor_list.append(new_name)
         self.actor_list.sort()
@@ -496,8 +1078,17 @@ class Catalog(list):
         if new_tag in self.tag_list:
             return False
 
-        for mf in self:
-            mf.modify_tag(orig_tag, new_tag)
+        with self.transaction():
+            file_ids = db_utils.get_tag_file_ids(self.db_conn, orig_tag)
+            db_utils.rename_tag(self.db_conn, orig_tag, new_tag)
+        files = self.get_files_from_ids(file_ids)
+        for mf in files:
+            if mf.has_tag(orig_tag):
+                mf.tag_list.remove(orig_tag)
+                mf.tag_list.append(new_tag)
+                mf.tag_list.sort()
+        self.tag_index.rename(orig_tag, new_tag)
+        self.update_collections(files)
         self.tag_list.remove(orig_tag)
         self.tag_list.append(new_tag)
         self.tag_list.sort()
@@ -506,20 +1097,45 @@ class Catalog(list):
     def del_actor(self, name):
         if name not in self.actor_list:
             return
-        for mf in self:
-            mf.del_actor(name)
+        with self.transaction():
+            file_ids = db_utils.get_actor_file_ids(self.db_conn, name)
+            self.del_actor_files(name, self.get_files_from_ids(file_ids))
+            db_utils.del_actor(self.db_conn, name)
+        self.actor_index.remove(name)
         self.actor_list.remove(name)
-        db_utils.del_actor(self.db_conn, name)
 
     def del_tag(self, tag):
         if tag not in self.tag_list:
             return
-        for mf in self:
-            mf.del_tag(tag)
+        with self.transaction():
+            file_ids = db_utils.get_tag_file_ids(self.db_conn, tag)
+            db_utils.del_tagname(self.db_conn, tag)
+        files = self.get_files_from_ids(file_ids)
+        for mf in files:
+            if mf.has_tag(tag):
+                mf.tag_list.remove(tag)
+        self.tag_index.remove(tag)
+        self.update_collections(files)
         self.tag_list.remove(tag)
 
+    def transaction(self):
+        return db_utils.transaction(self.db_conn)
+
     def close_database(self):
+        if self.page_cursor:
+            self.page_cursor.close()
+            self.page_cursor = None
+            # end the paging read transaction before the writes below
+            self.db_conn.commit()
         if self.db_conn:
+            if self.use_snapshot:
+                self.store_snapshot()
+            if self.filelog_reader is not None:
+                db_utils.del_filelog_reader(self.db_conn, self.filelog_reader)
+                self.filelog_reader = None
             self.db_conn.close()
+            self.db_conn = None
+        if self.thumbnail_pack is not None:
+            self.thumbnail_pack.close()
 
 
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+
+# Copyright 2020 pinebud77@hotmail.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Catalog query language
+#   tag:hd AND duration>1h AND NOT actor:x
+#   (tag:hd OR tag:sd) size>=1G created>=2020-01-01 holiday
+# Terms next to each other are ANDed and a bare word matches a part of the path.
+# Text is only read as a query when it holds AND/OR/NOT, a label or a range term,
+# or starts with "?" : "?(live)" is a query, "(live)" a part of the path.
+# Values holding spaces are quoted : tag:"live show". Ranges take seconds or
+# s/m/h for duration, K/M/G/T for size, pixels of the longer side for
+# resolution and YYYY-MM-DD or seconds since the epoch for created/lastplay.
+# Every term of the plan yields a bitmap of file ids : labels come from the
+# posting sets, words from the path index and ranges from the column store.
+# A plan can also match a single file, smart collections use that to follow changes.
+
+import re
+import datetime
+
+from posting_index import mask_to_ids
+from column_store import ids_to_mask, get_lastplay_time
+
+
+QUERY_PREFIX = '?'
+QUERY_KEYWORDS = ('AND', 'OR', 'NOT')
+QUERY_LABELS = ('actor', 'tag')
+QUERY_COLUMNS = {'duration': 'duration',
+                 'size': 'size',
+                 'created': 'time',
+                 'resolution': 'resolution',
+                 'lastplay': 'lastplay',
+                 }
+
+SIZE_UNITS = {'': 1, 'k': 1 << 10, 'm': 1 << 20, 'g': 1 << 30, 't': 1 << 40}
+DURATION_UNITS = {'': 1, 's': 1, 'm': 60, 'h': 3600}
+
+token_re = re.compile(r'\s*(?:(\()|(\))|([^\s()"]*"(?:[^"]|"")*"|[^\s()"]+))')
+range_re = re.compile(r'^(%s)(>=|<=|>|<|=)(.+)$' % '|'.join(QUERY_COLUMNS), re.IGNORECASE)
+label_re = re.compile(r'^(%s):(.+)$' % '|'.join(QUERY_LABELS), re.IGNORECASE)
+number_re = re.compile(r'^(\d+(?:\.\d+)?)([a-z]*)$')
+
+
+class QueryException(Exception):
+    pass
+
+
+def unquote(s):
+    if s.endswith('"') and '"' in s[:-1]:
+        start = s.index('"')
+        return s[:start] + s[start + 1:-1].replace('""', '"')
+    return s
+
+
+def tokenize(text):
+    tokens = []
+    pos = 0
+    text = text.strip()
+    if text.startswith(QUERY_PREFIX):
+        text = text[len(QUERY_PREFIX):].lstrip()
+    while pos < len(text):
+        m = token_re.match(text, pos)
+        if not m or m.end() == pos:
+            raise QueryException('cannot read query at "%s"' % text[pos:])
+        pos = m.end()
+        if m.group(1):
+            tokens.append('(')
+        elif m.group(2):
+            tokens.append(')')
+        else:
+            tokens.append(m.group(3))
+    return tokens
+
+
+def is_query(text):
+    # parentheses alone are common in file names, they don't make a query
+    if text.strip().startswith(QUERY_PREFIX):
+        return True
+    try:
+        tokens = tokenize(text)
+    except QueryException:
+        return False
+    for token in tokens:
+        if token in QUERY_KEYWORDS:
+            return True
+        if label_re.match(token) or range_re.match(token):
+            return True
+    return False
+
+
+def parse_number(field, value):
+    m = number_re.match(value.lower())
+    if not m:
+        return None
+    number = float(m.group(1))
+    unit = m.group(2)
+    if field == 'size':
+        unit = unit[:-1] if unit.endswith('b') else unit
+        if unit not in SIZE_UNITS:
+            return None
+        return number * SIZE_UNITS[unit]
+    if field == 'duration':
+        if unit not in DURATION_UNITS:
+            return None
+        return number * DURATION_UNITS[unit]
+    if field == 'resolution':
+        if unit not in ('', 'p'):
+            return None
+        return number
+    if unit:
+        return None
+    return number
+
+
+def parse_value(field, value):
+    # returns [start, stop), a bare number is a single point with stop == start
+    number = parse_number(field, value)
+    if number is not None:
+        return number, number
+    if field == 'duration' and ':' in value:
+        seconds = 0.0
+        try:
+            for part in value.split(':'):
+                seconds = seconds * 60 + float(part)
+        except ValueError:
+            raise QueryException('bad duration : %s' % value)
+        return seconds, seconds
+    if field in ('created', 'lastplay'):
+        try:
+            dt = datetime.datetime.fromisoformat(value)
+        except ValueError:
+            raise QueryException('bad date : %s' % value)
+        start = dt.timestamp()
+        if len(value) <= len('YYYY-MM-DD'):
+            return start, (dt + datetime.timedelta(days=1)).timestamp()
+        return start, start
+    raise QueryException('bad %s value : %s' % (field, value))
+
+
+def get_interval(op, start, stop):
+    # (low, low inclusive, high, high inclusive), None leaves a side open
+    if start == stop:
+        return {'>': (start, False, None, False),
+                '>=': (start, True, None, False),
+                '<': (None, False, start, False),
+                '<=': (None, False, start, True),
+                '=': (start, True, start, True)}[op]
+    return {'>': (stop, True, None, False),
+            '>=': (start, True, None, False),
+            '<': (None, False, start, False),
+            '<=': (None, False, stop, False),
+            '=': (start, True, stop, False)}[op]
+
+
+def in_interval(value, low, low_incl, high, high_incl):
+    if low is not None and (value < low or (value == low and not low_incl)):
+        return False
+    if high is not None and (value > high or (value == high and not high_incl)):
+        return False
+    return True
+
+
+def get_file_value(mf, column):
+    # the value one file has in the column store
+    if column == 'lastplay':
+        return get_lastplay_time(mf)
+    if column == 'resolution':
+        if mf.width is None or mf.height is None:
+            return None
+        return max(mf.width, mf.height)
+    return getattr(mf, column)
+
+
+class AndNode:
+    def __init__(self, children):
+        # cheap bitmaps first, the path search can be skipped once nothing is left
+        self.children = sorted(children, key=lambda child: child.cost)
+        self.cost = max(child.cost for child in children)
+
+    def evaluate(self, catalog):
+        mask = -1
+        for child in self.children:
+            mask &= child.evaluate(catalog)
+            if not mask:
+                break
+        return mask
+
+    def matches(self, catalog, mf):
+        return all(child.matches(catalog, mf) for child in self.children)
+
+
+class OrNode:
+    def __init__(self, children):
+        self.children = children
+        self.cost = max(child.cost for child in children)
+
+    def evaluate(self, catalog):
+        mask = 0
+        for child in self.children:
+            mask |= child.evaluate(catalog)
+        return mask
+
+    def matches(self, catalog, mf):
+        return any(child.matches(catalog, mf) for child in self.children)
+
+
+class NotNode:
+    def __init__(self, child):
+        self.child = child
+        self.cost = child.cost
+
+    def evaluate(self, catalog):
+        return catalog.get_column_store().get_all_mask() & ~self.child.evaluate(catalog)
+
+    def matches(self, catalog, mf):
+        return not self.child.matches(catalog, mf)
+
+
+class LabelNode:
+    cost = 0
+
+    def __init__(self, kind, name):
+        self.kind = kind
+        self.name = name
+
+    def evaluate(self, catalog):
+        catalog.build_label_index()
+        if self.kind == 'actor':
+            return catalog.actor_index.get_mask((self.name,))
+        return catalog.tag_index.get_mask((self.name,))
+
+    def matches(self, catalog, mf):
+        if self.kind == 'actor':
+            return mf.has_actor(self.name)
+        return mf.has_tag(self.name)
+
+
+class RangeNode:
+    cost = 1
+
+    def __init__(self, field, interval):
+        self.field = field
+        self.interval = interval
+
+    def evaluate(self, catalog):
+        store = catalog.get_column_store()
+        return ids_to_mask(store.select(QUERY_COLUMNS[self.field], *self.interval))
+
+    def matches(self, catalog, mf):
+        value = get_file_value(mf, QUERY_COLUMNS[self.field])
+        return value is not None and in_interval(value, *self.interval)
+
+
+class PathNode:
+    cost = 2
+
+    def __init__(self, word):
+        self.word = word
+
+    def evaluate(self, catalog):
+        catalog.build_path_index()
+        return ids_to_mask(catalog.path_index.search(self.word))
+
+    def matches(self, catalog, mf):
+        return self.word.lower() in mf.abspath.lower()
+
+
+class QueryParser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return None
+
+    def next(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def parse(self):
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise QueryException('unexpected "%s"' % self.peek())
+        return node
+
+    def parse_or(self):
+        children = [self.parse_and()]
+        while self.peek() == 'OR':
+            self.next()
+            children.append(self.parse_and())
+        if len(children) == 1:
+            return children[0]
+        return OrNode(children)
+
+    def parse_and(self):
+        children = [self.parse_not()]
+        while self.peek() not in (None, 'OR', ')'):
+            if self.peek() == 'AND':
+                self.next()
+            children.append(self.parse_not())
+        if len(children) == 1:
+            return children[0]
+        return AndNode(children)
+
+    def parse_not(self):
+        if self.peek() == 'NOT':
+            self.next()
+            return NotNode(self.parse_not())
+        return self.parse_term()
+
+    def parse_term(self):
+        token = self.next()
+        if token is None:
+            raise QueryException('query ends too early')
+        if token == '(':
+            node = self.parse_or()
+            if self.next() != ')':
+                raise QueryException('missing ")"')
+            return node
+        if token == ')' or token in QUERY_KEYWORDS:
+            raise QueryException('unexpected "%s"' % token)
+
+        m = label_re.match(token)
+        if m:
+            return LabelNode(m.group(1).lower(), unquote(m.group(2)))
+        m = range_re.match(token)
+        if m:
+            field = m.group(1).lower()
+            start, stop = parse_value(field, unquote(m.group(3)))
+            return RangeNode(field, get_interval(m.group(2), start, stop))
+        return PathNode(unquote(token))
+
+
+def quote_path(text):
+    return '"%s"' % text.replace('"', '""')
+
+
+def get_filter_query(text):
+    # the query matching what the filter shows for text, plain or unreadable text is a part of the path
+    if is_query(text):
+        try:
+            compile_query(text)
+            return text
+        except QueryException:
+            pass
+    return quote_path(text)
+
+
+def compile_query(text):
+    tokens = tokenize(text)
+    if not tokens:
+        raise QueryException('empty query')
+    return QueryParser(tokens).parse()
+
+
+def run_query(catalog, text):
+    return mask_to_ids(compile_query(text).evaluate(catalog))
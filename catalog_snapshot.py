@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+
+# Copyright 2020 pinebud77@hotmail.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Snapshot file layout (native byte order, every section padded to 8 bytes)
+#   header  : magic, format version, byte order, change count, section count
+#   section : 4 byte name, array typecode ('s' for strings), data length, data
+# String sections start with the item count and hold '\0' separated UTF-8.
+
+import os
+import gc
+import sys
+import mmap
+import array
+import struct
+import logging
+
+import media_file
+
+
+SNAPSHOT_MAGIC = b'YAMMSNAP'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = '<8sIIqI'
+SNAPSHOT_SECTION = '<4sc3xQ'
+SNAPSHOT_COUNT = '<Q'
+SNAPSHOT_EXTENSION = '.snap'
+
+NULL_STRING = '\x01'
+
+
+def get_snapshot_path(db_abspath):
+    return db_abspath + SNAPSHOT_EXTENSION
+
+
+def get_byteorder():
+    if sys.byteorder == 'little':
+        return 1
+    return 0
+
+
+def pack_strings(strings):
+    items = []
+    for s in strings:
+        if s is None:
+            items.append(NULL_STRING)
+        else:
+            items.append(str(s))
+    return struct.pack(SNAPSHOT_COUNT, len(items)) + '\0'.join(items).encode('utf-8')
+
+
+def unpack_strings(mv):
+    count = struct.unpack_from(SNAPSHOT_COUNT, mv)[0]
+    if not count:
+        return []
+    strings = bytes(mv[struct.calcsize(SNAPSHOT_COUNT):]).decode('utf-8').split('\0')
+    if len(strings) != count:
+        raise ValueError('string count mismatch')
+    for n in range(count):
+        if strings[n] == NULL_STRING:
+            strings[n] = None
+    return strings
+
+
+def write_section(f, name, typecode, data):
+    f.write(struct.pack(SNAPSHOT_SECTION, name, typecode, len(data)))
+    f.write(data)
+    pad = -len(data) % 8
+    if pad:
+        f.write(b'\0' * pad)
+
+
+def store(catalog, change_count):
+    path = get_snapshot_path(catalog.filepath)
+    sections = []
+
+    topdirs = catalog.topdir_list
+    sections.append((b'TDID', b'q', array.array('q', [td.id for td in topdirs]).tobytes()))
+    sections.append((b'TDEX', b'b', array.array('b', [1 if td.exclude else 0 for td in topdirs]).tobytes()))
+    sections.append((b'TDPT', b's', pack_strings([td.abspath for td in topdirs])))
+    sections.append((b'TDCM', b's', pack_strings([td.comment for td in topdirs])))
+
+    # files are written in column row order so the columns can be copied as a whole
+    files = catalog.columns.files
+    reldir_index = {}
+    reldirs = []
+    dir_ix = array.array('i')
+    for mf in files:
+        ix = reldir_index.get(mf.reldir)
+        if ix is None:
+            ix = len(reldirs)
+            reldir_index[mf.reldir] = ix
+            reldirs.append(mf.reldir)
+        dir_ix.append(ix)
+    sections.append((b'FID ', b'q', array.array('q', [mf.id for mf in files]).tobytes()))
+    sections.append((b'FTD ', b'q', array.array('q', [mf.topdir.id for mf in files]).tobytes()))
+    sections.append((b'DIRS', b's', pack_strings(reldirs)))
+    sections.append((b'FDIX', b'i', dir_ix.tobytes()))
+    sections.append((b'FNAM', b's', pack_strings([mf.filename for mf in files])))
+    sections.append((b'FLPL', b's', pack_strings([mf.lastplay for mf in files])))
+    sections.append((b'FCMT', b's', pack_strings([mf.comment for mf in files])))
+    for name, typecode in media_file.MEDIA_COLUMNS:
+        sections.append((name[:4].upper().encode('ascii'), typecode.encode('ascii'),
+                         catalog.columns.arrays[name].tobytes()))
+
+    actors = list(catalog.actor_list)
+    actor_index = {}
+    for n, name in enumerate(actors):
+        actor_index[name] = n
+    tags = list(catalog.tag_list)
+    tag_index = {}
+    for n, tag in enumerate(tags):
+        tag_index[tag] = n
+    af_id = array.array('q')
+    af_ix = array.array('i')
+    tg_id = array.array('q')
+    tg_ix = array.array('i')
+    for mf in files:
+        for name in mf.get_actors():
+            af_id.append(mf.id)
+            af_ix.append(actor_index[name])
+        for tag in mf.get_tags():
+            tg_id.append(mf.id)
+            tg_ix.append(tag_index[tag])
+    sections.append((b'ACTR', b's', pack_strings(actors)))
+    sections.append((b'AFID', b'q', af_id.tobytes()))
+    sections.append((b'AFIX', b'i', af_ix.tobytes()))
+    sections.append((b'TAGS', b's', pack_strings(tags)))
+    sections.append((b'TGID', b'q', tg_id.tobytes()))
+    sections.append((b'TGIX', b'i', tg_ix.tobytes()))
+
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(struct.pack(SNAPSHOT_HEADER, SNAPSHOT_MAGIC, SNAPSHOT_VERSION, get_byteorder(),
+                                change_count, len(sections)))
+            for name, typecode, data in sections:
+                write_section(f, name, typecode, data)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.error('failed to store catalog snapshot : %s' % e)
+        return False
+
+    logging.info('catalog snapshot stored : %s (%d files)' % (path, len(files)))
+    return True
+
+
+def read_sections(mv, change_count):
+    magic, version, byteorder, snap_count, section_count = struct.unpack_from(SNAPSHOT_HEADER, mv)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION or byteorder != get_byteorder():
+        logging.info('catalog snapshot format mismatch')
+        return None
+    if snap_count != change_count:
+        logging.info('catalog snapshot is stale (%d != %d)' % (snap_count, change_count))
+        return None
+
+    sections = {}
+    offset = struct.calcsize(SNAPSHOT_HEADER)
+    section_size = struct.calcsize(SNAPSHOT_SECTION)
+    for n in range(section_count):
+        name, typecode, length = struct.unpack_from(SNAPSHOT_SECTION, mv, offset)
+        offset += section_size
+        if offset + length > len(mv):
+            raise ValueError('truncated section %s' % name)
+        data = mv[offset:offset + length]
+        if typecode != b's':
+            data = data.cast(typecode.decode('ascii'))
+        sections[name] = data
+        offset += length + (-length % 8)
+    return sections
+
+
+def group_links(file_ids, indexes, names):
+    # links are stored grouped by file, so each file gets its list in one go
+    cur_id = None
+    cur_names = None
+    for file_id, ix in zip(file_ids, indexes):
+        if file_id != cur_id:
+            if cur_names:
+                yield cur_id, cur_names
+            cur_id = file_id
+            cur_names = []
+        cur_names.append(names[ix])
+    if cur_names:
+        yield cur_id, cur_names
+
+
+def load_sections(catalog, sections):
+    topdir_list = []
+    td_ids = sections[b'TDID']
+    td_excludes = sections[b'TDEX']
+    td_paths = unpack_strings(sections[b'TDPT'])
+    td_comments = unpack_strings(sections[b'TDCM'])
+    for n in range(len(td_ids)):
+        td = media_file.TopDirectory(catalog, td_paths[n], td_comments[n], bool(td_excludes[n]))
+        td.load_dbtuple((td_ids[n], td_paths[n], bool(td_excludes[n]), td_comments[n]))
+        topdir_list.append(td)
+    topdir_map = {}
+    for td in topdir_list:
+        topdir_map[td.id] = td
+
+    file_ids = sections[b'FID ']
+    file_topdirs = sections[b'FTD ']
+    reldirs = [sys.intern(reldir) for reldir in unpack_strings(sections[b'DIRS'])]
+    dir_ix = sections[b'FDIX']
+    filenames = unpack_strings(sections[b'FNAM'])
+    lastplays = unpack_strings(sections[b'FLPL'])
+    comments = unpack_strings(sections[b'FCMT'])
+    count = len(file_ids)
+    if not (len(file_topdirs) == len(dir_ix) == len(filenames) == len(lastplays) == len(comments) == count):
+        raise ValueError('file section length mismatch')
+
+    columns = {}
+    for name, typecode in media_file.MEDIA_COLUMNS:
+        arr = array.array(typecode)
+        arr.frombytes(sections[name[:4].upper().encode('ascii')].cast('B'))
+        if len(arr) != count:
+            raise ValueError('column %s length mismatch' % name)
+        columns[name] = arr
+
+    restore = media_file.restore_mediafile
+    files = []
+    for row in range(count):
+        files.append(restore(catalog, row, file_ids[row], topdir_map[file_topdirs[row]],
+                             reldirs[dir_ix[row]], filenames[row], lastplays[row], comments[row]))
+    file_map = dict(zip(file_ids, files))
+
+    actors = [sys.intern(name) for name in unpack_strings(sections[b'ACTR'])]
+    for file_id, names in group_links(sections[b'AFID'], sections[b'AFIX'], actors):
+        file_map[file_id].actor_list = names
+    tags = [sys.intern(tag) for tag in unpack_strings(sections[b'TAGS'])]
+    for file_id, names in group_links(sections[b'TGID'], sections[b'TGIX'], tags):
+        file_map[file_id].tag_list = names
+
+    catalog.topdir_list = topdir_list
+    catalog.reindex_topdirs()
+    catalog.columns.restore(files, columns)
+    list.extend(catalog, files)
+    catalog.file_map = file_map
+    catalog.actor_list = actors
+    catalog.tag_list = tags
+    return True
+
+
+def load(catalog, change_count):
+    path = get_snapshot_path(catalog.filepath)
+    try:
+        f = open(path, 'rb')
+    except OSError:
+        return False
+
+    with f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            logging.error('cannot map catalog snapshot %s : %s' % (path, e))
+            return False
+        res = False
+        # every object created here lives as long as the catalog, scanning them is wasted time
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            sections = read_sections(memoryview(mm), change_count)
+            if sections is not None:
+                res = load_sections(catalog, sections)
+            sections = None
+        except (struct.error, ValueError, TypeError, KeyError, IndexError, UnicodeDecodeError) as e:
+            logging.error('broken catalog snapshot %s : %s' % (path, e))
+        finally:
+            if gc_enabled:
+                gc.enable()
+        try:
+            mm.close()
+        except BufferError:
+            pass
+
+    if res:
+        logging.info('catalog snapshot loaded : %s (%d files)' % (path, len(catalog)))
+    return res
+
+
+def remove(db_abspath):
+    try:
+        os.remove(get_snapshot_path(db_abspath))
+    except OSError:
+        pass
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+# Copyright 2020 pinebud77@hotmail.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Numeric attributes of every file as NumPy arrays, one row per media column row.
+# Unknown values are NaN in every array, so masks and sums skip them on their own.
+# A store is a copy of the catalog at one point, Catalog.get_column_store builds
+# a new one after files, columns or play times changed.
+
+import datetime
+import numpy
+
+import media_file
+
+
+STORE_FIELDS = ('size', 'time', 'lastplay', 'duration', 'width', 'height', 'resolution')
+# resolution classes by the longer side of the video
+RESOLUTION_CLASSES = (('SD', 0), ('HD', 1280), ('FHD', 1920), ('UHD', 3840))
+
+
+def get_lastplay_time(mf):
+    lastplay = mf.lastplay
+    if not lastplay:
+        return None
+    if isinstance(lastplay, datetime.datetime):
+        return lastplay.timestamp()
+    try:
+        return datetime.datetime.fromisoformat(str(lastplay)).timestamp()
+    except ValueError:
+        return None
+
+
+def column_to_float(arr, typecode):
+    values = numpy.frombuffer(arr, dtype=typecode).astype(numpy.float64)
+    if typecode != 'd':
+        values[values == media_file.NULL_INT] = numpy.nan
+    return values
+
+
+def get_file_ids(files):
+    return numpy.fromiter((mf.id for mf in files if mf.id is not None), dtype=numpy.int64)
+
+
+def ids_to_mask(file_ids):
+    file_ids = numpy.asarray(file_ids, dtype=numpy.int64)
+    if not len(file_ids):
+        return 0
+    bits = numpy.zeros(int(file_ids.max()) + 1, dtype=bool)
+    bits[file_ids] = True
+    return int.from_bytes(numpy.packbits(bits, bitorder='little').tobytes(), 'little')
+
+
+class ColumnStore:
+    def __init__(self, catalog):
+        columns = catalog.columns
+        self.arrays = {}
+        with columns.lock:
+            self.files = list(columns.files)
+            for name, typecode in media_file.MEDIA_COLUMNS:
+                self.arrays[name] = column_to_float(columns.arrays[name], typecode)
+        self.ids = numpy.fromiter((-1 if mf.id is None else mf.id for mf in self.files),
+                                  dtype=numpy.int64, count=len(self.files))
+        self.all_mask = None
+
+    def __len__(self):
+        return len(self.files)
+
+    def get(self, field):
+        values = self.arrays.get(field)
+        if values is not None:
+            return values
+        if field == 'resolution':
+            # NaN on either side leaves the resolution unknown
+            values = numpy.maximum(self.arrays['width'], self.arrays['height'])
+        elif field == 'lastplay':
+            values = numpy.fromiter((numpy.nan if t is None else t for t in map(get_lastplay_time, self.files)),
+                                    dtype=numpy.float64, count=len(self.files))
+        else:
+            raise KeyError(field)
+        self.arrays[field] = values
+        return values
+
+    def get_rows(self, files):
+        # None when a file is not in the store, the caller falls back to the file objects
+        rows = numpy.fromiter((-1 if mf._row is None else mf._row for mf in files),
+                              dtype=numpy.int64, count=len(files))
+        if len(rows) and (rows.min() < 0 or rows.max() >= len(self.files)):
+            return None
+        return rows
+
+    def argsort(self, field, rows=None, ascend=True):
+        values = self.get(field)
+        if rows is not None:
+            values = values[rows]
+        # numpy sorts NaN last, so unknown values go last both ways
+        keys = values if ascend else -values
+        return numpy.argsort(keys, kind='stable')
+
+    def range_mask(self, field, low=None, low_incl=False, high=None, high_incl=False):
+        values = self.get(field)
+        # NaN fails every comparison, so unknown values are never in a range
+        mask = self.ids >= 0
+        if low is not None:
+            mask &= (values >= low) if low_incl else (values > low)
+        if high is not None:
+            mask &= (values <= high) if high_incl else (values < high)
+        return mask
+
+    def select(self, field, low=None, low_incl=False, high=None, high_incl=False):
+        return self.ids[self.range_mask(field, low, low_incl, high, high_incl)]
+
+    def get_all_mask(self):
+        if self.all_mask is None:
+            self.all_mask = ids_to_mask(self.ids[self.ids >= 0])
+        return self.all_mask
+
+    def topdir_mask(self, topdir):
+        return numpy.fromiter((mf.topdir is topdir for mf in self.files), dtype=bool, count=len(self.files))
+
+    def count(self, field, mask=None):
+        values = self.get(field)
+        if mask is not None:
+            values = values[mask]
+        return int(numpy.count_nonzero(~numpy.isnan(values)))
+
+    def total(self, field, mask=None):
+        values = self.get(field)
+        if mask is not None:
+            values = values[mask]
+        return float(numpy.nansum(values))
+
+    def resolution_histogram(self, mask=None):
+        values = self.get('resolution')
+        if mask is not None:
+            values = values[mask]
+        known = values[~numpy.isnan(values)]
+        bins = numpy.digitize(known, [low for name, low in RESOLUTION_CLASSES[1:]])
+        counts = numpy.bincount(bins, minlength=len(RESOLUTION_CLASSES))
+        histogram = [(name, int(counts[n])) for n, (name, low) in enumerate(RESOLUTION_CLASSES)]
+        histogram.append(('unknown', len(values) - len(known)))
+        return histogram
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+# Copyright 2020 pinebud77@hotmail.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import threading
+import collections
+
+from settings import *
+import database_utils as db_utils
+
+
+def get_entry_size(jpg):
+    # files without a cover are cached too, the key and the dict slot still take memory
+    if jpg:
+        return DEF_COVER_ENTRY_SIZE + len(jpg)
+    return DEF_COVER_ENTRY_SIZE
+
+
+class CoverCache:
+    def __init__(self, catalog, max_bytes=DEF_COVER_CACHE_SIZE):
+        self.catalog = catalog
+        self.max_bytes = max_bytes
+        self.cur_bytes = 0
+        self.covers = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, file_id):
+        with self.lock:
+            if file_id not in self.covers:
+                return None, False
+            self.covers.move_to_end(file_id)
+            return self.covers[file_id], True
+
+    def put(self, file_id, jpg):
+        with self.lock:
+            self.put_nolock(file_id, jpg)
+
+    def put_nolock(self, file_id, jpg):
+        if file_id in self.covers:
+            self.cur_bytes -= get_entry_size(self.covers.pop(file_id))
+        self.covers[file_id] = jpg
+        self.cur_bytes += get_entry_size(jpg)
+        while self.cur_bytes > self.max_bytes and len(self.covers) > 1:
+            old_id, old = self.covers.popitem(last=False)
+            self.cur_bytes -= get_entry_size(old)
+
+    def discard(self, file_id):
+        with self.lock:
+            if file_id in self.covers:
+                self.cur_bytes -= get_entry_size(self.covers.pop(file_id))
+
+    def clear(self):
+        with self.lock:
+            self.covers.clear()
+            self.cur_bytes = 0
+
+    def prefetch(self, mf_list):
+        with self.lock:
+            file_ids = []
+            for mf in mf_list:
+                if mf.id is not None and mf.id not in self.covers:
+                    file_ids.append(mf.id)
+        if not file_ids:
+            return
+
+        rows = db_utils.get_covers(self.catalog.db_conn, file_ids)
+        with self.lock:
+            found = set()
+            for row in rows:
+                self.put_nolock(row[0], row[1])
+                found.add(row[0])
+            for file_id in file_ids:
+                if file_id not in found:
+                    self.put_nolock(file_id, None)
@@ -17,6 +17,52 @@
 
 import sqlite3
 import logging
+import contextlib
+
+
+SQL_MAX_VARIABLES = 500
+
+
+class CatalogConnection(sqlite3.Connection):
+    def __init__(self, *args, **kwargs):
+        super(CatalogConnection, self).__init__(*args, **kwargs)
+        self.tx_depth = 0
+
+    def commit(self):
+        # helpers commit after each statement, inside transaction() that waits for the outermost block
+        if self.tx_depth:
+            return
+        super(CatalogConnection, self).commit()
+
+
+@contextlib.contextmanager
+def transaction(conn):
+    conn.tx_depth += 1
+    try:
+        yield conn
+    except BaseException:
+        conn.tx_depth -= 1
+        if not conn.tx_depth:
+            conn.rollback()
+        raise
+    conn.tx_depth -= 1
+    if not conn.tx_depth:
+        conn.commit()
+
+
+sql_set_journal_mode = """PRAGMA journal_mode = %s;"""
+sql_set_synchronous = """PRAGMA synchronous = %s;"""
+sql_set_cache_size = """PRAGMA cache_size = -%d;"""
+
+
+def configure_connection(conn, journal_mode, synchronous, cache_kb):
+    c = conn.cursor()
+    c.execute(sql_set_journal_mode % journal_mode)
+    mode = c.fetchall()[0][0]
+    if mode.lower() != journal_mode.lower():
+        logging.warning('journal mode %s is not available, using %s' % (journal_mode, mode))
+    c.execute(sql_set_synchronous % synchronous)
+    c.execute(sql_set_cache_size % cache_kb)
 
 
 sql_enable_fk = """PRAGMA foreign_keys = ON;"""
@@ -26,6 +72,17 @@ def enable_foreign_key(conn):
     c.execute(sql_enable_fk)
 
 
+sql_has_table = """SELECT name
+                   FROM sqlite_master
+                   WHERE type='table' AND name=?;"""
+
+
+def has_table(conn, name):
+    c = conn.cursor()
+    c.execute(sql_has_table, (name,))
+    return bool(c.fetchall())
+
+
 sql_get_version = """SELECT major, minor
                      FROM version
                      WHERE id=0;"""
@@ -76,6 +133,137 @@ def set_app_version(conn, major, minor):
     conn.commit()
 
 
+sql_create_indexes = ("""CREATE INDEX IF NOT EXISTS file_path_index
+                             ON file (topdir_id, reldir, filename);""",
+                      """CREATE INDEX IF NOT EXISTS thumbnail_file_index
+                             ON thumbnail (file_id);""",
+                      """CREATE INDEX IF NOT EXISTS actorfile_file_index
+                             ON actorfile (file_id);""",
+                      """CREATE INDEX IF NOT EXISTS favorite_file_index
+                             ON favorite (file_id);""",
+                      )
+
+
+def create_indexes(conn):
+    c = conn.cursor()
+    for sql in sql_create_indexes:
+        c.execute(sql)
+    conn.commit()
+
+
+sql_begin = """BEGIN;"""
+
+
+def begin(conn):
+    c = conn.cursor()
+    c.execute(sql_begin)
+
+
+sql_create_changes_table = """CREATE TABLE IF NOT EXISTS changes (
+                                id INTEGER PRIMARY KEY,
+                                count INTEGER NOT NULL
+                           );"""
+
+# row 0 counts every change, row 1 only those the filelog does not record
+CHANGES_ALL = 0
+CHANGES_UNLOGGED = 1
+
+sql_init_changes = """INSERT OR IGNORE INTO changes (id, count)
+                      VALUES(0, 0), (1, 0);"""
+
+sql_create_changes_trigger = """CREATE TRIGGER IF NOT EXISTS %s_%s_changes
+                                  AFTER %s ON %s
+                                  BEGIN
+                                      UPDATE changes SET count = count + 1 WHERE id = 0;
+                                  END;"""
+
+sql_create_unlogged_trigger = """CREATE TRIGGER IF NOT EXISTS %s_%s_unlogged
+                                    AFTER %s ON %s
+                                    %s
+                                    BEGIN
+                                        UPDATE changes SET count = count + 1 WHERE id = 1;
+                                    END;"""
+
+# the same changes made through one connection, temp triggers only fire for the connection that created them
+sql_create_own_changes_table = """CREATE TEMP TABLE IF NOT EXISTS own_changes (
+                                      id INTEGER PRIMARY KEY,
+                                      count INTEGER NOT NULL
+                                  );"""
+
+sql_init_own_changes = """INSERT OR IGNORE INTO temp.own_changes (id, count)
+                          VALUES(1, 0);"""
+
+sql_create_own_trigger = """CREATE TEMP TRIGGER IF NOT EXISTS own_%s_%s_unlogged
+                               AFTER %s ON main.%s
+                               %s
+                               BEGIN
+                                   UPDATE own_changes SET count = count + 1 WHERE id = 1;
+                               END;"""
+
+changes_tables = ('topdir', 'file', 'actor', 'actorfile', 'tagname', 'tagfile')
+changes_events = ('INSERT', 'UPDATE', 'DELETE')
+
+
+def get_unlogged_events(schema=''):
+    # files added or removed are in the filelog, and so are labels going away with their file
+    for table in changes_tables:
+        for event in changes_events:
+            if table == 'file' and event != 'UPDATE':
+                continue
+            when = ''
+            if table in ('actorfile', 'tagfile') and event == 'DELETE':
+                when = 'WHEN EXISTS (SELECT 1 FROM %sfile WHERE id=OLD.file_id)' % schema
+            yield table, event, when
+
+
+def create_changes_table(conn):
+    c = conn.cursor()
+    c.execute(sql_create_changes_table)
+    c.execute(sql_init_changes)
+    for table in changes_tables:
+        for event in changes_events:
+            c.execute(sql_create_changes_trigger % (table, event.lower(), event, table))
+    for table, event, when in get_unlogged_events():
+        c.execute(sql_create_unlogged_trigger % (table, event.lower(), event, table, when))
+    conn.commit()
+
+
+def create_own_changes(conn):
+    c = conn.cursor()
+    c.execute(sql_create_own_changes_table)
+    c.execute(sql_init_own_changes)
+    for table, event, when in get_unlogged_events('main.'):
+        c.execute(sql_create_own_trigger % (table, event.lower(), event, table, when))
+    conn.commit()
+
+
+sql_get_change_count = """SELECT count
+                          FROM changes
+                          WHERE id=?;"""
+
+
+def get_change_count(conn, changes_id=CHANGES_ALL):
+    c = conn.cursor()
+    c.execute(sql_get_change_count, (changes_id,))
+    rows = c.fetchall()
+    if not rows:
+        return None
+    return rows[0][0]
+
+
+sql_get_own_change_count = """SELECT count
+                              FROM temp.own_changes
+                              WHERE id=1;"""
+
+
+def get_foreign_change_count(conn):
+    # changes the filelog does not record, made by other connections
+    c = conn.cursor()
+    c.execute(sql_get_own_change_count)
+    own = c.fetchall()[0][0]
+    return get_change_count(conn, CHANGES_UNLOGGED) - own
+
+
 sql_create_topdir_table = """CREATE TABLE IF NOT EXISTS topdir (
                                 id integer PRIMARY KEY AUTOINCREMENT,
                                 path TEXT UNIQUE NOT NULL,
@@ -126,7 +314,8 @@ def add_topdir(conn, topdir):
         c.execute(sql_insert_topdir, (topdir.abspath, topdir.comment, topdir.exclude))
         conn.commit()
     except sqlite3.IntegrityError:
-        pass
+        return get_topdir_id(conn, topdir.abspath)
+    return c.lastrowid
 
 
 sql_delete_topdir = """DELETE FROM topdir
@@ -189,6 +378,48 @@ def get_file_list(conn, fileid=0):
     return c.fetchall()
 
 
+sql_get_files = """SELECT id, topdir_id, reldir, filename, size, time, lastplay, duration, comment, width, height
+                   FROM file
+                   WHERE id IN (%s);"""
+
+
+def get_files(conn, file_ids):
+    c = conn.cursor()
+    rows = []
+    for start in range(0, len(file_ids), SQL_MAX_VARIABLES):
+        chunk = file_ids[start:start + SQL_MAX_VARIABLES]
+        c.execute(sql_get_files % ','.join('?' * len(chunk)), chunk)
+        rows.extend(c.fetchall())
+    return rows
+
+
+sql_get_file_sorted = """SELECT file.id, file.topdir_id, file.reldir, file.filename, file.size, file.time, file.lastplay,
+                                file.duration, file.comment, file.width, file.height
+                         FROM file
+                         JOIN topdir ON topdir.id = file.topdir_id
+                         ORDER BY %s;"""
+
+
+def get_file_cursor(conn, order_columns, ascend=True):
+    if ascend:
+        direction = ' ASC'
+    else:
+        direction = ' DESC'
+    c = conn.cursor()
+    c.execute(sql_get_file_sorted % ', '.join([column + direction for column in order_columns]))
+    return c
+
+
+sql_get_file_count = """SELECT COUNT(*)
+                        FROM file;"""
+
+
+def get_file_count(conn):
+    c = conn.cursor()
+    c.execute(sql_get_file_count)
+    return c.fetchall()[0][0]
+
+
 sql_update_file = """UPDATE file
                      SET topdir_id=?,
                          reldir=?,
@@ -245,6 +476,25 @@ def add_file_nocommit(conn, mf):
     c.execute(sql_add_file, (mf.topdir.id, mf.reldir, mf.filename, mf.size,
                              mf.time, mf.lastplay, mf.duration, mf.comment,
                              mf.width, mf.height))
+    mf.id = c.lastrowid
+    return mf.id
+
+
+sql_last_insert_rowid = """SELECT last_insert_rowid();"""
+
+
+def add_files_nocommit(conn, mf_list):
+    if not mf_list:
+        return
+    c = conn.cursor()
+    c.executemany(sql_add_file, [(mf.topdir.id, mf.reldir, mf.filename, mf.size,
+                                  mf.time, mf.lastplay, mf.duration, mf.comment,
+                                  mf.width, mf.height) for mf in mf_list])
+    # the whole batch is inserted under one write lock, AUTOINCREMENT ids are consecutive
+    c.execute(sql_last_insert_rowid)
+    first_id = c.fetchone()[0] - len(mf_list) + 1
+    for n, mf in enumerate(mf_list):
+        mf.id = first_id + n
 
 
 sql_del_file = """DELETE FROM file
@@ -257,11 +507,249 @@ def del_file_nocommit(conn, mf):
     c.execute(sql_del_file, (mf.id,))
 
 
+FILELOG_DELETE = 0
+FILELOG_INSERT = 1
+
+sql_create_filelog_table = """CREATE TABLE IF NOT EXISTS filelog (
+                                  seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                                  file_id INTEGER NOT NULL,
+                                  op INTEGER NOT NULL);"""
+
+sql_create_file_fts = """CREATE VIRTUAL TABLE IF NOT EXISTS file_fts
+                         USING fts5(reldir, filename, content='file', content_rowid='id', tokenize='trigram');"""
+
+sql_create_file_fts_triggers = ("""CREATE TRIGGER IF NOT EXISTS file_insert_fts
+                                       AFTER INSERT ON file
+                                       BEGIN
+                                           INSERT INTO file_fts (rowid, reldir, filename)
+                                           VALUES(NEW.id, NEW.reldir, NEW.filename);
+                                       END;""",
+                                """CREATE TRIGGER IF NOT EXISTS file_delete_fts
+                                       AFTER DELETE ON file
+                                       BEGIN
+                                           INSERT INTO file_fts (file_fts, rowid, reldir, filename)
+                                           VALUES('delete', OLD.id, OLD.reldir, OLD.filename);
+                                       END;""",
+                                """CREATE TRIGGER IF NOT EXISTS file_update_fts
+                                       AFTER UPDATE OF reldir, filename ON file
+                                       BEGIN
+                                           INSERT INTO file_fts (file_fts, rowid, reldir, filename)
+                                           VALUES('delete', OLD.id, OLD.reldir, OLD.filename);
+                                           INSERT INTO file_fts (rowid, reldir, filename)
+                                           VALUES(NEW.id, NEW.reldir, NEW.filename);
+                                       END;""",
+                                )
+
+sql_rebuild_file_fts = """INSERT INTO file_fts (file_fts)
+                          VALUES('rebuild');"""
+
+
+def create_file_fts(conn):
+    created = not has_table(conn, 'file_fts')
+    with transaction(conn):
+        c = conn.cursor()
+        c.execute(sql_create_file_fts)
+        for sql in sql_create_file_fts_triggers:
+            c.execute(sql)
+        if created:
+            c.execute(sql_rebuild_file_fts)
+        conn.commit()
+
+
+sql_filter_files = """SELECT id
+                      FROM file
+                      WHERE %s
+                      ORDER BY id;"""
+
+sql_filter_actors = """id IN (SELECT actorfile.file_id
+                              FROM actorfile
+                              JOIN actor ON actor.id = actorfile.actor_id
+                              WHERE actor.name IN (%s))"""
+
+sql_filter_tags = """id IN (SELECT tagfile.file_id
+                            FROM tagfile
+                            JOIN tagname ON tagname.id = tagfile.tag_id
+                            WHERE tagname.name IN (%s))"""
+
+sql_filter_fts = """(id IN (SELECT rowid FROM file_fts WHERE file_fts MATCH ?)
+                     OR topdir_id IN (SELECT id FROM topdir WHERE path LIKE ? ESCAPE '\\'))"""
+
+sql_filter_like = """(reldir LIKE ? ESCAPE '\\' OR filename LIKE ? ESCAPE '\\'
+                      OR topdir_id IN (SELECT id FROM topdir WHERE path LIKE ? ESCAPE '\\'))"""
+
+
+def escape_like(s):
+    return '%' + s.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+# the trigram tokenizer needs at least 3 characters, shorter names go through LIKE
+def filter_file_ids(conn, actors=(), tags=(), name=''):
+    terms = []
+    params = []
+    if actors:
+        terms.append(sql_filter_actors % ', '.join('?' * len(actors)))
+        params.extend(actors)
+    if tags:
+        terms.append(sql_filter_tags % ', '.join('?' * len(tags)))
+        params.extend(tags)
+    if len(name) >= 3:
+        terms.append(sql_filter_fts)
+        params.extend(('"%s"' % name.replace('"', '""'), escape_like(name)))
+    elif name:
+        terms.append(sql_filter_like)
+        params.extend((escape_like(name),) * 3)
+    if not terms:
+        terms.append('1')
+
+    c = conn.cursor()
+    c.execute(sql_filter_files % ' AND '.join(terms), params)
+    return c.fetchall()
+
+
+sql_create_filelog_insert_trigger = """CREATE TRIGGER IF NOT EXISTS file_insert_filelog
+                                           AFTER INSERT ON file
+                                           BEGIN
+                                               INSERT INTO filelog (file_id, op) VALUES(NEW.id, 1);
+                                           END;"""
+
+sql_create_filelog_delete_trigger = """CREATE TRIGGER IF NOT EXISTS file_delete_filelog
+                                           AFTER DELETE ON file
+                                           BEGIN
+                                               INSERT INTO filelog (file_id, op) VALUES(OLD.id, 0);
+                                           END;"""
+
+
+def create_filelog_table(conn):
+    c = conn.cursor()
+    c.execute(sql_create_filelog_table)
+    c.execute(sql_create_filelog_insert_trigger)
+    c.execute(sql_create_filelog_delete_trigger)
+    conn.commit()
+
+
+# the AUTOINCREMENT counter, it stays put when the log is trimmed empty
+sql_get_filelog_seq = """SELECT seq
+                         FROM sqlite_sequence
+                         WHERE name='filelog';"""
+
+
+def get_filelog_seq(conn):
+    c = conn.cursor()
+    c.execute(sql_get_filelog_seq)
+    rows = c.fetchall()
+    if not rows or rows[0][0] is None:
+        return 0
+    return rows[0][0]
+
+
+sql_get_filelog = """SELECT seq, file_id, op
+                     FROM filelog
+                     WHERE seq > ?
+                     ORDER BY seq;"""
+
+
+def get_filelog(conn, seq):
+    c = conn.cursor()
+    c.execute(sql_get_filelog, (seq,))
+    return c.fetchall()
+
+
+sql_trim_filelog = """DELETE FROM filelog
+                      WHERE seq <= ?;"""
+
+
+def trim_filelog(conn, seq):
+    c = conn.cursor()
+    c.execute(sql_trim_filelog, (seq,))
+    conn.commit()
+
+
+# every open catalog records the last filelog seq it applied, the log is only trimmed below all of them.
+# time is refreshed while the catalog is open, so the row of a crashed process expires
+sql_create_filelog_reader_table = """CREATE TABLE IF NOT EXISTS filelog_reader (
+                                         id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                         seq INTEGER NOT NULL,
+                                         time REAL NOT NULL);"""
+
+
+def create_filelog_reader_table(conn):
+    c = conn.cursor()
+    c.execute(sql_create_filelog_reader_table)
+    conn.commit()
+
+
+sql_add_filelog_reader = """INSERT INTO filelog_reader (seq, time)
+                            VALUES(?, ?);"""
+
+
+def add_filelog_reader(conn, seq, now):
+    c = conn.cursor()
+    c.execute(sql_add_filelog_reader, (seq, now))
+    conn.commit()
+    return c.lastrowid
+
+
+sql_set_filelog_reader = """UPDATE filelog_reader
+                            SET seq=?, time=?
+                            WHERE id=?;"""
+
+
+def set_filelog_reader(conn, reader_id, seq, now):
+    # False when the row has expired
+    c = conn.cursor()
+    c.execute(sql_set_filelog_reader, (seq, now, reader_id))
+    conn.commit()
+    return c.rowcount > 0
+
+
+sql_del_filelog_reader = """DELETE FROM filelog_reader
+                            WHERE id=?;"""
+
+
+def del_filelog_reader(conn, reader_id):
+    c = conn.cursor()
+    c.execute(sql_del_filelog_reader, (reader_id,))
+    conn.commit()
+
+
+sql_get_filelog_readers = """SELECT id
+                             FROM filelog_reader
+                             WHERE time >= ?;"""
+
+
+def get_filelog_readers(conn, expire_time):
+    c = conn.cursor()
+    c.execute(sql_get_filelog_readers, (expire_time,))
+    return [row[0] for row in c.fetchall()]
+
+
+sql_expire_filelog_readers = """DELETE FROM filelog_reader
+                                 WHERE time < ?;"""
+
+sql_get_filelog_trim_seq = """SELECT MIN(seq)
+                              FROM filelog_reader;"""
+
+
+def get_filelog_trim_seq(conn, expire_time):
+    c = conn.cursor()
+    c.execute(sql_expire_filelog_readers, (expire_time,))
+    if c.rowcount > 0:
+        logging.warning('%d filelog readers expired' % c.rowcount)
+    conn.commit()
+    c.execute(sql_get_filelog_trim_seq)
+    rows = c.fetchall()
+    if not rows:
+        return None
+    return rows[0][0]
+
+
 sql_create_thumbnail_table = """CREATE TABLE IF NOT EXISTS thumbnail (
                                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                                     file_id INTEGER,
                                     time INTEGER,
                                     jpg BLOB,
+                                    pack_offset INTEGER,
+                                    pack_length INTEGER,
                                     CONSTRAINT fk_file_id
                                         FOREIGN KEY (file_id)
                                         REFERENCES file(id)
@@ -275,21 +763,91 @@ def create_thumbnail_table(conn):
     conn.commit()
 
 
-sql_add_thumbnail = """INSERT INTO thumbnail (file_id, time, jpg)
-                       VALUES(?, ?, ?);
+sql_get_thumbnail_columns = """PRAGMA table_info(thumbnail);"""
+sql_add_thumbnail_column = """ALTER TABLE thumbnail
+                              ADD COLUMN %s INTEGER;"""
+
+
+def add_thumbnail_pack_columns(conn):
+    c = conn.cursor()
+    c.execute(sql_get_thumbnail_columns)
+    columns = [row[1] for row in c.fetchall()]
+    for column in ('pack_offset', 'pack_length'):
+        if column not in columns:
+            c.execute(sql_add_thumbnail_column % column)
+    conn.commit()
+
+
+sql_create_thumbpack_table = """CREATE TABLE IF NOT EXISTS thumbpack (
+                                    id INTEGER PRIMARY KEY,
+                                    generation INTEGER NOT NULL);"""
+
+
+def create_thumbpack_table(conn):
+    c = conn.cursor()
+    c.execute(sql_create_thumbpack_table)
+    conn.commit()
+
+
+sql_get_pack_generation = """SELECT generation
+                             FROM thumbpack
+                             WHERE id=0;"""
+
+
+def get_pack_generation(conn):
+    c = conn.cursor()
+    c.execute(sql_get_pack_generation)
+    rows = c.fetchall()
+    if not rows:
+        return None
+    return rows[0][0]
+
+
+sql_set_pack_generation = """INSERT OR REPLACE INTO thumbpack (id, generation)
+                             VALUES(0, ?);"""
+
+
+def set_pack_generation(conn, generation):
+    c = conn.cursor()
+    c.execute(sql_set_pack_generation, (generation,))
+    conn.commit()
+
+
+def read_thumbnail(pack, jpg, offset, length):
+    if jpg is None and offset is not None and pack is not None:
+        return pack.read(offset, length)
+    return jpg
+
+
+sql_add_thumbnail = """INSERT INTO thumbnail (file_id, time, jpg, pack_offset, pack_length)
+                       VALUES(?, ?, ?, ?, ?);
                     """
 
 
-def add_thumbnails(conn, file_id, thumb_list):
+def add_thumbnails(conn, file_id, thumb_list, pack=None):
+    add_thumbnails_bulk(conn, ((file_id, thumb_list),), pack)
+
+
+def add_thumbnails_bulk(conn, file_thumbs, pack=None):
+    rows = []
+    for file_id, thumb_list in file_thumbs:
+        for thumb in thumb_list:
+            time = thumb[0]
+            jpg = thumb[1]
+            if pack is not None:
+                offset, length = pack.append(jpg)
+                rows.append((file_id, time, None, offset, length,))
+            else:
+                rows.append((file_id, time, jpg, None, None,))
+    # the rows may only be committed once the images they point to are on disk
+    if pack is not None and rows:
+        pack.sync()
     c = conn.cursor()
-    for thumb in thumb_list:
-        time = thumb[0]
-        jpg = thumb[1]
-        c.execute(sql_add_thumbnail, (file_id, time, jpg,))
+    c.executemany(sql_add_thumbnail, rows)
     conn.commit()
 
 
-sql_get_thumbnails = """SELECT time, jpg, id
+sql_get_thumbnails = """SELECT time, jpg, id, pack_offset, pack_length
                         FROM thumbnail
                         WHERE file_id=?;
                      """
@@ -299,14 +857,87 @@ def get_first_element(arr):
     return arr[0]
 
 
-def get_thumbnails(conn, file_id):
+def get_thumbnails(conn, file_id, pack=None):
     c = conn.cursor()
     c.execute(sql_get_thumbnails, (file_id,))
-    rows = c.fetchall()
+    rows = []
+    for time, jpg, thumb_id, offset, length in c.fetchall():
+        rows.append((time, read_thumbnail(pack, jpg, offset, length), thumb_id))
     rows.sort(key=get_first_element)
     return rows
 
 
+sql_get_blob_thumbnail_ids = """SELECT id
+                                FROM thumbnail
+                                WHERE jpg IS NOT NULL
+                                ORDER BY id;"""
+
+
+def get_blob_thumbnail_ids(conn):
+    c = conn.cursor()
+    c.execute(sql_get_blob_thumbnail_ids)
+    return c.fetchall()
+
+
+sql_get_thumbnail_blobs = """SELECT id, jpg
+                             FROM thumbnail
+                             WHERE id IN (%s) AND jpg IS NOT NULL
+                             ORDER BY id;"""
+
+
+def get_thumbnail_blobs(conn, thumb_ids):
+    c = conn.cursor()
+    rows = []
+    for start in range(0, len(thumb_ids), SQL_MAX_VARIABLES):
+        chunk = thumb_ids[start:start + SQL_MAX_VARIABLES]
+        c.execute(sql_get_thumbnail_blobs % ','.join('?' * len(chunk)), chunk)
+        rows.extend(c.fetchall())
+    return rows
+
+
+sql_set_thumbnail_packed = """UPDATE thumbnail
+                              SET jpg=NULL, pack_offset=?, pack_length=?
+                              WHERE id=?;"""
+
+
+def set_thumbnails_packed(conn, updates):
+    c = conn.cursor()
+    c.executemany(sql_set_thumbnail_packed, updates)
+    conn.commit()
+
+
+sql_get_packed_thumbnails = """SELECT id, pack_offset, pack_length
+                               FROM thumbnail
+                               WHERE jpg IS NULL AND pack_offset IS NOT NULL
+                               ORDER BY pack_offset;"""
+
+
+def get_packed_thumbnails(conn):
+    c = conn.cursor()
+    c.execute(sql_get_packed_thumbnails)
+    return c.fetchall()
+
+
+sql_set_thumbnail_offset = """UPDATE thumbnail
+                              SET pack_offset=?, pack_length=?
+                              WHERE id=?;"""
+
+
+def set_thumbnail_offsets(conn, updates):
+    c = conn.cursor()
+    c.executemany(sql_set_thumbnail_offset, updates)
+    conn.commit()
+
+
+sql_vacuum = """VACUUM;"""
+
+
+def vacuum(conn):
+    conn.commit()
+    c = conn.cursor()
+    c.execute(sql_vacuum)
+
+
 sql_del_thumbnails = """DELETE FROM thumbnail
                         WHERE file_id=?:
                      """
@@ -318,16 +949,17 @@ def del_thumbnails(conn, file_id):
     conn.commit()
 
 
-sql_get_thumbnail_from_id = """SELECT id, file_id, time, jpg
+sql_get_thumbnail_from_id = """SELECT id, file_id, time, jpg, pack_offset, pack_length
                                FROM thumbnail
                                WHERE id=?;"""
 
 
-def get_thumbnail_from_id(conn, thumb_id):
+def get_thumbnail_from_id(conn, thumb_id, pack=None):
     c = conn.cursor()
     c.execute(sql_get_thumbnail_from_id, (thumb_id,))
     rows = c.fetchall()
-    return rows[0]
+    thumb_id, file_id, time, jpg, offset, length = rows[0]
+    return thumb_id, file_id, time, read_thumbnail(pack, jpg, offset, length)
 
 
 sql_create_cover_table = """CREATE TABLE IF NOT EXISTS cover (
@@ -377,6 +1009,21 @@ def get_cover_list(conn):
     return c.fetchall()
 
 
+sql_get_covers = """SELECT file_id, cover
+                    FROM cover
+                    WHERE file_id IN (%s);"""
+
+
+def get_covers(conn, file_ids):
+    c = conn.cursor()
+    rows = []
+    for start in range(0, len(file_ids), SQL_MAX_VARIABLES):
+        chunk = file_ids[start:start + SQL_MAX_VARIABLES]
+        c.execute(sql_get_covers % ','.join('?' * len(chunk)), chunk)
+        rows.extend(c.fetchall())
+    return rows
+
+
 sql_get_cover = """SELECT cover
                    FROM cover
                    WHERE file_id=?;"""
@@ -420,6 +1067,7 @@ def add_actor(conn, name, picture=None, bio=None, comment=None):
     c = conn.cursor()
     c.execute(sql_add_actor, (name, picture, bio, comment))
     conn.commit()
+    return c.lastrowid
 
 
 sql_modify_actor = """UPDATE actor
@@ -496,6 +1144,22 @@ def add_actorfile(conn, actor_id, file_id):
     conn.commit()
 
 
+sql_add_actorfile_by_name = """INSERT INTO actorfile (actor_id, file_id)
+                               SELECT id, ? FROM actor WHERE name=?;"""
+
+
+def add_actorfile_by_name(conn, name, file_id):
+    c = conn.cursor()
+    c.execute(sql_add_actorfile_by_name, (file_id, name,))
+    conn.commit()
+
+
+def add_actorfile_bulk(conn, name, file_ids):
+    c = conn.cursor()
+    c.executemany(sql_add_actorfile_by_name, [(file_id, name,) for file_id in file_ids])
+    conn.commit()
+
+
 sql_del_actorfile = """DELETE FROM actorfile
                        WHERE actor_id=? AND file_id=?;"""
 
@@ -506,6 +1170,16 @@ def del_actorfile(conn, actor_id, file_id):
     conn.commit()
 
 
+sql_del_actorfile_by_name = """DELETE FROM actorfile
+                               WHERE actor_id=(SELECT id FROM actor WHERE name=?) AND file_id=?;"""
+
+
+def del_actorfile_bulk(conn, name, file_ids):
+    c = conn.cursor()
+    c.executemany(sql_del_actorfile_by_name, [(name, file_id,) for file_id in file_ids])
+    conn.commit()
+
+
 sql_get_actorfile = """SELECT actor_id, file_id
                        FROM actorfile;"""
 
@@ -516,33 +1190,119 @@ def get_actorfile_list(conn):
     return c.fetchall()
 
 
-sql_create_tag_table = """CREATE TABLE IF NOT EXISTS tag(
-                                tag TEXT NOT NULL,
+sql_get_actor_file_ids = """SELECT actorfile.file_id
+                            FROM actorfile
+                            JOIN actor ON actor.id = actorfile.actor_id
+                            WHERE actor.name=?;"""
+
+
+def get_actor_file_ids(conn, name):
+    c = conn.cursor()
+    c.execute(sql_get_actor_file_ids, (name,))
+    return c.fetchall()
+
+
+sql_get_actorfile_names = """SELECT actorfile.file_id, actor.name
+                             FROM actorfile
+                             JOIN actor ON actor.id = actorfile.actor_id;"""
+
+
+def get_actorfile_names(conn):
+    c = conn.cursor()
+    c.execute(sql_get_actorfile_names)
+    return c.fetchall()
+
+
+sql_create_tagname_table = """CREATE TABLE IF NOT EXISTS tagname(
+                                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                name TEXT UNIQUE NOT NULL);"""
+
+
+def create_tagname_table(conn):
+    c = conn.cursor()
+    c.execute(sql_create_tagname_table)
+    conn.commit()
+
+
+sql_create_tagfile_table = """CREATE TABLE IF NOT EXISTS tagfile(
+                                tag_id INTEGER NOT NULL,
                                 file_id INTEGER NOT NULL,
+                                UNIQUE (tag_id, file_id),
+                                CONSTRAINT fk_tag_id
+                                    FOREIGN KEY (tag_id)
+                                    REFERENCES tagname(id)
+                                    ON DELETE CASCADE,
                                 CONSTRAINT fk_file_id
                                     FOREIGN KEY (file_id)
                                     REFERENCES file(id)
                                     ON DELETE CASCADE);"""
 
+sql_create_tagfile_index = """CREATE INDEX IF NOT EXISTS tagfile_file_index
+                                  ON tagfile (file_id);"""
+
+
+def create_tagfile_table(conn):
+    c = conn.cursor()
+    c.execute(sql_create_tagfile_table)
+    c.execute(sql_create_tagfile_index)
+    conn.commit()
+
+
+sql_copy_tagnames = """INSERT OR IGNORE INTO tagname (name)
+                       SELECT DISTINCT tag FROM tag;"""
+
+sql_copy_tagfiles = """INSERT OR IGNORE INTO tagfile (tag_id, file_id)
+                       SELECT tagname.id, tag.file_id
+                       FROM tag
+                       JOIN tagname ON tagname.name = tag.tag;"""
+
+sql_drop_tag_table = """DROP TABLE tag;"""
+
+
+def normalize_tags(conn):
+    if not has_table(conn, 'tag'):
+        return
+    with transaction(conn):
+        c = conn.cursor()
+        c.execute(sql_create_tagname_table)
+        c.execute(sql_create_tagfile_table)
+        c.execute(sql_create_tagfile_index)
+        c.execute(sql_copy_tagnames)
+        c.execute(sql_copy_tagfiles)
+        c.execute(sql_drop_tag_table)
+        conn.commit()
+
+
+sql_add_tagname = """INSERT OR IGNORE INTO tagname (name)
+                     VALUES(?);"""
+
 
-def create_tag_table(conn):
+def add_tagname(conn, tag):
     c = conn.cursor()
-    c.execute(sql_create_tag_table)
+    c.execute(sql_add_tagname, (tag,))
     conn.commit()
 
 
-sql_add_tag = """INSERT INTO tag (tag, file_id)
-                 VALUES(?, ?);"""
+sql_add_tag = """INSERT INTO tagfile (tag_id, file_id)
+                 SELECT id, ? FROM tagname WHERE name=?;"""
 
 
 def add_tag(conn, tag, file_id):
     c = conn.cursor()
-    c.execute(sql_add_tag, (tag, file_id,))
+    c.execute(sql_add_tagname, (tag,))
+    c.execute(sql_add_tag, (file_id, tag,))
     conn.commit()
 
 
-sql_del_tag = """DELETE FROM tag
-                 WHERE tag=? AND file_id=?;"""
+def add_tag_bulk(conn, tag, file_ids):
+    c = conn.cursor()
+    c.execute(sql_add_tagname, (tag,))
+    c.executemany(sql_add_tag, [(file_id, tag,) for file_id in file_ids])
+    conn.commit()
+
+
+sql_del_tag = """DELETE FROM tagfile
+                 WHERE tag_id=(SELECT id FROM tagname WHERE name=?) AND file_id=?;"""
 
 
 def del_tag(conn, tag, file_id):
@@ -551,8 +1311,25 @@ def del_tag(conn, tag, file_id):
     conn.commit()
 
 
-sql_get_tag= """SELECT tag, file_id
-                FROM tag;"""
+def del_tag_bulk(conn, tag, file_ids):
+    c = conn.cursor()
+    c.executemany(sql_del_tag, [(tag, file_id,) for file_id in file_ids])
+    conn.commit()
+
+
+sql_del_tagname = """DELETE FROM tagname
+                     WHERE name=?;"""
+
+
+def del_tagname(conn, tag):
+    c = conn.cursor()
+    c.execute(sql_del_tagname, (tag,))
+    conn.commit()
+
+
+sql_get_tag= """SELECT tagname.name, tagfile.file_id
+                FROM tagfile
+                JOIN tagname ON tagname.id = tagfile.tag_id;"""
 
 
 def get_tag_list(conn):
@@ -561,13 +1338,48 @@ def get_tag_list(conn):
     return c.fetchall()
 
 
-sql_modify_tag = """UPDATE tag
-                    SET tag=?
-                    WHERE tag=? AND file_id=?"""
+sql_get_tag_names = """SELECT name
+                       FROM tagname
+                       ORDER BY name;"""
+
+
+def get_tag_names(conn):
+    c = conn.cursor()
+    c.execute(sql_get_tag_names)
+    return c.fetchall()
+
+
+sql_get_tag_file_ids = """SELECT tagfile.file_id
+                          FROM tagfile
+                          JOIN tagname ON tagname.id = tagfile.tag_id
+                          WHERE tagname.name=?;"""
+
+
+def get_tag_file_ids(conn, tag):
+    c = conn.cursor()
+    c.execute(sql_get_tag_file_ids, (tag,))
+    return c.fetchall()
+
+
+sql_rename_tag = """UPDATE tagname
+                    SET name=?
+                    WHERE name=?;"""
+
+
+def rename_tag(conn, orig_tag, new_tag):
+    c = conn.cursor()
+    c.execute(sql_rename_tag, (new_tag, orig_tag,))
+    conn.commit()
+
+
+sql_modify_tag = """UPDATE OR REPLACE tagfile
+                    SET tag_id=(SELECT id FROM tagname WHERE name=?)
+                    WHERE tag_id=(SELECT id FROM tagname WHERE name=?) AND file_id=?;"""
 
 
 def modify_tag(conn, file_id, orig_tag, new_tag):
     c = conn.cursor()
+    c.execute(sql_add_tagname, (new_tag,))
     c.execute(sql_modify_tag, (new_tag, orig_tag, file_id,))
     conn.commit()
 
@@ -599,6 +1411,7 @@ def add_favorite(conn, file_id, thumb_id):
     c = conn.cursor()
     c.execute(sql_add_favorite, (file_id, thumb_id,))
     conn.commit()
+    return c.lastrowid
 
 
 sql_get_favorite_list = """SELECT id, file_id, thumb_id
@@ -617,6 +1430,22 @@ def get_favorite_list(conn):
     return rows
 
 
+sql_get_favorite_thumbnails = """SELECT favorite.id, favorite.file_id, favorite.thumb_id, thumbnail.time, thumbnail.jpg,
+                                        thumbnail.pack_offset, thumbnail.pack_length
+                                 FROM favorite
+                                 JOIN thumbnail ON thumbnail.id = favorite.thumb_id
+                                 ORDER BY favorite.file_id, thumbnail.time;"""
+
+
+def get_favorite_thumbnails(conn, pack=None):
+    c = conn.cursor()
+    c.execute(sql_get_favorite_thumbnails)
+    rows = []
+    for fav_id, file_id, thumb_id, time, jpg, offset, length in c.fetchall():
+        rows.append((fav_id, file_id, thumb_id, time, read_thumbnail(pack, jpg, offset, length)))
+    return rows
+
+
 sql_delete_favorite = """DELETE FROM favorite
                          WHERE id=?;"""
 
@@ -636,4 +1465,48 @@ def get_favorite_id(conn, file_id, thumb_id):
     c = conn.cursor()
     c.execute(sql_get_favorite_id, (file_id, thumb_id,))
     rows = c.fetchall()
-    return rows[0][0]
\ No newline at end of file
+    return rows[0][0]
+
+
+sql_create_collection_table = """CREATE TABLE IF NOT EXISTS collection(
+                                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                    name TEXT UNIQUE NOT NULL,
+                                    query TEXT NOT NULL);"""
+
+
+def create_collection_table(conn):
+    c = conn.cursor()
+    c.execute(sql_create_collection_table)
+    conn.commit()
+
+
+sql_add_collection = """INSERT INTO collection (name, query)
+                        VALUES(?, ?);"""
+
+
+def add_collection(conn, name, query):
+    c = conn.cursor()
+    c.execute(sql_add_collection, (name, query,))
+    conn.commit()
+    return c.lastrowid
+
+
+sql_del_collection = """DELETE FROM collection
+                        WHERE name=?;"""
+
+
+def del_collection(conn, name):
+    c = conn.cursor()
+    c.execute(sql_del_collection, (name,))
+    conn.commit()
+
+
+sql_get_collection_list = """SELECT id, name, query
+                             FROM collection
+                             ORDER BY name;"""
+
+
+def get_collection_list(conn):
+    c = conn.cursor()
+    c.execute(sql_get_collection_list)
+    return c.fetchall()
\ No newline at end of file
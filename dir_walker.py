@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+# Copyright 2020 pinebud77@hotmail.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Directory walker for the catalog sync. Directories are listed with os.scandir,
+# whose entries carry the file type, so a file costs no stat call on most
+# systems. Queues replace the recursion and names are never passed to glob,
+# so brackets in directory names are plain characters.
+# walk_topdirs lists many directories at once for slow network mounts, with one
+# thread it walks them one by one.
+
+import os
+import logging
+import collections
+import concurrent.futures
+
+
+def get_suffixes(ext_list):
+    return tuple(ext.lower() for ext in ext_list)
+
+
+def list_directory(path, suffixes):
+    files = []
+    subdirs = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                name = entry.name
+                # hidden entries were never matched by the old glob pattern
+                if name.startswith('.'):
+                    continue
+                try:
+                    if entry.is_file():
+                        if name.lower().endswith(suffixes):
+                            files.append(entry.path)
+                    elif entry.is_dir():
+                        subdirs.append(entry.path)
+                except OSError:
+                    continue
+    except OSError as e:
+        logging.warning('cannot list directory %s : %s' % (path, e))
+    return files, subdirs
+
+
+def get_mount(path):
+    path = os.path.realpath(path)
+    while not os.path.ismount(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+def list_mounted_directory(path, suffixes, mount):
+    files, subdirs = list_directory(path, suffixes)
+    # a subdirectory can be another mount, its listings then count against that one
+    return files, [(subdir if os.path.ismount(subdir) else mount, subdir) for subdir in subdirs]
+
+
+def walk_topdirs(topdirs, ext_list, max_threads, mount_threads, msg_cb=None, is_killed=None):
+    # directories of all topdirs are listed at once, at most mount_threads at a time on one mount
+    suffixes = get_suffixes(ext_list)
+    results = {}
+    queues = collections.OrderedDict()
+    in_flight = {}
+
+    def queue_directory(mount, topdir, path):
+        if mount not in queues:
+            queues[mount] = collections.deque()
+            in_flight[mount] = 0
+        queues[mount].append((topdir, path))
+
+    for topdir in topdirs:
+        results[topdir] = []
+        queue_directory(get_mount(topdir), topdir, os.path.abspath(topdir))
+
+    futures = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_threads) as pool:
+        def submit_ready():
+            for mount, queue in queues.items():
+                while queue and in_flight[mount] < mount_threads:
+                    topdir, path = queue.popleft()
+                    if msg_cb is not None:
+                        msg_cb('processing directory : %s' % path)
+                    futures[pool.submit(list_mounted_directory, path, suffixes, mount)] = (mount, topdir)
+                    in_flight[mount] += 1
+
+        submit_ready()
+        while futures:
+            done, not_done = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+            if is_killed is not None and is_killed():
+                for future in not_done:
+                    future.cancel()
+                return None
+            for future in done:
+                mount, topdir = futures.pop(future)
+                in_flight[mount] -= 1
+                files, subdirs = future.result()
+                results[topdir].extend(files)
+                for subdir_mount, subdir in subdirs:
+                    queue_directory(subdir_mount, topdir, subdir)
+            submit_ready()
+
+    # listings finish in any order, sorting makes the result the same on every run
+    for files in results.values():
+        files.sort()
+    return results
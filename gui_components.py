@@ -22,6 +22,13 @@ import io
 import icons
 
 
+def get_count_label(name, counts):
+    count = counts.get(name)
+    if count is None:
+        return name
+    return '%s (%d)' % (name, count)
+
+
 class LeftPanel(wx.Panel):
     def __init__(self, *args, **kwargs):
         super(LeftPanel, self).__init__(*args, **kwargs)
@@ -32,9 +39,15 @@ class LeftPanel(wx.Panel):
         self.file_filter = ''
         self.actor_selected = []
         self.tag_selected = []
+        self.actor_names = []
+        self.tag_names = []
+        self.collection_selected = None
+        self.collection_names = []
 
         self.clearButton = None
         self.fileText = None
+        self.saveButton = None
+        self.collectionList = None
         self.actorList = None
         self.tagList = None
         self.update_timer = None
@@ -56,6 +69,7 @@ class LeftPanel(wx.Panel):
         hbox = wx.BoxSizer(wx.HORIZONTAL)
         hbox.Add(wx.StaticText(self, label='From Path : '), 0)
         self.fileText = wx.TextCtrl(self, style=wx.TE_PROCESS_ENTER)
+        self.fileText.SetToolTip('part of the path, or a query like : tag:hd AND duration>1h AND NOT actor:name (start with ? to force a query)')
         self.Bind(wx.EVT_TEXT_ENTER, self.OnFileFilter, self.fileText)
         hbox.Add(self.fileText, 1, wx.EXPAND)
         dstream = io.BytesIO(icons.filter_button)
@@ -66,11 +80,29 @@ class LeftPanel(wx.Panel):
         hbox.Add(fileSetBtn)
         vbox.Add(hbox, 0, wx.EXPAND)
 
+        hbox = wx.BoxSizer(wx.HORIZONTAL)
+        hbox.Add(wx.StaticText(self, label='Collections'), 0)
+        hbox.AddStretchSpacer()
+        self.saveButton = wx.Button(self, size=(100, -1), label='Save Search')
+        self.saveButton.SetToolTip('save the path or query as a collection')
+        self.Bind(wx.EVT_BUTTON, self.OnCollectionSave, self.saveButton)
+        hbox.Add(self.saveButton, 0, wx.EXPAND)
+        vbox.Add(hbox, 0, wx.EXPAND)
+
+        self.collectionList = wx.ListCtrl(self, size=(300, 100), style=wx.LC_LIST |
+                                                                      wx.LC_ALIGN_TOP |
+                                                                      wx.LC_SINGLE_SEL)
+        self.Bind(wx.EVT_LIST_ITEM_SELECTED, self.OnCollectionSelect, self.collectionList)
+        self.Bind(wx.EVT_LIST_ITEM_DESELECTED, self.OnCollectionSelect, self.collectionList)
+        self.collectionList.Bind(wx.EVT_KEY_DOWN, self.OnCollectionKeyDown)
+        vbox.Add(self.collectionList, 0, wx.EXPAND)
+
         self.actorList = wx.ListCtrl(self, size=(300, -1), style=wx.LC_LIST |
                                                                  wx.LC_ALIGN_TOP |
                                                                  wx.LC_EDIT_LABELS)
         self.Bind(wx.EVT_LIST_ITEM_SELECTED, self.OnActorSelect, self.actorList)
         self.Bind(wx.EVT_LIST_ITEM_DESELECTED, self.OnActorSelect, self.actorList)
+        self.Bind(wx.EVT_LIST_BEGIN_LABEL_EDIT, self.OnActorBeginEdit, self.actorList)
         self.Bind(wx.EVT_LIST_END_LABEL_EDIT, self.OnActorEdit, self.actorList)
         self.actorList.Bind(wx.EVT_KEY_DOWN, self.OnActorKeyDown)
         vbox.Add(self.actorList, 1, wx.EXPAND)
@@ -80,6 +112,7 @@ class LeftPanel(wx.Panel):
                                                                wx.LC_EDIT_LABELS)
         self.Bind(wx.EVT_LIST_ITEM_SELECTED, self.OnTagSelect, self.tagList)
         self.Bind(wx.EVT_LIST_ITEM_DESELECTED, self.OnTagSelect, self.tagList)
+        self.Bind(wx.EVT_LIST_BEGIN_LABEL_EDIT, self.OnTagBeginEdit, self.tagList)
         self.Bind(wx.EVT_LIST_END_LABEL_EDIT, self.OnTagEdit, self.tagList)
         self.tagList.Bind(wx.EVT_KEY_DOWN, self.OnTagKeyDown)
         vbox.Add(self.tagList, 1, wx.EXPAND)
@@ -89,6 +122,8 @@ class LeftPanel(wx.Panel):
 
         self.clearButton.Disable()
         self.fileText.Disable()
+        self.saveButton.Disable()
+        self.collectionList.Disable()
         self.actorList.Disable()
         self.tagList.Disable()
 
@@ -113,23 +148,65 @@ class LeftPanel(wx.Panel):
         self.update_lists()
         self.update_timer.Start(10)
 
+    def OnCollectionKeyDown(self, e):
+        if e.GetKeyCode() != wx.WXK_DELETE:
+            return
+        if self.collection_selected is None:
+            return
+        self.catalog.del_collection(self.collection_selected)
+        self.collection_selected = None
+        self.update_lists()
+        self.update_timer.Start(10)
+
+    def OnCollectionSave(self, e):
+        query = self.fileText.GetValue().strip()
+        if not query:
+            return
+        with wx.TextEntryDialog(self, 'collection name for : %s' % query, 'Save Search') as dialog:
+            if dialog.ShowModal() != wx.ID_OK:
+                return
+            name = dialog.GetValue().strip()
+        if not self.catalog.add_collection(name, query):
+            wx.MessageBox('cannot save the collection %s' % name, 'Save Search', wx.OK | wx.ICON_WARNING)
+            return
+        self.update_lists()
+
+    def OnCollectionSelect(self, e):
+        idx = self.collectionList.GetFirstSelected()
+        if idx < 0:
+            self.collection_selected = None
+        else:
+            self.collection_selected = self.collection_names[idx]
+        self.update_timer.Start(10)
+
+    def begin_name_edit(self, list_ctrl, names, idx):
+        # the label carries the file count, the name itself is edited
+        list_ctrl.SetItemText(idx, names[idx])
+        edit = list_ctrl.GetEditControl()
+        if edit:
+            edit.SetValue(names[idx])
+
+    def OnActorBeginEdit(self, e):
+        self.begin_name_edit(self.actorList, self.actor_names, e.GetIndex())
+
+    def OnTagBeginEdit(self, e):
+        self.begin_name_edit(self.tagList, self.tag_names, e.GetIndex())
+
     def OnActorEdit(self, e):
-        res = self.catalog.modify_actor(self.actorList.GetItemText(e.GetIndex()),
-                                        e.GetLabel())
-        if not res:
+        if e.IsEditCancelled() or not self.catalog.modify_actor(self.actor_names[e.GetIndex()], e.GetLabel()):
             e.Veto()
+            wx.CallAfter(self.update_counts)
             return
         self.update_lists()
         self.mm_window.rightPanel.update_view()
 
     def OnTagEdit(self, e):
-        res = self.catalog.modify_tag(self.tagList.GetItemText(e.GetIndex()),
-                                      e.GetLabel())
-        if not res:
+        if e.IsEditCancelled() or not self.catalog.modify_tag(self.tag_names[e.GetIndex()], e.GetLabel()):
             e.Veto()
+            wx.CallAfter(self.update_counts)
             return
         self.update_lists()
-        self.mm_window.rightPanel.updatee_view()
+        self.mm_window.rightPanel.update_view()
 
     def OnFileFilter(self, e):
         self.file_filter = self.fileText.GetValue()
@@ -145,13 +222,13 @@ class LeftPanel(wx.Panel):
         if idx < 0:
             self.update_timer.Start(10)
             return
-        name = self.actorList.GetItemText(idx)
+        name = self.actor_names[idx]
         self.actor_selected.append(name)
         while idx >= 0:
             idx = self.actorList.GetNextSelected(idx)
             if idx < 0:
                 break
-            name = self.actorList.GetItemText(idx)
+            name = self.actor_names[idx]
             self.actor_selected.append(name)
         self.actor_selected.sort()
         self.update_timer.Start(10)
@@ -162,18 +239,21 @@ class LeftPanel(wx.Panel):
         if idx < 0:
             self.update_timer.Start(10)
             return
-        tag = self.tagList.GetItemText(idx)
+        tag = self.tag_names[idx]
         self.tag_selected.append(tag)
         while idx >= 0:
             idx = self.tagList.GetNextSelected(idx)
             if idx < 0:
                 break
-            name = self.tagList.GetItemText(idx)
+            name = self.tag_names[idx]
             self.tag_selected.append(name)
         self.tag_selected.sort()
         self.update_timer.Start(10)
 
     def OnClear(self, e):
+        self.collection_selected = None
+        for n in range(self.collectionList.GetItemCount()):
+            self.collectionList.Select(n, on=0)
         self.actor_selected = []
         for n in range(self.actorList.GetItemCount()):
             self.actorList.Select(n, on=0)
@@ -184,24 +264,51 @@ class LeftPanel(wx.Panel):
         self.fileText.SetValue('')
         self.mm_window.update_view()
 
+    def get_facet_counts(self):
+        return self.catalog.get_facet_counts(self.actor_selected, self.tag_selected, self.file_filter,
+                                             self.collection_selected)
+
     def update_lists(self):
+        self.collectionList.DeleteAllItems()
         self.actorList.DeleteAllItems()
         self.tagList.DeleteAllItems()
+        self.collection_names = []
+        self.actor_names = []
+        self.tag_names = []
 
         if self.catalog is None:
             return
 
-        actor_list = sorted(self.catalog.actor_list)
-        for name in actor_list:
-            idx = self.actorList.Append((name,))
+        self.collection_names = sorted(self.catalog.collections)
+        if self.collection_selected not in self.collection_names:
+            self.collection_selected = None
+        for name in self.collection_names:
+            idx = self.collectionList.Append((name,))
+            if name == self.collection_selected:
+                self.collectionList.Select(idx)
+
+        actor_counts, tag_counts = self.get_facet_counts()
+        self.actor_names = sorted(self.catalog.actor_list)
+        for name in self.actor_names:
+            idx = self.actorList.Append((get_count_label(name, actor_counts),))
             if name in self.actor_selected:
                 self.actorList.Select(idx)
-        tag_list = sorted(self.catalog.tag_list)
-        for tag in tag_list:
-            idx = self.tagList.Append((tag,))
+        self.tag_names = sorted(self.catalog.tag_list)
+        for tag in self.tag_names:
+            idx = self.tagList.Append((get_count_label(tag, tag_counts),))
             if tag in self.tag_selected:
                 self.tagList.Select(idx)
 
+    def update_counts(self):
+        # relabels the items in place, so the selection is kept
+        if self.catalog is None:
+            return
+        actor_counts, tag_counts = self.get_facet_counts()
+        for idx, name in enumerate(self.actor_names):
+            self.actorList.SetItemText(idx, get_count_label(name, actor_counts))
+        for idx, tag in enumerate(self.tag_names):
+            self.tagList.SetItemText(idx, get_count_label(tag, tag_counts))
+
     def update_view(self):
         self.update_lists()
 
@@ -216,6 +323,8 @@ class LeftPanel(wx.Panel):
             self.update_lists()
             self.clearButton.Disable()
             self.fileText.Disable()
+            self.saveButton.Disable()
+            self.collectionList.Disable()
             self.actorList.Disable()
             self.tagList.Disable()
             return
@@ -223,6 +332,8 @@ class LeftPanel(wx.Panel):
         self.update_view()
         self.clearButton.Enable()
         self.fileText.Enable()
+        self.saveButton.Enable()
+        self.collectionList.Enable()
         self.actorList.Enable()
         self.tagList.Enable()
 
@@ -331,23 +442,20 @@ class RightPanel(wx.Panel):
     def OnActorCheck(self, e):
         sel = e.GetIndex()
         name = self.actorList.GetItemText(sel, 1)
-        for mf in self.files_selected:
-            mf.add_actor(name)
+        self.catalog.add_actor_files(name, self.files_selected)
 
     def OnActorUncheck(self, e):
         sel = e.GetIndex()
         name = self.actorList.GetItemText(sel, 1)
 
-        for mf in self.files_selected:
-            mf.del_actor(name)
+        self.catalog.del_actor_files(name, self.files_selected)
 
     def OnActorAdd(self, e):
         name = self.actorText.GetValue()
         if not name:
             return
 
-        for mf in self.files_selected:
-            mf.add_actor(name)
+        self.catalog.add_actor_files(name, self.files_selected)
         self.mm_window.leftPanel.update_view()
         self.update_actor()
 
@@ -364,13 +472,14 @@ class RightPanel(wx.Panel):
         old_tag = self.tagList.GetItemText(e.GetIndex(), 1)
         new_tag = e.GetLabel()
         self.catalog.add_tag(new_tag)
-        for mf in self.files_selected:
-            mf.modify_tag(old_tag, new_tag)
+        with self.catalog.transaction():
+            for mf in self.files_selected:
+                mf.modify_tag(old_tag, new_tag)
         self.update_tag()
         self.mm_window.leftPanel.update_view()
 
     def update_actor(self):
-        if not self.catalog:
+        if self.catalog is None:
             self.actorList.DeleteAllItems()
             return
 
@@ -392,8 +501,7 @@ class RightPanel(wx.Panel):
     def OnTagCheck(self, e):
         sel = e.GetIndex()
         tag = self.tagList.GetItemText(sel, 1)
-        for mf in self.files_selected:
-            mf.add_tag(tag)
+        self.catalog.add_tag_files(tag, self.files_selected)
 
     def OnTagUncheck(self, e):
         sel = e.GetIndex()
@@ -403,23 +511,21 @@ class RightPanel(wx.Panel):
             if not (tag in mf.tag_list):
                 return
 
-        for mf in self.files_selected:
-            mf.del_tag(tag)
+        self.catalog.del_tag_files(tag, self.files_selected)
 
     def OnTagAdd(self, e):
         tag = self.tagText.GetValue()
         if not tag:
             return
 
-        for mf in self.files_selected:
-            mf.add_tag(tag)
+        self.catalog.add_tag_files(tag, self.files_selected)
 
         self.mm_window.leftPanel.update_view()
         self.update_tag()
 
     def update_tag(self):
         self.tagList.DeleteAllItems()
-        if not self.catalog:
+        if self.catalog is None:
             return
 
         tag_list = sorted(self.catalog.tag_list)
@@ -18,7 +18,10 @@
 import os
 import io
 import os.path
+import sys
+import array
 import logging
+import threading
 from PIL import Image
 from moviepy.editor import VideoFileClip
 
@@ -26,21 +29,144 @@ from settings import *
 import database_utils as db_utils
 
 
+MEDIA_COLUMNS = (('size', 'q'),
+                 ('time', 'd'),
+                 ('duration', 'd'),
+                 ('width', 'i'),
+                 ('height', 'i'),
+                 )
+
+NULL_INT = -1
+NULL_FLOAT = float('nan')
+
+
 def get_time(fav):
     return fav.time
 
 
+def to_column(value, typecode):
+    if value is None:
+        return NULL_FLOAT if typecode == 'd' else NULL_INT
+    try:
+        if typecode == 'd':
+            return float(value)
+        return int(value)
+    except (TypeError, ValueError):
+        logging.error('cannot store %r in media column' % (value,))
+        return NULL_FLOAT if typecode == 'd' else NULL_INT
+
+
+def from_column(value, typecode):
+    if typecode == 'd':
+        if value != value:
+            return None
+    elif value == NULL_INT:
+        return None
+    return value
+
+
+class MediaColumns:
+    def __init__(self):
+        self.files = []
+        self.arrays = {}
+        self.typecodes = {}
+        for name, typecode in MEDIA_COLUMNS:
+            self.arrays[name] = array.array(typecode)
+            self.typecodes[name] = typecode
+        self.lock = threading.Lock()
+        self.version = 0
+
+    def __len__(self):
+        return len(self.files)
+
+    def get(self, name, row):
+        return from_column(self.arrays[name][row], self.typecodes[name])
+
+    def set(self, name, row, value):
+        self.arrays[name][row] = to_column(value, self.typecodes[name])
+        self.version += 1
+
+    def attach(self, mf, values):
+        with self.lock:
+            self.version += 1
+            row = len(self.files)
+            self.files.append(mf)
+            for name, typecode in MEDIA_COLUMNS:
+                self.arrays[name].append(to_column(values.get(name), typecode))
+            return row
+
+    def detach(self, row):
+        with self.lock:
+            self.version += 1
+            values = {}
+            for name, typecode in MEDIA_COLUMNS:
+                values[name] = self.get(name, row)
+
+            last = len(self.files) - 1
+            if row != last:
+                moved = self.files[last]
+                self.files[row] = moved
+                for arr in self.arrays.values():
+                    arr[row] = arr[last]
+                moved._row = row
+            self.files.pop()
+            for arr in self.arrays.values():
+                arr.pop()
+            return values
+
+    def restore(self, files, arrays):
+        with self.lock:
+            self.version += 1
+            self.files = files
+            self.arrays = arrays
+
+
+def restore_mediafile(catalog, row, file_id, topdir, reldir, filename, lastplay, comment):
+    mf = MediaFile.__new__(MediaFile)
+    mf.catalog = catalog
+    mf.id = file_id
+    mf.topdir = topdir
+    mf.reldir = reldir
+    mf.filename = filename
+    mf.lastplay = lastplay
+    mf.comment = comment
+    mf._tag_list = None
+    mf._actor_list = None
+    mf._favorites = None
+    mf.thumbnails = None
+    mf.imagelist_index = None
+    mf.view_index = None
+    mf._row = row
+    mf._pending = None
+    return mf
+
+
+def column_property(name):
+    def fget(self):
+        if self._row is None:
+            return self._pending.get(name)
+        return self.catalog.columns.get(name, self._row)
+
+    def fset(self, value):
+        if self._row is None:
+            self._pending[name] = value
+        else:
+            self.catalog.columns.set(name, self._row, value)
+
+    return property(fget, fset)
+
+
 class TopDirectory:
     def __init__(self, cat, abspath, comment=None, exclude=False):
         self.catalog = cat
         self.id = -1
-        self.abspath = os.path.abspath(abspath)
+        self.abspath = sys.intern(os.path.abspath(abspath))
         self.comment = comment
         self.exclude = exclude
 
     def load_dbtuple(self, t):
         self.id = t[0]
-        self.abspath = t[1]
+        self.abspath = sys.intern(t[1])
         self.exclude = t[2]
         self.comment = t[3]
 
@@ -52,6 +178,8 @@ class TopDirectory:
 
 
 class Favorite:
+    __slots__ = ('mediafile', 'time', 'id', 'thumb_id', 'imagelist_index', 'view_index', 'jpg')
+
     def __init__(self, mf, time, id=None, thumb_id=None):
         self.mediafile = mf
         self.time = time
@@ -63,7 +191,7 @@ class Favorite:
 
     def store(self):
         db_conn = self.mediafile.catalog.db_conn
-        db_utils.add_favorite(db_conn, self.mediafile.id, self.thumb_id)
+        self.id = db_utils.add_favorite(db_conn, self.mediafile.id, self.thumb_id)
 
     def delete(self):
         db_conn = self.mediafile.catalog.db_conn
@@ -74,35 +202,108 @@ class Favorite:
 
 
 class MediaFile:
+    # size, time, duration, width and height live in catalog.columns once the
+    # file is appended to the catalog; until then they are kept in _pending.
+    __slots__ = ('catalog', 'id', 'topdir', 'reldir', 'filename', 'lastplay', 'comment',
+                 '_tag_list', '_actor_list', '_favorites', 'thumbnails',
+                 'imagelist_index', 'view_index', '_row', '_pending')
+
+    size = column_property('size')
+    time = column_property('time')
+    duration = column_property('duration')
+    width = column_property('width')
+    height = column_property('height')
+
     def __init__(self, catalog, topdir, reldir, filename):
         self.catalog = catalog
         self.id = None
         self.topdir = topdir
-        self.reldir = reldir
+        self.reldir = sys.intern(reldir)
         self.filename = filename
-        self.size = None
-        self.time = None
         self.lastplay = None
-        self.duration = None
         self.comment = None
-        self.width = None
-        self.height = None
 
-        self.catetory = None
-        self.tag_list = []
-        self.actor_list = []
+        self._tag_list = None
+        self._actor_list = None
+        self._favorites = None
         self.thumbnails = None
-        self.cover = None
-        self.favorites = []
 
-        self.abspath = os.path.join(topdir.abspath, reldir, filename)
         self.imagelist_index = None
         self.view_index = None
+        self._row = None
+        self._pending = {}
+
+    @property
+    def abspath(self):
+        return os.path.join(self.topdir.abspath, self.reldir, self.filename)
+
+    @property
+    def tag_list(self):
+        if self._tag_list is None:
+            self._tag_list = []
+        return self._tag_list
+
+    @tag_list.setter
+    def tag_list(self, tag_list):
+        self._tag_list = tag_list
+
+    @property
+    def actor_list(self):
+        if self._actor_list is None:
+            self._actor_list = []
+        return self._actor_list
+
+    @actor_list.setter
+    def actor_list(self, actor_list):
+        self._actor_list = actor_list
+
+    @property
+    def favorites(self):
+        if self._favorites is None:
+            self._favorites = []
+        return self._favorites
+
+    @favorites.setter
+    def favorites(self, favorites):
+        self._favorites = favorites
+
+    def has_tag(self, tag):
+        return self._tag_list is not None and tag in self._tag_list
+
+    def has_actor(self, name):
+        return self._actor_list is not None and name in self._actor_list
+
+    def get_tags(self):
+        if self._tag_list is None:
+            return ()
+        return self._tag_list
+
+    def get_actors(self):
+        if self._actor_list is None:
+            return ()
+        return self._actor_list
+
+    def get_favorites(self):
+        if self._favorites is None:
+            return ()
+        return self._favorites
+
+    def attach(self):
+        if self._row is not None:
+            return
+        self._row = self.catalog.columns.attach(self, self._pending)
+        self._pending = None
+
+    def detach(self):
+        if self._row is None:
+            return
+        self._pending = self.catalog.columns.detach(self._row)
+        self._row = None
 
     def load_dbtuple(self, t):
         self.id = t[0]
         self.topdir = self.catalog.get_topdir_from_id(t[1])
-        self.reldir = t[2]
+        self.reldir = sys.intern(t[2])
         self.filename = t[3]
         self.size = t[4]
         self.time = t[5]
@@ -115,6 +316,8 @@ class MediaFile:
     def set_lastplayed(self, dt):
         self.lastplay = dt
         db_utils.update_file(self.catalog.db_conn, self)
+        self.catalog.touch()
+        self.catalog.update_collections((self,))
 
     def get_resolution(self, dwidth, dheight, width, height):
         theight = width * dheight / dwidth
@@ -181,11 +384,11 @@ class MediaFile:
     def save_thumbnails(self):
         if not self.thumbnails:
             return
-        db_utils.add_thumbnails(self.catalog.db_conn, self.id, self.thumbnails)
+        db_utils.add_thumbnails(self.catalog.db_conn, self.id, self.thumbnails, self.catalog.get_thumbnail_pack())
 
     def load_thumbnails(self):
         logging.debug('loading thumbnail for %s' % self.abspath)
-        self.thumbnails = db_utils.get_thumbnails(self.catalog.db_conn, self.id)
+        self.thumbnails = db_utils.get_thumbnails(self.catalog.db_conn, self.id, self.catalog.thumbnail_pack)
         if self.thumbnails:
             return
 
@@ -198,27 +401,26 @@ class MediaFile:
         return None
 
     def get_thumbjpg(self, thumb_id):
-        jpg = db_utils.get_thumbnail_from_id(self.catalog.db_conn, thumb_id)[3]
+        jpg = db_utils.get_thumbnail_from_id(self.catalog.db_conn, thumb_id, self.catalog.thumbnail_pack)[3]
         return jpg
 
     def get_coverjpg(self, read_db=True):
-        if self.cover:
-            return self.cover
-        if not read_db:
-            return None
-        rows = db_utils.get_cover(self.catalog.db_conn, self.id)
-        if rows:
-            self.cover = rows[0][0]
-            if self.cover:
-                return self.cover
-        return None
+        cover_cache = self.catalog.cover_cache
+        jpg, cached = cover_cache.get(self.id)
+        if cached or not read_db:
+            return jpg
+        cover_cache.prefetch((self,))
+        jpg, cached = cover_cache.get(self.id)
+        return jpg
 
     def set_cover_id(self, sel):
         if not self.thumbnails:
             return
+        # packed thumbnails are views of the pack map, the cover keeps its own copy
+        jpg = bytes(self.thumbnails[sel][1])
         db_utils.del_cover(self.catalog.db_conn, self.id)
-        db_utils.add_cover(self.catalog.db_conn, self.id, self.thumbnails[sel][1])
-        self.cover = self.thumbnails[sel][1]
+        db_utils.add_cover(self.catalog.db_conn, self.id, jpg)
+        self.catalog.cover_cache.put(self.id, jpg)
 
     def loadinfo(self):
         file_stats = os.stat(self.abspath)
@@ -238,16 +440,20 @@ class MediaFile:
     def add_actor(self, name):
         if name in self.actor_list:
             return
-        self.catalog.add_actor(name)
-        actor_id = db_utils.get_actorid_from_name(self.catalog.db_conn, name)
-        db_utils.add_actorfile(self.catalog.db_conn, actor_id, self.id)
+        with self.catalog.transaction():
+            self.catalog.add_actor(name)
+            db_utils.add_actorfile_by_name(self.catalog.db_conn, name, self.id)
         self.actor_list.append(name)
+        self.catalog.actor_index.add(name, (self.id,))
+        self.catalog.update_collections((self,))
 
     def del_actor(self, name):
         if not (name in self.actor_list):
             return
-        db_utils.del_actorfile(self.catalog.db_conn, name, self.id)
+        db_utils.del_actorfile_bulk(self.catalog.db_conn, name, (self.id,))
         self.actor_list.remove(name)
+        self.catalog.actor_index.discard(name, (self.id,))
+        self.catalog.update_collections((self,))
 
     def modify_actor(self, orig_name, new_name):
         if not (orig_name in self.actor_list):
@@ -255,27 +461,39 @@ class MediaFile:
         self.actor_list.remove(orig_name)
         self.actor_list.append(new_name)
         self.actor_list.sort()
+        self.catalog.actor_index.discard(orig_name, (self.id,))
+        self.catalog.actor_index.add(new_name, (self.id,))
+        self.catalog.update_collections((self,))
 
     def add_tag(self, tag):
         if tag in self.tag_list:
             return
+        with self.catalog.transaction():
+            db_utils.add_tag(self.catalog.db_conn, tag, self.id)
         self.catalog.add_tag(tag)
-        db_utils.add_tag(self.catalog.db_conn, tag, self.id)
         self.tag_list.append(tag)
+        self.catalog.tag_index.add(tag, (self.id,))
+        self.catalog.update_collections((self,))
 
     def del_tag(self, tag):
         if not (tag in self.tag_list):
             return
         db_utils.del_tag(self.catalog.db_conn, tag, self.id)
         self.tag_list.remove(tag)
+        self.catalog.tag_index.discard(tag, (self.id,))
+        self.catalog.update_collections((self,))
 
     def modify_tag(self, orig_tag, new_tag):
         if not (orig_tag in self.tag_list):
             return
         db_utils.modify_tag(self.catalog.db_conn, self.id, orig_tag, new_tag)
         self.tag_list.remove(orig_tag)
-        self.tag_list.append(new_tag)
-        self.tag_list.sort()
+        self.catalog.tag_index.discard(orig_tag, (self.id,))
+        self.catalog.tag_index.add(new_tag, (self.id,))
+        if new_tag not in self.tag_list:
+            self.tag_list.append(new_tag)
+            self.tag_list.sort()
+        self.catalog.update_collections((self,))
 
     def add_favorite(self, time):
         for fav in self.favorites:
@@ -292,8 +510,7 @@ class MediaFile:
             if thumb[0] != time:
                 continue
             thumb_id = thumb[2]
-            db_utils.add_favorite(self.catalog.db_conn, self.id, thumb_id)
-            fav_id = db_utils.get_favorite_id(self.catalog.db_conn, self.id, thumb_id)
+            fav_id = db_utils.add_favorite(self.catalog.db_conn, self.id, thumb_id)
             fav = Favorite(self, time, id=fav_id, thumb_id=thumb_id)
             self.favorites.append(fav)
             self.favorites.sort(key=get_time)
@@ -310,7 +527,7 @@ class MediaFile:
         except Exception as e:
             logging.error(e)
             return False
-        self.filename = new_name
+        self.catalog.rename_file(self, new_name)
         db_utils.update_file(self.catalog.db_conn, self)
         return True
 
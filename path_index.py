@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+# Copyright 2020 pinebud77@hotmail.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Substring index for the filename filter. Every file keeps its lowercase
+# filename and the index of its lowercase directory, filenames are indexed by
+# trigram and the few distinct directories are scanned directly. Postings are
+# append only, ids of removed files are dropped when a search checks them.
+
+import os.path
+import re
+import array
+import threading
+import collections
+
+
+TRIGRAM = 3
+
+
+def get_trigrams(s):
+    return set(s[n:n + TRIGRAM] for n in range(len(s) - TRIGRAM + 1))
+
+
+class PathIndex:
+    def __init__(self):
+        self.names = None
+        self.dir_map = None
+        self.dir_paths = None
+        self.dir_files = None
+        self.postings = None
+        self.last_name = None
+        self.last_ids = None
+        self.lock = threading.Lock()
+
+    def is_built(self):
+        return self.names is not None
+
+    def build(self, files):
+        with self.lock:
+            self.names = {}
+            self.dir_map = {}
+            self.dir_paths = []
+            self.dir_files = []
+            self.postings = collections.defaultdict(list)
+            for mf in files:
+                self.add_nolock(mf)
+
+    def reset(self):
+        with self.lock:
+            self.names = None
+            self.last_name = None
+            self.last_ids = None
+
+    def add(self, mf):
+        with self.lock:
+            if self.names is None:
+                return
+            self.add_nolock(mf)
+
+    def add_nolock(self, mf):
+        dir_key = (mf.topdir, mf.reldir)
+        dir_ix = self.dir_map.get(dir_key)
+        if dir_ix is None:
+            dir_ix = len(self.dir_paths)
+            self.dir_map[dir_key] = dir_ix
+            self.dir_paths.append(os.path.join(mf.topdir.abspath, mf.reldir).lower())
+            self.dir_files.append(array.array('q'))
+        self.dir_files[dir_ix].append(mf.id)
+
+        filename = mf.filename.lower()
+        self.names[mf.id] = (filename, dir_ix)
+        postings = self.postings
+        for gram in {filename[n:n + TRIGRAM] for n in range(len(filename) - TRIGRAM + 1)}:
+            postings[gram].append(mf.id)
+        self.last_name = None
+        self.last_ids = None
+
+    def remove(self, file_id):
+        with self.lock:
+            if self.names is None:
+                return
+            self.names.pop(file_id, None)
+            self.last_name = None
+            self.last_ids = None
+
+    def get_candidates(self, key):
+        if len(key) < TRIGRAM:
+            return list(self.names)
+
+        candidates = None
+        for gram in get_trigrams(key):
+            posting = self.postings.get(gram)
+            if posting is None:
+                candidates = ()
+                break
+            if candidates is None or len(posting) < len(candidates):
+                candidates = posting
+
+        dir_candidates = []
+        for dir_ix, dir_path in enumerate(self.dir_paths):
+            if key in dir_path:
+                dir_candidates.extend(self.dir_files[dir_ix])
+        if not dir_candidates:
+            return candidates
+        if not candidates:
+            return dir_candidates
+        return dict.fromkeys(list(candidates) + dir_candidates)
+
+    def search(self, name):
+        name = name.lower()
+        with self.lock:
+            if self.last_name is not None and self.last_name in name:
+                # the user is still typing, only the previous matches can match
+                candidates = self.last_ids
+            else:
+                # a name without separators lies inside the directory or the filename
+                candidates = self.get_candidates(max(re.split(r'[\\/]', name), key=len))
+
+            names = self.names
+            dir_paths = self.dir_paths
+            whole_path = '/' in name or '\\' in name
+            file_ids = []
+            seen = set()
+            for file_id in candidates:
+                entry = names.get(file_id)
+                if entry is None or file_id in seen:
+                    continue
+                # a renamed file is still posted under its old grams and directory
+                seen.add(file_id)
+                if whole_path:
+                    found = name in os.path.join(dir_paths[entry[1]], entry[0])
+                else:
+                    found = name in entry[0] or name in dir_paths[entry[1]]
+                if found:
+                    file_ids.append(file_id)
+            self.last_name = name
+            self.last_ids = file_ids
+            return file_ids
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+# Copyright 2020 pinebud77@hotmail.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Posting sets for actor and tag filtering : one bitmap per name, bit n is set
+# when the file with id n has the name. The bitmaps are built by the first
+# filter and updated in place by every link change after that. The version
+# grows with every change, built or not, so filter results can be cached.
+
+BYTE_BITS = tuple(tuple(bit for bit in range(8) if byte & (1 << bit)) for byte in range(256))
+
+try:
+    count_bits = int.bit_count
+except AttributeError:
+    # python before 3.10
+    def count_bits(mask):
+        return bin(mask).count('1')
+
+
+def mask_to_ids(mask):
+    ids = []
+    if mask <= 0:
+        return ids
+    data = mask.to_bytes((mask.bit_length() + 7) // 8, 'little')
+    for byte_i, byte in enumerate(data):
+        if byte:
+            base = byte_i << 3
+            for bit in BYTE_BITS[byte]:
+                ids.append(base + bit)
+    return ids
+
+
+def ids_to_mask(file_ids):
+    bitmap = bytearray()
+    for file_id in file_ids:
+        byte_i = file_id >> 3
+        if byte_i >= len(bitmap):
+            bitmap.extend(bytes(byte_i + 1 - len(bitmap)))
+        bitmap[byte_i] |= 1 << (file_id & 7)
+    return int.from_bytes(bitmap, 'little')
+
+
+class PostingIndex:
+    def __init__(self):
+        self.bitmaps = None
+        self.version = 0
+
+    def is_built(self):
+        return self.bitmaps is not None
+
+    def build(self, files, get_names):
+        self.bitmaps = {}
+        for mf in files:
+            for name in get_names(mf):
+                self.set_bits(name, (mf.id,))
+
+    def reset(self):
+        self.version += 1
+        self.bitmaps = None
+
+    def add(self, name, file_ids):
+        self.version += 1
+        if self.bitmaps is None:
+            return
+        self.set_bits(name, file_ids)
+
+    def set_bits(self, name, file_ids):
+        bitmap = self.bitmaps.get(name)
+        if bitmap is None:
+            bitmap = bytearray()
+            self.bitmaps[name] = bitmap
+        for file_id in file_ids:
+            byte_i = file_id >> 3
+            if byte_i >= len(bitmap):
+                bitmap.extend(bytes(byte_i + 1 - len(bitmap)))
+            bitmap[byte_i] |= 1 << (file_id & 7)
+
+    def discard(self, name, file_ids):
+        self.version += 1
+        if self.bitmaps is None:
+            return
+        bitmap = self.bitmaps.get(name)
+        if bitmap is None:
+            return
+        for file_id in file_ids:
+            byte_i = file_id >> 3
+            if byte_i < len(bitmap):
+                bitmap[byte_i] &= ~(1 << (file_id & 7)) & 0xff
+
+    def discard_file(self, file_id, names):
+        for name in names:
+            self.discard(name, (file_id,))
+
+    def rename(self, orig_name, new_name):
+        self.version += 1
+        if self.bitmaps is None:
+            return
+        bitmap = self.bitmaps.pop(orig_name, None)
+        if bitmap is None:
+            return
+        if new_name in self.bitmaps:
+            mask = self.get_mask((new_name,)) | int.from_bytes(bitmap, 'little')
+            bitmap = bytearray(mask.to_bytes((mask.bit_length() + 7) // 8, 'little'))
+        self.bitmaps[new_name] = bitmap
+
+    def remove(self, name):
+        self.version += 1
+        if self.bitmaps is None:
+            return
+        self.bitmaps.pop(name, None)
+
+    def get_counts(self, mask=None):
+        counts = {}
+        for name, bitmap in self.bitmaps.items():
+            bits = int.from_bytes(bitmap, 'little')
+            if mask is not None:
+                bits &= mask
+            counts[name] = count_bits(bits)
+        return counts
+
+    def get_mask(self, names):
+        mask = 0
+        for name in names:
+            bitmap = self.bitmaps.get(name)
+            if bitmap:
+                mask |= int.from_bytes(bitmap, 'little')
+        return mask
@@ -66,6 +66,28 @@ DEF_MAX_IMAGE_COUNT = 40
 DEF_THUMBNAIL_WIDTH = 360
 DEF_THUMBNAIL_HEIGHT = 203
 DEF_STREAM_PERIOD = 90
+DEF_COVER_CACHE_SIZE = 64 * 1024 * 1024
+DEF_COVER_ENTRY_SIZE = 256
+
+#catalog settings
+DEF_USE_SNAPSHOT = True
+DEF_OPEN_FIRST_PAGE = 200
+DEF_OPEN_PAGE_SIZE = 2000
+DEF_OPEN_PAGE_PERIOD = 10
+DEF_FILTER_CACHE_SIZE = 32
+DEF_FACET_SCAN_RATIO = 8
+DEF_WALK_THREADS = 16
+DEF_WALK_MOUNT_THREADS = 4
+
+#database settings : one sync writer and the GUI reader share the catalog through WAL
+DEF_DB_JOURNAL_MODE = 'WAL'
+DEF_DB_SYNCHRONOUS = 'NORMAL'
+DEF_DB_BUSY_TIMEOUT = 30.0
+DEF_FILELOG_READER_PERIOD = 60
+DEF_FILELOG_READER_EXPIRE = 10 * DEF_FILELOG_READER_PERIOD
+DEF_DB_CACHE_SIZE = 64 * 1024
+DEF_USE_THUMBNAIL_PACK = False
+DEF_USE_SQL_FILTER = False
 
 #open directives : currently set for PotPlayer
 DEF_OPEN_EXE = 'C:\\Program Files\\DAUM\\PotPlayer\\PotPlayerMini64.exe'
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+# Copyright 2020 pinebud77@hotmail.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Smart collection : a named query stored in the catalog. Its members are found
+# by one query run when the collection is first opened. After that only the
+# files that are added, removed, relabeled or played are checked again.
+
+import logging
+
+import catalog_query
+from posting_index import mask_to_ids
+
+
+class SmartCollection:
+    def __init__(self, collection_id, name, query):
+        self.id = collection_id
+        self.name = name
+        self.query = query
+        self.file_ids = None
+        try:
+            self.plan = catalog_query.compile_query(query)
+        except catalog_query.QueryException as e:
+            logging.warning('bad query of collection %s : %s' % (name, e))
+            self.plan = None
+
+    def __str__(self):
+        return self.name
+
+    def get_file_ids(self, catalog):
+        if self.file_ids is None:
+            if self.plan is None:
+                self.file_ids = set()
+            else:
+                self.file_ids = set(mask_to_ids(self.plan.evaluate(catalog)))
+        return self.file_ids
+
+    def update(self, catalog, files):
+        if self.file_ids is None or self.plan is None:
+            return
+        for mf in files:
+            if mf.id is None:
+                continue
+            if self.plan.matches(catalog, mf):
+                self.file_ids.add(mf.id)
+            else:
+                self.file_ids.discard(mf.id)
+
+    def discard(self, file_id):
+        if self.file_ids is not None:
+            self.file_ids.discard(file_id)
+
+    def reset(self):
+        self.file_ids = None
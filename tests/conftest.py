@@ -0,0 +1,46 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import Catalog
+import media_file
+
+
+def store_files(catalog, topdir_path, names, reldir=''):
+    # files as sync_files stores them, without probing them with ffmpeg
+    topdir = catalog.get_topdir_from_abspath(os.path.abspath(topdir_path))
+    for name in names:
+        open(os.path.join(topdir_path, reldir, name), 'wb').close()
+    mf_list = [media_file.MediaFile(catalog, topdir, reldir, name) for name in names]
+    catalog.store_new_files(mf_list)
+    return mf_list
+
+
+@pytest.fixture
+def media_dir(tmp_path):
+    path = tmp_path / 'media'
+    path.mkdir()
+    return str(path)
+
+
+@pytest.fixture
+def catalog_path(tmp_path):
+    return str(tmp_path / 'test.yamm')
+
+
+@pytest.fixture
+def open_catalog(catalog_path):
+    catalogs = []
+
+    def open_catalog(**kwargs):
+        catalog = Catalog(catalog_path)
+        catalog.open_database(**kwargs)
+        catalogs.append(catalog)
+        return catalog
+    yield open_catalog
+    for catalog in catalogs:
+        if catalog.db_conn is not None:
+            catalog.close_database()
@@ -0,0 +1,50 @@
+import pytest
+
+from conftest import store_files
+
+
+NAMES = ['my movie.mp4', 'my other movie.mp4', 'show (live).mp4', 'live show.mp4', 'best of AND more.mp4']
+
+
+@pytest.fixture
+def cat(open_catalog, media_dir):
+    cat = open_catalog()
+    cat.add_topdir(media_dir)
+    mf_list = store_files(cat, media_dir, NAMES)
+    mf_list[0].add_tag('hd')
+    mf_list[2].add_tag('hd')
+    return cat
+
+
+@pytest.mark.parametrize('text', ['my movie', '(live)', 'live show', 'of AND', 'tag:hd', 'movie AND NOT tag:hd'])
+def test_collection_matches_filter(cat, text):
+    assert cat.add_collection('saved', text)
+    filtered = sorted(mf.filename for mf in cat.filter(filename=text))
+    assert filtered
+    assert sorted(mf.filename for mf in cat.filter(collection='saved')) == filtered
+
+
+def test_collection_follows_changes(cat):
+    assert cat.add_collection('hd', 'tag:hd')
+    assert sorted(mf.filename for mf in cat.filter(collection='hd')) == ['my movie.mp4', 'show (live).mp4']
+
+    mf = cat.filter(filename='live show')[0]
+    mf.add_tag('hd')
+    cat.filter(filename='my movie')[0].del_tag('hd')
+    cat.remove(cat.filter(filename='(live)')[0])
+    assert sorted(mf.filename for mf in cat.filter(collection='hd')) == ['live show.mp4']
+
+
+def test_path_collection_follows_rename(cat):
+    assert cat.add_collection('movies', 'movie')
+    mf = cat.filter(filename='live show')[0]
+    mf.rename('live movie.mp4')
+    assert sorted(mf.filename for mf in cat.filter(collection='movies')) == [
+        'live movie.mp4', 'my movie.mp4', 'my other movie.mp4']
+
+
+def test_collection_survives_reopen(open_catalog, cat):
+    assert cat.add_collection('saved', 'my movie')
+    cat.close_database()
+    cat = open_catalog()
+    assert [mf.filename for mf in cat.filter(collection='saved')] == ['my movie.mp4']
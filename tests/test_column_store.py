@@ -0,0 +1,66 @@
+import random
+
+import pytest
+
+import column_store
+import posting_index
+from catalog_query import get_file_value, in_interval
+from conftest import store_files
+
+
+@pytest.fixture
+def store_cat(open_catalog, media_dir):
+    cat = open_catalog()
+    cat.add_topdir(media_dir)
+    rand = random.Random(21)
+    for mf in store_files(cat, media_dir, ['%03d.mp4' % n for n in range(200)]):
+        mf.size = rand.choice([None, 0, rand.randrange(1 << 40)])
+        mf.duration = rand.choice([None, 0, rand.uniform(0, 10000)])
+        mf.width = rand.choice([None, 0, 640, 1280, 1920, 3840])
+        mf.height = rand.choice([None, 0, 480, 720, 1080, 2160])
+    return cat
+
+
+INTERVALS = [(0, True, None, False), (0, False, None, False),
+             (None, False, 0, True), (100, True, 5000, False), (1280, False, 1920, True)]
+
+
+@pytest.mark.parametrize('field', ['size', 'duration', 'resolution', 'width'])
+@pytest.mark.parametrize('interval', INTERVALS)
+def test_range_matches_scan(store_cat, field, interval):
+    expected = []
+    for mf in store_cat:
+        value = get_file_value(mf, field)
+        if value is not None and in_interval(value, *interval):
+            expected.append(mf.id)
+    assert sorted(store_cat.get_column_store().select(field, *interval).tolist()) == sorted(expected)
+
+
+def test_aggregates_match_scan(store_cat):
+    store = store_cat.get_column_store()
+    durations = [mf.duration for mf in store_cat if mf.duration is not None]
+    assert store.count('duration') == len(durations)
+    assert store.total('duration') == pytest.approx(sum(durations))
+
+    histogram = dict(store.resolution_histogram())
+    resolutions = [get_file_value(mf, 'resolution') for mf in store_cat]
+    assert histogram['unknown'] == resolutions.count(None)
+    assert histogram['UHD'] == sum(1 for value in resolutions if value is not None and value >= 3840)
+    assert sum(histogram.values()) == len(store_cat)
+
+
+def test_store_follows_column_changes(store_cat):
+    store = store_cat.get_column_store()
+    assert store_cat.get_column_store() is store
+    mf = store_cat[0]
+    mf.duration = 123456
+    store = store_cat.get_column_store()
+    assert mf.id in store.select('duration', 123456, True, 123456, True).tolist()
+
+    store_cat.remove(mf)
+    assert mf.id not in store_cat.get_column_store().ids.tolist()
+
+
+@pytest.mark.parametrize('file_ids', [[], [3], [0, 8, 9, 700]])
+def test_masks_agree_with_posting_index(file_ids):
+    assert column_store.ids_to_mask(file_ids) == posting_index.ids_to_mask(file_ids)
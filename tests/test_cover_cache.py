@@ -0,0 +1,53 @@
+import database_utils as db_utils
+from cover_cache import CoverCache, get_entry_size
+from settings import DEF_COVER_ENTRY_SIZE
+
+from conftest import store_files
+
+
+def test_missing_cover_is_charged_and_cached():
+    cache = CoverCache(None, max_bytes=10 * DEF_COVER_ENTRY_SIZE)
+    assert cache.get(1) == (None, False)
+    cache.put(1, None)
+    assert cache.get(1) == (None, True)
+    assert cache.cur_bytes == get_entry_size(None) == DEF_COVER_ENTRY_SIZE
+
+
+def test_least_recently_used_cover_goes_first():
+    cache = CoverCache(None, max_bytes=2 * get_entry_size(b'x' * 100))
+    cache.put(1, b'1' * 100)
+    cache.put(2, b'2' * 100)
+    cache.get(1)
+    cache.put(3, b'3' * 100)
+    assert list(cache.covers) == [1, 3]
+    assert cache.cur_bytes == 2 * get_entry_size(b'x' * 100)
+
+    cache.put(1, None)
+    cache.discard(3)
+    assert cache.cur_bytes == get_entry_size(None)
+
+
+def test_cover_larger_than_cache_is_kept_alone():
+    cache = CoverCache(None, max_bytes=DEF_COVER_ENTRY_SIZE)
+    cache.put(1, b'1')
+    cache.put(2, b'2' * 1000)
+    assert list(cache.covers) == [2]
+
+
+def test_covers_are_read_on_demand(open_catalog, media_dir):
+    cat = open_catalog()
+    cat.add_topdir(media_dir)
+    mf_list = store_files(cat, media_dir, ['a.mp4', 'b.mp4'])
+    db_utils.add_cover(cat.db_conn, mf_list[0].id, b'cover')
+    cat.close_database()
+
+    cat = open_catalog()
+    assert not cat.cover_cache.covers
+    files = {mf.filename: mf for mf in cat}
+    assert files['a.mp4'].get_coverjpg(read_db=False) is None
+    cat.cover_cache.prefetch(list(cat))
+    assert files['a.mp4'].get_coverjpg(read_db=False) == b'cover'
+    assert cat.cover_cache.get(files['b.mp4'].id) == (None, True)
+
+    cat.remove(files['a.mp4'])
+    assert cat.cover_cache.get(files['a.mp4'].id) == (None, False)
@@ -0,0 +1,35 @@
+import os
+import sqlite3
+
+import pytest
+
+from conftest import store_files
+
+
+def test_del_files_removes_rows_then_files(open_catalog, media_dir):
+    cat = open_catalog()
+    cat.add_topdir(media_dir)
+    mf_list = store_files(cat, media_dir, ['a.mp4', 'b.mp4', 'c.mp4'])
+
+    assert cat.del_files(mf_list[:2]) == mf_list[:2]
+    assert [mf.filename for mf in cat] == ['c.mp4']
+    assert sorted(os.listdir(media_dir)) == ['c.mp4']
+
+    cat.close_database()
+    assert [mf.filename for mf in open_catalog()] == ['c.mp4']
+
+
+def test_failed_delete_keeps_files_on_disk(open_catalog, media_dir):
+    cat = open_catalog()
+    cat.add_topdir(media_dir)
+    mf_list = store_files(cat, media_dir, ['a.mp4', 'b.mp4'])
+    cat.db_conn.execute("""CREATE TEMP TRIGGER refuse_delete BEFORE DELETE ON main.file
+                           WHEN OLD.filename = 'b.mp4'
+                           BEGIN
+                               SELECT RAISE(ABORT, 'refused');
+                           END;""")
+
+    with pytest.raises(sqlite3.IntegrityError):
+        cat.del_files(mf_list)
+    assert sorted(mf.filename for mf in cat) == ['a.mp4', 'b.mp4']
+    assert sorted(os.listdir(media_dir)) == ['a.mp4', 'b.mp4']
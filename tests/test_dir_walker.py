@@ -0,0 +1,64 @@
+import os
+
+import dir_walker
+from settings import DEF_FILE_EXTENSION
+
+
+def make_tree(root, paths):
+    for path in paths:
+        path = os.path.join(root, *path.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, 'wb').close()
+
+
+def walk(root, ext_list=DEF_FILE_EXTENSION, threads=1):
+    return dir_walker.walk_topdirs([root], ext_list, threads, threads)[root]
+
+
+def relative(root, files):
+    return [os.path.relpath(path, root).replace(os.sep, '/') for path in files]
+
+
+def test_walk_matches_extensions_and_skips_hidden(media_dir):
+    make_tree(media_dir, ['a.mp4', 'B.MKV', 'notes.txt', 'sub/c.avi', 'sub/deeper/d.wmv',
+                          '.hidden.mp4', '.cache/e.mp4', 'sub/.f.mp4'])
+    assert relative(media_dir, walk(media_dir)) == ['B.MKV', 'a.mp4', 'sub/c.avi', 'sub/deeper/d.wmv']
+    assert relative(media_dir, walk(media_dir, ('MKV',))) == ['B.MKV']
+
+
+def test_walk_takes_glob_characters_literally(media_dir):
+    make_tree(media_dir, ['[2020] trip/a.mp4', 'show [x]/[b].mp4', '[!a]/c.mp4'])
+    assert relative(media_dir, walk(media_dir)) == ['[!a]/c.mp4', '[2020] trip/a.mp4', 'show [x]/[b].mp4']
+
+
+def test_unreadable_directory_is_skipped(media_dir, caplog):
+    assert dir_walker.list_directory(os.path.join(media_dir, 'missing'), ('mp4',)) == ([], [])
+    assert 'cannot list directory' in caplog.text
+
+
+def test_parallel_walk_matches_serial_walk(tmp_path):
+    topdirs = [str(tmp_path / name) for name in ('one', 'two', 'three')]
+    for n, topdir in enumerate(topdirs):
+        make_tree(topdir, ['d%d/s%d/f%d.mp4' % (d, s, f) for d in range(n + 2) for s in range(3) for f in range(2)])
+        make_tree(topdir, ['top.mkv'])
+
+    serial = dir_walker.walk_topdirs(topdirs, DEF_FILE_EXTENSION, 1, 1)
+    assert list(serial) == topdirs
+    for n, topdir in enumerate(topdirs):
+        assert len(serial[topdir]) == (n + 2) * 3 * 2 + 1
+        assert all(path.startswith(topdir + os.sep) for path in serial[topdir])
+    for threads, mount_threads in ((4, 1), (8, 4), (16, 16)):
+        assert dir_walker.walk_topdirs(topdirs, DEF_FILE_EXTENSION, threads, mount_threads) == serial
+
+
+def test_walk_reports_every_directory(media_dir):
+    make_tree(media_dir, ['a/b/c.mp4', 'd/e.mp4'])
+    messages = []
+    dir_walker.walk_topdirs([media_dir], DEF_FILE_EXTENSION, 4, 4, msg_cb=messages.append)
+    assert len(messages) == 4
+    assert all(message.startswith('processing directory : ') for message in messages)
+
+
+def test_killed_walk_returns_none(media_dir):
+    make_tree(media_dir, ['a/b/c.mp4'])
+    assert dir_walker.walk_topdirs([media_dir], DEF_FILE_EXTENSION, 4, 4, is_killed=lambda: True) is None
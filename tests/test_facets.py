@@ -0,0 +1,36 @@
+import pytest
+
+import catalog
+from conftest import store_files
+
+
+@pytest.fixture
+def cat(open_catalog, media_dir):
+    cat = open_catalog()
+    cat.add_topdir(media_dir)
+    mf_list = store_files(cat, media_dir, ['a.mp4', 'b.mp4', 'c.mp4', 'd (2).mp4'])
+    cat.add_actor_files('ann', mf_list[:2])
+    cat.add_actor_files('bob (2)', mf_list[1:3])
+    cat.add_tag_files('hd', mf_list[::2])
+    cat.add_tag('new')
+    return cat
+
+
+def test_counts_cover_every_name(cat):
+    actor_counts, tag_counts = cat.get_facet_counts()
+    assert actor_counts == {'ann': 2, 'bob (2)': 2}
+    assert tag_counts == {'hd': 2, 'new': 0}
+
+
+@pytest.mark.parametrize('scan_ratio', [1, 1000], ids=['mask', 'scan'])
+def test_filtered_counts(cat, monkeypatch, scan_ratio):
+    monkeypatch.setattr(catalog, 'DEF_FACET_SCAN_RATIO', scan_ratio)
+    assert cat.get_facet_counts(actors=['ann']) == ({'ann': 2, 'bob (2)': 1}, {'hd': 1, 'new': 0})
+    assert cat.get_facet_counts(filename='(2)') == ({'ann': 0, 'bob (2)': 0}, {'hd': 0, 'new': 0})
+    assert cat.get_facet_counts(tags=['hd'], filename='c.mp4') == ({'ann': 0, 'bob (2)': 1}, {'hd': 1, 'new': 0})
+
+
+def test_counts_follow_label_changes(cat):
+    assert cat.get_facet_counts()[1]['hd'] == 2
+    cat.del_tag_files('hd', list(cat))
+    assert cat.get_facet_counts()[1]['hd'] == 0
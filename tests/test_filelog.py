@@ -0,0 +1,98 @@
+import time
+
+import database_utils as db_utils
+import settings
+
+from conftest import store_files
+
+
+def test_reload_files_from_other_connection(open_catalog, media_dir):
+    gui = open_catalog()
+    gui.add_topdir(media_dir)
+
+    writer = open_catalog()
+    store_files(writer, media_dir, ['a.mp4', 'b.mp4'])
+
+    added, removed = gui.reload_files()
+    assert sorted(mf.filename for mf in added) == ['a.mp4', 'b.mp4']
+    assert removed == []
+    assert gui.reload_files() == ([], [])
+
+
+def test_sync_keeps_cascaded_deletes_until_applied(open_catalog, media_dir):
+    gui = open_catalog()
+    gui.add_topdir(media_dir)
+    store_files(gui, media_dir, ['a.mp4', 'b.mp4', 'c.mp4'])
+    gui.reload_files()
+
+    # the files go away through the foreign key cascade of the topdir row
+    gui.del_topdir(media_dir)
+    assert len(gui) == 3
+
+    sync = open_catalog()
+    sync.sync_database(msg_cb=lambda msg: None)
+    sync.close_database()
+
+    added, removed = gui.reload_files()
+    assert added == []
+    assert sorted(mf.filename for mf in removed) == ['a.mp4', 'b.mp4', 'c.mp4']
+    assert len(gui) == 0
+
+
+def test_trim_stops_at_slowest_reader(open_catalog, media_dir):
+    gui = open_catalog()
+    gui.add_topdir(media_dir)
+    other = open_catalog()
+
+    store_files(gui, media_dir, ['a.mp4'])
+    gui.reload_files()
+
+    sync = open_catalog()
+    sync.sync_database(msg_cb=lambda msg: None)
+    assert len(db_utils.get_filelog(sync.db_conn, 0)) == 1
+
+    # once the other reader applied the log everything can go, the seq counter stays
+    other.reload_files()
+    sync.sync_database(msg_cb=lambda msg: None)
+    assert db_utils.get_filelog(sync.db_conn, 0) == []
+    assert db_utils.get_filelog_seq(sync.db_conn) == gui.filelog_seq
+
+
+def test_closed_catalog_releases_filelog(open_catalog, media_dir):
+    gui = open_catalog()
+    gui.add_topdir(media_dir)
+    other = open_catalog()
+    store_files(gui, media_dir, ['a.mp4'])
+    gui.reload_files()
+    other.close_database()
+
+    sync = open_catalog()
+    sync.sync_database(msg_cb=lambda msg: None)
+    assert db_utils.get_filelog(sync.db_conn, 0) == []
+
+
+def test_expired_reader_does_not_pin_filelog(open_catalog, media_dir):
+    gui = open_catalog()
+    gui.add_topdir(media_dir)
+    store_files(gui, media_dir, ['a.mp4', 'b.mp4'])
+
+    # the row a crashed process leaves behind, never refreshed again
+    db_utils.add_filelog_reader(gui.db_conn, 0, time.time() - settings.DEF_FILELOG_READER_EXPIRE - 1)
+    sync = open_catalog()
+    sync.sync_database(msg_cb=lambda msg: None)
+    assert db_utils.get_filelog(sync.db_conn, 0) == []
+
+
+def test_expired_reader_registers_again(open_catalog, media_dir):
+    gui = open_catalog()
+    gui.add_topdir(media_dir)
+
+    # a catalog that missed its heartbeats loses its row, the next update registers it again
+    db_utils.set_filelog_reader(gui.db_conn, gui.filelog_reader, gui.filelog_seq, 0)
+    sync = open_catalog()
+    sync.sync_database(msg_cb=lambda msg: None)
+    gui.update_filelog_reader()
+
+    store_files(sync, media_dir, ['b.mp4'])
+    sync.sync_database(msg_cb=lambda msg: None)
+    assert [file_id for seq, file_id, op in db_utils.get_filelog(sync.db_conn, 0)] == [sync[-1].id]
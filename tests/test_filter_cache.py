@@ -0,0 +1,57 @@
+import sqlite3
+
+import pytest
+
+from conftest import store_files
+
+
+@pytest.fixture(params=[False, True], ids=['index', 'sql'])
+def cat(request, open_catalog, media_dir):
+    cat = open_catalog()
+    if request.param:
+        assert cat.enable_sql_filter()
+    cat.add_topdir(media_dir)
+    store_files(cat, media_dir, ['a.mp4', 'b.mp4', 'c.mp4'])
+    return cat
+
+
+def filter_names(cat, **kwargs):
+    return sorted(mf.filename for mf in cat.filter(**kwargs))
+
+
+def test_new_tag_reaches_cached_filter(cat):
+    assert filter_names(cat, tags=['hd']) == []
+    cat.add_tag_files('hd', cat[:2])
+    assert 'hd' in cat.tag_list
+    assert filter_names(cat, tags=['hd']) == ['a.mp4', 'b.mp4']
+    assert filter_names(cat, tags=['hd'], filename='b') == ['b.mp4']
+
+    cat.del_tag_files('hd', cat[:1])
+    assert filter_names(cat, tags=['hd']) == ['b.mp4']
+
+
+def test_new_actor_reaches_cached_filter(cat):
+    assert filter_names(cat, actors=['ann']) == []
+    cat.add_actor_files('ann', cat[1:])
+    assert filter_names(cat, actors=['ann']) == ['b.mp4', 'c.mp4']
+
+    cat.del_actor_files('ann', cat[2:])
+    assert filter_names(cat, actors=['ann']) == ['b.mp4']
+
+
+def test_rename_reaches_cached_filter(cat):
+    assert filter_names(cat, filename='d.mp4') == []
+    assert cat[0].rename('d.mp4')
+    assert filter_names(cat, filename='d.mp4') == ['d.mp4']
+
+
+def test_failed_tag_write_keeps_tag_list(cat):
+    cat.db_conn.execute("""CREATE TEMP TRIGGER refuse_tag BEFORE INSERT ON main.tagfile
+                           BEGIN
+                               SELECT RAISE(ABORT, 'refused');
+                           END;""")
+    with pytest.raises(sqlite3.IntegrityError):
+        cat.add_tag_files('hd', cat[:1])
+    assert 'hd' not in cat.tag_list
+    assert 'hd' not in [name for (name,) in cat.db_conn.execute('SELECT name FROM tagname')]
+    assert filter_names(cat, tags=['hd']) == []
@@ -0,0 +1,99 @@
+import os
+
+import pytest
+
+from posting_index import PostingIndex, mask_to_ids, ids_to_mask
+from conftest import store_files
+
+
+NAMES = {
+    '': ['Clip One.mp4', 'clip_two.mp4', 'other.avi', '100% real.mp4'],
+    'sub': ['clip three.mp4', 'zz.mp4'],
+    os.path.join('sub', 'deep'): ['Clip.mkv', 'x_y.mp4'],
+}
+
+FILTERS = [
+    ([], [], 'clip'),
+    ([], [], 'CLIP ONE'),
+    ([], [], 'zz'),
+    ([], [], 'x_y'),
+    ([], [], '100%'),
+    ([], [], 'sub' + os.sep + 'deep'),
+    ([], [], 'ub' + os.sep + 'clip'),
+    (['ann'], [], ''),
+    (['ann', 'bob'], [], ''),
+    ([], ['hd'], ''),
+    ([], ['hd', 'live'], ''),
+    (['ann'], ['live'], ''),
+    (['bob'], ['live'], 'clip'),
+    (['nobody'], [], ''),
+]
+
+
+@pytest.fixture
+def filter_cat(open_catalog, media_dir):
+    cat = open_catalog()
+    cat.add_topdir(media_dir)
+    mf_list = []
+    for reldir, names in NAMES.items():
+        os.makedirs(os.path.join(media_dir, reldir), exist_ok=True)
+        mf_list += store_files(cat, media_dir, names, reldir)
+    cat.add_actor_files('ann', mf_list[::2])
+    cat.add_actor_files('bob', mf_list[::3])
+    cat.add_tag_files('hd', mf_list[1::2])
+    cat.add_tag_files('live', mf_list[:4])
+    return cat
+
+
+def get_ids(files):
+    return sorted(mf.id for mf in files)
+
+
+@pytest.mark.parametrize('actors, tags, filename', FILTERS)
+def test_sql_filter_matches_brute_force(filter_cat, actors, tags, filename):
+    assert filter_cat.enable_sql_filter()
+    expected = get_ids(filter_cat.filter(actors, tags, filename, files=list(filter_cat)))
+    assert get_ids(filter_cat.filter_sql(actors, tags, filename)) == expected
+
+
+@pytest.mark.parametrize('actors, tags, filename', FILTERS)
+def test_index_filter_matches_brute_force(filter_cat, actors, tags, filename):
+    expected = get_ids(filter_cat.filter(actors, tags, filename, files=list(filter_cat)))
+    assert get_ids(filter_cat.filter_index(actors, tags, filename)) == expected
+
+
+def test_index_follows_label_changes(filter_cat):
+    filter_cat.build_label_index()
+    mf_list = sorted(filter_cat, key=lambda mf: mf.id)
+    filter_cat.del_actor_files('ann', mf_list[:4])
+    filter_cat.add_tag_files('hd', mf_list[:1])
+    assert filter_cat.modify_actor('bob', 'cat')
+    filter_cat.del_tag('live')
+    for actors, tags, filename in FILTERS:
+        expected = get_ids(filter_cat.filter(actors, tags, filename, files=list(filter_cat)))
+        assert get_ids(filter_cat.filter_index(actors, tags, filename)) == expected
+    assert get_ids(filter_cat.filter_index(['cat'])) == get_ids(mf_list[::3])
+
+
+@pytest.mark.parametrize('file_ids', [[], [0], [7, 8], [1, 5, 64, 1000]])
+def test_mask_round_trip(file_ids):
+    assert mask_to_ids(ids_to_mask(file_ids)) == file_ids
+
+
+def test_posting_counts():
+    index = PostingIndex()
+    index.build([], None)
+    index.add('a', [1, 2, 9])
+    index.add('b', [2])
+    index.discard('a', [2, 100])
+    assert index.get_counts() == {'a': 2, 'b': 1}
+    assert index.get_counts(ids_to_mask([2, 9])) == {'a': 1, 'b': 1}
+    index.rename('b', 'a')
+    assert mask_to_ids(index.get_mask(['a'])) == [1, 2, 9]
+
+
+def test_filters_are_not_trivial(filter_cat):
+    counts = [len(filter_cat.filter(actors, tags, filename, files=list(filter_cat)))
+              for actors, tags, filename in FILTERS]
+    assert counts.count(0) == 1
+    assert max(counts) < len(filter_cat)
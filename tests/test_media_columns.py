@@ -0,0 +1,62 @@
+import pytest
+
+import media_file
+import database_utils as db_utils
+from media_file import MediaColumns, MediaFile
+
+from conftest import store_files
+
+
+def test_detach_moves_last_row():
+    columns = MediaColumns()
+    mf_list = [MediaFile(None, None, '', '%d.mp4' % n) for n in range(3)]
+    for n, mf in enumerate(mf_list):
+        mf._row = columns.attach(mf, {'size': n * 10, 'duration': None})
+        mf._pending = None
+
+    values = columns.detach(mf_list[0]._row)
+    assert values['size'] == 0 and values['duration'] is None
+    assert columns.files == [mf_list[2], mf_list[1]]
+    assert mf_list[2]._row == 0
+    assert columns.get('size', 0) == 20
+    assert len(columns) == len(columns.arrays['size']) == 2
+
+
+@pytest.mark.parametrize('name, typecode', media_file.MEDIA_COLUMNS)
+def test_null_round_trip(name, typecode):
+    assert media_file.from_column(media_file.to_column(None, typecode), typecode) is None
+    assert media_file.from_column(media_file.to_column(0, typecode), typecode) == 0
+    assert media_file.from_column(media_file.to_column('bad', typecode), typecode) is None
+
+
+def test_values_follow_file_through_catalog(open_catalog, media_dir):
+    cat = open_catalog()
+    cat.add_topdir(media_dir)
+    mf = MediaFile(cat, cat.topdir_list[0], '', 'a.mp4')
+    mf.duration = 61
+    assert mf._row is None and mf._pending['duration'] == 61
+
+    open(mf.abspath, 'wb').close()
+    cat.store_new_files([mf])
+    assert mf._row is not None and mf._pending is None
+    assert mf.duration == 61
+    assert mf.width is None
+
+    other = store_files(cat, media_dir, ['b.mp4'])[0]
+    other.width = 1920
+    db_utils.update_file(cat.db_conn, other)
+    cat.remove(mf)
+    assert mf._row is None and mf._pending['duration'] == 61
+    assert other.width == 1920
+
+    cat.close_database()
+    files = {mf.filename: mf for mf in open_catalog()}
+    assert files['a.mp4'].duration == 61
+    assert files['b.mp4'].width == 1920
+
+
+def test_slots_keep_files_small():
+    mf = MediaFile(None, None, '', 'a.mp4')
+    assert not hasattr(mf, '__dict__')
+    with pytest.raises(AttributeError):
+        mf.unknown = 1
@@ -0,0 +1,127 @@
+import sqlite3
+
+import catalog
+import database_utils as db_utils
+
+
+# the schema written by catalogs of version 0.2
+BASE_SCHEMA = (
+    """CREATE TABLE version (
+           id integer PRIMARY KEY,
+           major integer NOT NULL,
+           minor integer NOT NULL);""",
+    """CREATE TABLE topdir (
+           id integer PRIMARY KEY AUTOINCREMENT,
+           path TEXT UNIQUE NOT NULL,
+           exclude BOOLEAN NOT NULL,
+           comment TEXT);""",
+    """CREATE TABLE file (
+           id integer PRIMARY KEY AUTOINCREMENT,
+           topdir_id INTEGER,
+           reldir TEXT NOT NULL,
+           filename TEXT NOT NULL,
+           size INTEGER,
+           time DATETIME,
+           lastplay DATETIME,
+           duration INTEGER,
+           comment TEXT,
+           width INTEGER,
+           height INTEGER,
+           CONSTRAINT fk_topdir_id FOREIGN KEY (topdir_id) REFERENCES topdir(id) ON DELETE CASCADE);""",
+    """CREATE TABLE thumbnail (
+           id INTEGER PRIMARY KEY AUTOINCREMENT,
+           file_id INTEGER,
+           time INTEGER,
+           jpg BLOB,
+           CONSTRAINT fk_file_id FOREIGN KEY (file_id) REFERENCES file(id) ON DELETE CASCADE);""",
+    """CREATE TABLE cover (
+           id INTEGER PRIMARY KEY AUTOINCREMENT,
+           file_id INTEGER UNIQUE,
+           cover BLOB,
+           CONSTRAINT fk_file_id FOREIGN KEY (file_id) REFERENCES file(id) ON DELETE CASCADE);""",
+    """CREATE TABLE actor (
+           id INTEGER PRIMARY KEY AUTOINCREMENT,
+           name TEXT UNIQUE,
+           picture BLOB,
+           bio TEXT,
+           comment TEXT);""",
+    """CREATE TABLE actorfile (
+           actor_id INTEGER,
+           file_id INTEGER,
+           CONSTRAINT fk_actor_id FOREIGN KEY (actor_id) REFERENCES actor(id) ON DELETE CASCADE,
+           CONSTRAINT fk_file_id FOREIGN KEY (file_id) REFERENCES file(id) ON DELETE CASCADE);""",
+    """CREATE TABLE tag(
+           tag TEXT NOT NULL,
+           file_id INTEGER NOT NULL,
+           CONSTRAINT fk_file_id FOREIGN KEY (file_id) REFERENCES file(id) ON DELETE CASCADE);""",
+    """CREATE TABLE favorite(
+           id INTEGER PRIMARY KEY AUTOINCREMENT,
+           file_id INTEGER,
+           thumb_id INTEGER,
+           CONSTRAINT fk_file_id FOREIGN KEY (file_id) REFERENCES file(id) ON DELETE CASCADE,
+           CONSTRAINT fk_thumb_id FOREIGN KEY (thumb_id) REFERENCES thumbnail(id));""",
+)
+
+
+def create_base_catalog(path, media_dir):
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    for sql in BASE_SCHEMA:
+        c.execute(sql)
+    c.execute('INSERT INTO version (id, major, minor) VALUES(0, 0, 2);')
+    c.execute('INSERT INTO topdir (path, exclude, comment) VALUES(?, 0, NULL);', (media_dir,))
+    for n, name in enumerate(('a.mp4', 'b.mp4', 'c.mp4')):
+        c.execute('INSERT INTO file (topdir_id, reldir, filename, size, time, lastplay, duration, comment, '
+                  'width, height) VALUES(1, "", ?, ?, 1600000000, NULL, ?, NULL, 1920, 1080);',
+                  (name, (n + 1) * 1000, (n + 1) * 60))
+        c.execute('INSERT INTO thumbnail (file_id, time, jpg) VALUES(?, 10, ?);', (n + 1, b'jpg%d' % n))
+    c.execute('INSERT INTO cover (file_id, cover) VALUES(1, ?);', (b'cover',))
+    c.execute('INSERT INTO actor (name) VALUES("alice");')
+    c.execute('INSERT INTO actorfile (actor_id, file_id) VALUES(1, 1);')
+    c.executemany('INSERT INTO tag (tag, file_id) VALUES(?, ?);', [('hd', 1), ('hd', 2), ('live', 3)])
+    c.execute('INSERT INTO favorite (file_id, thumb_id) VALUES(2, 2);')
+    conn.commit()
+    conn.close()
+
+
+def get_names(conn, sql):
+    return sorted(row[0] for row in conn.execute(sql))
+
+
+def test_migrate_base_catalog(open_catalog, catalog_path, media_dir):
+    create_base_catalog(catalog_path, media_dir)
+
+    cat = open_catalog()
+    assert cat.get_db_version() == (catalog.DB_MAJOR_VERSION, catalog.DB_MINOR_VERSION) == (0, 5)
+    assert cat.db_conn.execute('SELECT id, major, minor FROM version').fetchall() == [(0, 0, 5)]
+    assert get_names(cat.db_conn, """SELECT name FROM sqlite_master
+                                     WHERE type='index' AND name NOT LIKE 'sqlite_autoindex%'""") == [
+        'actorfile_file_index', 'favorite_file_index', 'file_path_index', 'tagfile_file_index',
+        'thumbnail_file_index']
+    assert db_utils.has_table(cat.db_conn, 'tagname')
+    assert db_utils.has_table(cat.db_conn, 'tagfile')
+    assert not db_utils.has_table(cat.db_conn, 'tag')
+    assert get_names(cat.db_conn, "SELECT name FROM pragma_table_info('thumbnail')") == [
+        'file_id', 'id', 'jpg', 'pack_length', 'pack_offset', 'time']
+    plan = ' '.join(row[-1] for row in cat.db_conn.execute(
+        'EXPLAIN QUERY PLAN SELECT id FROM thumbnail WHERE file_id=?;', (1,)))
+    assert 'thumbnail_file_index' in plan
+
+    files = {mf.filename: mf for mf in cat}
+    assert sorted(files) == ['a.mp4', 'b.mp4', 'c.mp4']
+    assert files['a.mp4'].get_actors() == ['alice']
+    assert sorted(cat.tag_list) == ['hd', 'live']
+    assert sorted(files['a.mp4'].get_tags()) == ['hd']
+    assert sorted(files['c.mp4'].get_tags()) == ['live']
+    assert files['c.mp4'].duration == 180
+    assert len(files['b.mp4'].favorites) == 1
+    assert sorted(mf.filename for mf in cat.filter(tags=['hd'])) == ['a.mp4', 'b.mp4']
+
+
+def test_migrated_catalog_opens_again(open_catalog, catalog_path, media_dir):
+    create_base_catalog(catalog_path, media_dir)
+    open_catalog().close_database()
+
+    cat = open_catalog()
+    assert cat.get_db_version() == (catalog.DB_MAJOR_VERSION, catalog.DB_MINOR_VERSION)
+    assert sorted(mf.filename for mf in cat.filter(tags=['hd'])) == ['a.mp4', 'b.mp4']
@@ -0,0 +1,54 @@
+import os
+
+from path_index import PathIndex
+from conftest import store_files
+
+
+def scan(cat, text):
+    return sorted(mf.id for mf in cat.filter(filename=text, files=list(cat)))
+
+
+def search(cat, text):
+    cat.build_path_index()
+    return sorted(cat.path_index.search(text))
+
+
+def make_catalog(open_catalog, media_dir):
+    cat = open_catalog()
+    cat.add_topdir(media_dir)
+    os.makedirs(os.path.join(media_dir, 'Shows', 'clips'))
+    store_files(cat, media_dir, ['Clip A.mp4', 'clap.mp4', 'ab.mp4'])
+    store_files(cat, media_dir, ['x.mp4', 'Long Clip.avi'], os.path.join('Shows', 'clips'))
+    return cat
+
+
+def test_typing_matches_scan(open_catalog, media_dir):
+    cat = make_catalog(open_catalog, media_dir)
+    for text in ['c', 'cl', 'cli', 'clip', 'clip ', 'clip a', 'cli', 'ab', 'xyz', 'shows', 'MEDIA',
+                 'shows' + os.sep + 'cl', 'clips' + os.sep + 'x', '.mp4']:
+        assert search(cat, text) == scan(cat, text), text
+    assert len(scan(cat, 'clip')) == 3
+
+
+def test_index_follows_rename_and_remove(open_catalog, media_dir):
+    cat = make_catalog(open_catalog, media_dir)
+    assert len(search(cat, 'clap')) == 1
+
+    clap = cat.path_index.search('clap')[0]
+    assert cat.file_map[clap].rename('clipped.mp4')
+    assert search(cat, 'clap') == scan(cat, 'clap') == []
+    assert search(cat, 'clipp') == scan(cat, 'clipp') == [clap]
+
+    cat.remove(cat.file_map[clap])
+    assert search(cat, 'clip') == scan(cat, 'clip')
+    assert clap not in search(cat, 'clip')
+
+    added = store_files(cat, media_dir, ['clap again.mp4'])[0]
+    assert search(cat, 'clap') == [added.id]
+
+
+def test_unbuilt_index_ignores_changes():
+    index = PathIndex()
+    index.add(None)
+    index.remove(1)
+    assert not index.is_built()
@@ -0,0 +1,125 @@
+import datetime
+
+import pytest
+
+import catalog_query
+
+from conftest import store_files
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('holiday', False),
+    ('(live)', False),
+    ('clip (2020', False),
+    ('a OR b', True),
+    ('NOT x', True),
+    ('tag:hd', True),
+    ('size>1G', True),
+    ('?(live)', True),
+])
+def test_is_query(text, expected):
+    assert catalog_query.is_query(text) == expected
+
+
+@pytest.fixture
+def cat(open_catalog, media_dir):
+    cat = open_catalog()
+    cat.add_topdir(media_dir)
+    mf_list = store_files(cat, media_dir, ['show (live).mp4', 'show.mp4', 'other.mp4'])
+    mf_list[0].add_tag('live')
+    mf_list[2].add_tag('hd')
+    return cat
+
+
+def filter_names(cat, text):
+    return sorted(mf.filename for mf in cat.filter(filename=text))
+
+
+def test_parentheses_match_path(cat):
+    assert filter_names(cat, '(live)') == ['show (live).mp4']
+    assert filter_names(cat, 'live)') == ['show (live).mp4']
+
+
+def test_query_terms(cat):
+    assert filter_names(cat, 'tag:hd') == ['other.mp4']
+    assert filter_names(cat, 'show AND NOT tag:live') == ['show.mp4']
+    assert filter_names(cat, 'tag:live OR tag:hd') == ['other.mp4', 'show (live).mp4']
+
+
+def test_prefix_forces_query(cat):
+    assert filter_names(cat, '?(tag:live)') == ['show (live).mp4']
+    assert filter_names(cat, '?other') == ['other.mp4']
+
+
+def test_bad_query_falls_back_to_path(cat):
+    assert filter_names(cat, 'show AND') == []
+    assert filter_names(cat, 'show OR') == []
+    assert filter_names(cat, 'NOT') == []
+    store_files(cat, cat.topdir_list[0].abspath, ['best of AND more.mp4'])
+    assert filter_names(cat, 'of AND') == ['best of AND more.mp4']
+
+
+# duration, size, (width, height), created, lastplay
+RANGE_FILES = {
+    'short.mp4': (59, 500 << 20, (640, 480), '2019-12-31 23:00', None),
+    'hour.mp4': (3600, 1 << 30, (1920, 1080), '2020-01-01 12:00', '2024-05-01 10:00:00'),
+    'long.mp4': (7200, 3 << 30, (1080, 1920), '2021-06-01 00:00', '2023-01-01 00:00:00'),
+    'zero.mp4': (0, 0, (0, 0), '2020-01-02 00:00', None),
+    'unknown.mp4': (None, None, (None, 720), None, None),
+}
+
+RANGE_QUERIES = [
+    'duration>1h', 'duration>=1h', 'duration<1m', 'duration<=0', 'duration=1:00:00', 'duration=0',
+    'size>=1G', 'size<1gb', 'size>500M', 'size=0',
+    'resolution>=1920', 'resolution<1080p', 'resolution=0',
+    'created=2020-01-01', 'created>=2020-01-02', 'created<2020-01-01',
+    'lastplay>=2024-01-01', 'lastplay<2024-01-01', 'NOT lastplay>0',
+    'NOT duration>=0', 'duration>1m OR size=0', 'duration>1m AND NOT tag:hd',
+    'tag:hd OR duration<1m AND size>0', '(tag:hd OR duration<1m) AND size>0',
+    'NOT (tag:live OR long)', 'hour OR zero', 'tag:hd .mp4 resolution>=1080',
+]
+
+
+@pytest.fixture
+def range_cat(open_catalog, media_dir):
+    cat = open_catalog()
+    cat.add_topdir(media_dir)
+    mf_list = store_files(cat, media_dir, list(RANGE_FILES))
+    for mf, (duration, size, (width, height), created, lastplay) in zip(mf_list, RANGE_FILES.values()):
+        mf.duration = duration
+        mf.size = size
+        mf.width = width
+        mf.height = height
+        mf.time = None if created is None else datetime.datetime.fromisoformat(created).timestamp()
+        mf.lastplay = lastplay
+    cat.add_tag_files('hd', mf_list[1:3])
+    cat.add_tag_files('live', mf_list[3:])
+    return cat
+
+
+@pytest.mark.parametrize('text', RANGE_QUERIES)
+def test_indexed_plan_matches_file_check(range_cat, text):
+    plan = catalog_query.compile_query(text)
+    expected = sorted(mf.filename for mf in range_cat if plan.matches(range_cat, mf))
+    assert sorted(range_cat.file_map[file_id].filename
+                  for file_id in catalog_query.run_query(range_cat, text)) == expected
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('duration>1h', ['long.mp4']),
+    ('duration=1:00:00', ['hour.mp4']),
+    ('size<1gb', ['short.mp4', 'zero.mp4']),
+    ('resolution>=1920', ['hour.mp4', 'long.mp4']),
+    ('created=2020-01-01', ['hour.mp4']),
+    ('NOT lastplay>0', ['short.mp4', 'unknown.mp4', 'zero.mp4']),
+    ('tag:hd OR duration<1m AND size>0', ['hour.mp4', 'long.mp4', 'short.mp4']),
+])
+def test_range_results(range_cat, text, expected):
+    assert filter_names(range_cat, text) == expected
+
+
+@pytest.mark.parametrize('text', ['duration>soon', 'size>1X', 'created>yesterday', '(tag:hd', 'tag:hd)',
+                                  'AND', 'tag:hd OR'])
+def test_bad_queries_raise(text):
+    with pytest.raises(catalog_query.QueryException):
+        catalog_query.compile_query(text)
@@ -0,0 +1,44 @@
+from conftest import store_files
+
+
+def test_snapshot_keeps_label_change_of_other_connection(open_catalog, media_dir):
+    cat = open_catalog()
+    cat.add_topdir(media_dir)
+    store_files(cat, media_dir, ['a.mp4'])
+    cat.close_database()
+
+    gui = open_catalog(use_snapshot=True)
+    other = open_catalog()
+    other.get_file_from_id(gui[0].id).add_tag('hd')
+    other.close_database()
+
+    # the open catalog never saw the tag, so it must not stamp a snapshot with the new count
+    gui.close_database()
+    cat = open_catalog(use_snapshot=True)
+    assert cat[0].get_tags() == ['hd']
+
+
+def test_snapshot_stored_after_own_file_changes(open_catalog, media_dir):
+    gui = open_catalog(use_snapshot=True)
+    gui.add_topdir(media_dir)
+    mf_list = store_files(gui, media_dir, ['a.mp4', 'b.mp4'])
+    gui.del_file(mf_list[0])
+    gui.close_database()
+
+    cat = open_catalog(use_snapshot=True)
+    assert cat.snapshot_count is not None
+    assert [mf.filename for mf in cat] == ['b.mp4']
+
+
+def test_snapshot_stored_after_reloading_files(open_catalog, media_dir):
+    gui = open_catalog(use_snapshot=True)
+    gui.add_topdir(media_dir)
+    other = open_catalog()
+    store_files(other, media_dir, ['a.mp4'])
+    other.close_database()
+
+    gui.reload_files()
+    gui.close_database()
+    cat = open_catalog(use_snapshot=True)
+    assert cat.snapshot_count is not None
+    assert [mf.filename for mf in cat] == ['a.mp4']
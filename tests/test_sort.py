@@ -0,0 +1,47 @@
+import pytest
+
+from settings import *
+from catalog import get_sort_key
+from conftest import store_files
+
+
+SIZES = [3, None, 0, 7, 0, None, 2]
+
+
+@pytest.fixture
+def sized_files(open_catalog, media_dir):
+    cat = open_catalog()
+    cat.add_topdir(media_dir)
+    mf_list = store_files(cat, media_dir, ['%d.mp4' % n for n in range(len(SIZES))])
+    for mf, size in zip(mf_list, SIZES):
+        mf.size = size
+    return cat, mf_list
+
+
+@pytest.mark.parametrize('ascend', [True, False])
+def test_store_and_key_sort_agree(sized_files, ascend):
+    cat, mf_list = sized_files
+
+    by_store = list(mf_list)
+    cat.sort_files(by_store, FILTER_SORT_SIZE, ascend)
+    by_key = sorted(mf_list, key=get_sort_key(cat, FILTER_SORT_SIZE, ascend), reverse=not ascend)
+
+    assert by_store == by_key
+    assert [mf.size for mf in by_store] == ([0, 0, 2, 3, 7, None, None] if ascend else
+                                            [7, 3, 2, 0, 0, None, None])
+
+
+@pytest.mark.parametrize('ascend', [True, False])
+def test_missing_resolution_sorts_last(sized_files, ascend):
+    cat, mf_list = sized_files
+    for mf, (width, height) in zip(mf_list, [(640, 480), (None, 720), (0, 0), (1920, 1080),
+                                             (1280, None), (None, None), (3840, 2160)]):
+        mf.width = width
+        mf.height = height
+
+    by_store = list(mf_list)
+    cat.sort_files(by_store, FILTER_SORT_RESOLUTION, ascend)
+    by_key = sorted(mf_list, key=get_sort_key(cat, FILTER_SORT_RESOLUTION, ascend), reverse=not ascend)
+
+    assert by_store == by_key
+    assert [mf.filename for mf in by_store[-3:]] == ['1.mp4', '4.mp4', '5.mp4']
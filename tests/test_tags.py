@@ -0,0 +1,59 @@
+import pytest
+
+from conftest import store_files
+
+
+@pytest.fixture(params=[False, True], ids=['index', 'sql'])
+def cat(request, open_catalog, media_dir):
+    cat = open_catalog()
+    if request.param:
+        assert cat.enable_sql_filter()
+    cat.add_topdir(media_dir)
+    mf_list = store_files(cat, media_dir, ['a.mp4', 'b.mp4', 'c.mp4'])
+    cat.add_tag_files('hd', mf_list[:2])
+    cat.add_tag_files('live', mf_list[1:])
+    return cat
+
+
+def filter_names(cat, **kwargs):
+    return sorted(mf.filename for mf in cat.filter(**kwargs))
+
+
+def get_tag_rows(cat):
+    return sorted(cat.db_conn.execute("""SELECT tagname.name, file.filename FROM tagfile
+                                         JOIN tagname ON tagname.id = tagfile.tag_id
+                                         JOIN file ON file.id = tagfile.file_id;""").fetchall())
+
+
+def test_rename_tag(cat):
+    assert filter_names(cat, tags=['hd']) == ['a.mp4', 'b.mp4']
+    assert cat.modify_tag('hd', 'uhd')
+    assert not cat.modify_tag('uhd', 'live')
+    assert not cat.modify_tag('none', 'other')
+
+    assert sorted(cat.tag_list) == ['live', 'uhd']
+    assert filter_names(cat, tags=['hd']) == []
+    assert filter_names(cat, tags=['uhd']) == ['a.mp4', 'b.mp4']
+    assert filter_names(cat, filename='tag:uhd') == ['a.mp4', 'b.mp4']
+    assert get_tag_rows(cat) == [('live', 'b.mp4'), ('live', 'c.mp4'), ('uhd', 'a.mp4'), ('uhd', 'b.mp4')]
+
+
+def test_delete_tag(cat):
+    assert filter_names(cat, tags=['live']) == ['b.mp4', 'c.mp4']
+    cat.del_tag('live')
+
+    assert cat.tag_list == ['hd']
+    assert filter_names(cat, tags=['live']) == []
+    assert [mf.get_tags() for mf in cat] == [['hd'], ['hd'], []]
+    assert get_tag_rows(cat) == [('hd', 'a.mp4'), ('hd', 'b.mp4')]
+    assert cat.db_conn.execute('SELECT name FROM tagname;').fetchall() == [('hd',)]
+
+
+def test_tags_survive_reopen(cat, open_catalog):
+    cat.modify_tag('live', 'show')
+    cat.close_database()
+
+    cat = open_catalog()
+    assert sorted(cat.tag_list) == ['hd', 'show']
+    assert {mf.filename: mf.get_tags() for mf in cat} == {'a.mp4': ['hd'], 'b.mp4': ['hd', 'show'],
+                                                          'c.mp4': ['show']}
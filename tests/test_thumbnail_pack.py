@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+import database_utils as db_utils
+import media_file
+import thumbnail_pack
+
+
+def store_thumbnails(cat, media_dir, count):
+    topdir = cat.get_topdir_from_abspath(media_dir)
+    mf_list = []
+    for n in range(count):
+        open(os.path.join(media_dir, 'f%d.mp4' % n), 'wb').close()
+        mf = media_file.MediaFile(cat, topdir, '', 'f%d.mp4' % n)
+        mf.thumbnails = [(t, b'jpg-%d-%d' % (n, t)) for t in range(3)]
+        mf_list.append(mf)
+    cat.store_new_files(mf_list)
+    return mf_list
+
+
+def get_jpgs(cat, mf):
+    return [bytes(jpg) if jpg is not None else None
+            for time, jpg, thumb_id in db_utils.get_thumbnails(cat.db_conn, mf.id, cat.thumbnail_pack)]
+
+
+@pytest.fixture
+def cat(open_catalog, media_dir):
+    cat = open_catalog()
+    cat.add_topdir(media_dir)
+    cat.enable_thumbnail_pack()
+    return cat
+
+
+def test_packed_thumbnails_read_back(cat, media_dir):
+    mf_list = store_thumbnails(cat, media_dir, 2)
+    assert db_utils.get_blob_thumbnail_ids(cat.db_conn) == []
+    assert get_jpgs(cat, mf_list[1]) == [b'jpg-1-0', b'jpg-1-1', b'jpg-1-2']
+
+
+def test_compact_drops_deleted_and_unreadable(cat, media_dir):
+    mf_list = store_thumbnails(cat, media_dir, 3)
+    old_path = cat.thumbnail_pack.path
+    cat.del_file(mf_list[0])
+
+    # a row pointing past the end of the pack
+    thumb_id = db_utils.get_thumbnails(cat.db_conn, mf_list[2].id)[0][2]
+    db_utils.set_thumbnail_offsets(cat.db_conn, [(1 << 20, 10, thumb_id)])
+
+    old_size, new_size = thumbnail_pack.compact(cat)
+    assert new_size < old_size
+    assert not os.path.exists(old_path)
+    assert get_jpgs(cat, mf_list[1]) == [b'jpg-1-0', b'jpg-1-1', b'jpg-1-2']
+    assert get_jpgs(cat, mf_list[2]) == [None, b'jpg-2-1', b'jpg-2-2']
+
+
+def test_compact_refuses_while_open_elsewhere(cat, open_catalog, media_dir):
+    mf_list = store_thumbnails(cat, media_dir, 1)
+    other = open_catalog()
+    assert thumbnail_pack.compact(cat) is None
+    assert get_jpgs(other, other[0]) == [b'jpg-0-0', b'jpg-0-1', b'jpg-0-2']
+
+    other.close_database()
+    assert thumbnail_pack.compact(cat) is not None
+    assert get_jpgs(cat, mf_list[0]) == [b'jpg-0-0', b'jpg-0-1', b'jpg-0-2']
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+
+# Copyright 2020 pinebud77@hotmail.com
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Thumbnail pack : a header followed by JPEG data appended back to back.
+# The thumbnail table keeps (pack_offset, pack_length) of every packed JPEG.
+# Compaction writes the next generation of the pack and switches the catalog
+# to it in one transaction, so a crash leaves either the old or the new pack valid.
+# Catalogs keep the pack they opened and read it by offset, so compaction only runs
+# while no other catalog is open : the filelog readers tell which ones are.
+
+import os
+import time
+import mmap
+import struct
+import logging
+import threading
+
+from settings import *
+import database_utils as db_utils
+
+
+PACK_MAGIC = b'YAMMPACK'
+PACK_VERSION = 1
+PACK_HEADER = '<8sI4x'
+PACK_EXTENSION = '.thumbs'
+PACK_CONVERT_BATCH = 1000
+
+
+def get_pack_path(db_abspath, generation):
+    return '%s.%d%s' % (db_abspath, generation, PACK_EXTENSION)
+
+
+class ThumbnailPack:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.write_file = None
+        self.mm = None
+        self.mm_size = 0
+
+    def append(self, jpg):
+        with self.lock:
+            if self.write_file is None:
+                self.write_file = open(self.path, 'ab')
+            # another process may have appended since the last write
+            self.write_file.seek(0, os.SEEK_END)
+            if self.write_file.tell() == 0:
+                self.write_file.write(struct.pack(PACK_HEADER, PACK_MAGIC, PACK_VERSION))
+            offset = self.write_file.tell()
+            self.write_file.write(jpg)
+            self.write_file.flush()
+        return offset, len(jpg)
+
+    def sync(self):
+        with self.lock:
+            if self.write_file is not None:
+                self.write_file.flush()
+                os.fsync(self.write_file.fileno())
+
+    def remap(self):
+        # older maps stay alive while memoryviews of them are in use
+        self.mm = None
+        self.mm_size = 0
+        try:
+            with open(self.path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if size < struct.calcsize(PACK_HEADER):
+                    return
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except OSError as e:
+            logging.error('cannot map thumbnail pack %s : %s' % (self.path, e))
+            return
+        magic, version = struct.unpack_from(PACK_HEADER, mm)
+        if magic != PACK_MAGIC or version != PACK_VERSION:
+            logging.error('not a thumbnail pack : %s' % self.path)
+            return
+        self.mm = mm
+        self.mm_size = size
+
+    def read(self, offset, length):
+        with self.lock:
+            if self.mm is None or offset + length > self.mm_size:
+                self.remap()
+            mm = self.mm
+            mm_size = self.mm_size
+        if mm is None or offset + length > mm_size:
+            logging.error('thumbnail is out of the pack : %d+%d' % (offset, length))
+            return None
+        return memoryview(mm)[offset:offset + length]
+
+    def get_size(self):
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def close(self):
+        with self.lock:
+            if self.write_file is not None:
+                self.write_file.close()
+                self.write_file = None
+            if self.mm is not None:
+                try:
+                    self.mm.close()
+                except BufferError:
+                    pass
+                self.mm = None
+                self.mm_size = 0
+
+
+def convert(catalog, msg_cb=None):
+    conn = catalog.db_conn
+    catalog.enable_thumbnail_pack()
+    pack = catalog.thumbnail_pack
+
+    thumb_ids = [row[0] for row in db_utils.get_blob_thumbnail_ids(conn)]
+    for start in range(0, len(thumb_ids), PACK_CONVERT_BATCH):
+        with catalog.transaction():
+            updates = []
+            for thumb_id, jpg in db_utils.get_thumbnail_blobs(conn, thumb_ids[start:start + PACK_CONVERT_BATCH]):
+                offset, length = pack.append(jpg)
+                updates.append((offset, length, thumb_id))
+            pack.sync()
+            db_utils.set_thumbnails_packed(conn, updates)
+        if msg_cb is not None:
+            msg_cb('packing thumbnails (%d/%d)' % (min(start + PACK_CONVERT_BATCH, len(thumb_ids)), len(thumb_ids)))
+
+    if thumb_ids:
+        db_utils.vacuum(conn)
+    return len(thumb_ids)
+
+
+def get_other_readers(catalog):
+    readers = db_utils.get_filelog_readers(catalog.db_conn, time.time() - DEF_FILELOG_READER_EXPIRE)
+    return [reader for reader in readers if reader != catalog.filelog_reader]
+
+
+def compact(catalog, msg_cb=None):
+    conn = catalog.db_conn
+    generation = db_utils.get_pack_generation(conn)
+    if generation is None:
+        logging.error('catalog has no thumbnail pack : %s' % catalog.filepath)
+        return None
+    if get_other_readers(catalog):
+        logging.error('catalog is open elsewhere, close it before compacting : %s' % catalog.filepath)
+        return None
+    old_pack = catalog.thumbnail_pack
+    old_size = old_pack.get_size()
+
+    new_path = get_pack_path(catalog.filepath, generation + 1)
+    try:
+        os.remove(new_path)
+    except FileNotFoundError:
+        pass
+    new_pack = ThumbnailPack(new_path)
+
+    rows = db_utils.get_packed_thumbnails(conn)
+    updates = []
+    dropped = 0
+    for thumb_id, offset, length in rows:
+        jpg = old_pack.read(offset, length)
+        if jpg is None:
+            # the offsets would point into the new pack, the row is kept without an image
+            updates.append((None, None, thumb_id))
+            dropped += 1
+            continue
+        new_offset, new_length = new_pack.append(jpg)
+        updates.append((new_offset, new_length, thumb_id))
+    new_pack.sync()
+    if dropped:
+        logging.warning('%d thumbnails were not readable from %s and are dropped' % (dropped, old_pack.path))
+
+    with catalog.transaction():
+        # a catalog opened meanwhile still maps the old pack
+        if get_other_readers(catalog):
+            logging.error('catalog was opened elsewhere while compacting : %s' % catalog.filepath)
+            new_pack.close()
+            os.remove(new_path)
+            return None
+        db_utils.set_thumbnail_offsets(conn, updates)
+        db_utils.set_pack_generation(conn, generation + 1)
+
+    catalog.thumbnail_pack = new_pack
+    old_pack.close()
+    try:
+        os.remove(old_pack.path)
+    except OSError as e:
+        logging.warning('cannot remove old thumbnail pack %s : %s' % (old_pack.path, e))
+
+    new_size = new_pack.get_size()
+    if msg_cb is not None:
+        msg_cb('thumbnail pack compacted : %d -> %d bytes' % (old_size, new_size))
+    return old_size, new_size
@@ -4,6 +4,8 @@ import getopt
 
 from settings import *
 from catalog import Catalog
+import catalog_query
+import thumbnail_pack
 
 
 VERSION_MAJOR = 0
@@ -67,14 +69,32 @@ def info_main(yamm_file):
     logging.debug('open catalog file : %s' % yamm_file)
     yamm_file = os.path.abspath(yamm_file)
     catalog = Catalog(db_abspath=yamm_file)
-    catalog.open_database()
+    catalog.open_database(use_snapshot=DEF_USE_SNAPSHOT)
 
+    store = catalog.get_column_store()
     for topdir in catalog.topdir_list:
-        count = 0
-        for mf in catalog:
-            if mf.topdir == topdir:
-                count += 1
+        mask = store.topdir_mask(topdir)
+        count = int(mask.sum())
         logging.info('\ninfo for topdir : %s (%d files)' % (topdir.abspath, count))
+        logging.info('total size : %.2f GB' % (store.total('size', mask) / (1 << 30)))
+        logging.info('total duration : %.1f hours' % (store.total('duration', mask) / 3600))
+        logging.info('resolution : %s' % ', '.join('%s %d' % item for item in store.resolution_histogram(mask)))
+    logging.debug('closing catalog file : %s' % yamm_file)
+    catalog.close_database()
+
+
+def find_main(yamm_file, query):
+    logging.debug('open catalog file : %s' % yamm_file)
+    yamm_file = os.path.abspath(yamm_file)
+    catalog = Catalog(db_abspath=yamm_file)
+    catalog.open_database(use_snapshot=DEF_USE_SNAPSHOT)
+
+    try:
+        for mf in catalog.query(query):
+            print(mf.abspath)
+    except catalog_query.QueryException as e:
+        logging.error('bad query %s : %s' % (query, e))
+
     logging.debug('closing catalog file : %s' % yamm_file)
     catalog.close_database()
 
@@ -98,6 +118,23 @@ def mod_main(yamm_file, origpart, newpart):
     logging.debug('closing catalog file : %s' % yamm_file)
     catalog.close_database()
 
+def pack_main(yamm_file, compact=False):
+    logging.debug('open catalog file : %s' % yamm_file)
+    yamm_file = os.path.abspath(yamm_file)
+    catalog = Catalog(db_abspath=yamm_file)
+    catalog.open_database()
+
+    if compact:
+        if thumbnail_pack.compact(catalog, msg_cb=print_msg) is None:
+            logging.error('thumbnail pack not compacted : %s' % yamm_file)
+    else:
+        count = thumbnail_pack.convert(catalog, msg_cb=print_msg)
+        logging.info('%d thumbnails moved to %s' % (count, catalog.thumbnail_pack.path))
+
+    logging.debug('closing catalog file : %s' % yamm_file)
+    catalog.close_database()
+
+
 def print_help():
     print("open GUI                     : yamm.exe something.yamm")
     print("sync catalog                 : yamm.exe -s yamm_file")
@@ -106,15 +143,21 @@ def print_help():
     print("create yamm file (overwrite) : yamm.exe --create=yamm_file --adddir=topdir1 --adddir=topdir2 ...")
     print("print yamm file info         : yamm.exe -i yamm_file")
     print("print yamm file info         : yamm.exe --info yamm_file")
+    print("find files                   : yamm.exe -f yamm_file \"tag:hd AND duration>1h AND NOT actor:name\"")
+    print("find files                   : yamm.exe --find=yamm_file \"(tag:hd OR tag:sd) size>=1G created>=2020-01-01\"")
     print("modify topdir                : yamm.exe -m yamm_file -o original_start -n new_start")
     print("modify topdir                : yamm.exe --mod=yamm_file --origpart=original_start --newpart=new_start")
+    print("pack thumbnails              : yamm.exe -p yamm_file")
+    print("pack thumbnails              : yamm.exe --pack=yamm_file")
+    print("compact thumbnail pack       : yamm.exe -k yamm_file")
+    print("compact thumbnail pack       : yamm.exe --compact=yamm_file")
 
 
 if __name__ == '__main__':
     opts = None
     try:
         opts, args = getopt.getopt(sys.argv[1:],
-                                   'm:o:n:i:dhc:a:qs:',
+                                   'm:o:n:i:dhc:a:qs:p:k:f:',
                                    ['debug',
                                     'help',
                                     'sync=',
@@ -125,6 +168,9 @@ if __name__ == '__main__':
                                     'origpart=',
                                     'newpart=',
                                     'mod=',
+                                    'pack=',
+                                    'compact=',
+                                    'find=',
                                     ])
     except getopt.GetoptError:
         print_help()
@@ -139,6 +185,9 @@ if __name__ == '__main__':
     origpart = None
     newpart = None
     mod_file = None
+    pack_file = None
+    compact_file = None
+    find_file = None
     for opt, arg in opts:
         if opt in ('-h', '--help'):
             print_help()
@@ -161,6 +210,12 @@ if __name__ == '__main__':
             newpart = arg
         elif opt in ('-m', '--mod'):
             mod_file = arg
+        elif opt in ('-p', '--pack'):
+            pack_file = arg
+        elif opt in ('-k', '--compact'):
+            compact_file = arg
+        elif opt in ('-f', '--find'):
+            find_file = arg
 
     if not yamm_file and args:
         yamm_file = args[0]
@@ -185,5 +240,11 @@ if __name__ == '__main__':
         cmain(yamm_file, topdirs)
     elif mod_file:
         mod_main(mod_file, origpart, newpart)
+    elif pack_file:
+        pack_main(pack_file)
+    elif compact_file:
+        pack_main(compact_file, compact=True)
+    elif find_file:
+        find_main(find_file, ' '.join(args))
     else:
         wmain(yamm_file)